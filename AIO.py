@@ -1,54 +1,135 @@
 from dotenv import load_dotenv
-import json
 import os
-import re
 import asyncio
 import logging
-from datetime import datetime
+import signal
+from datetime import datetime, time as dt_time, timedelta
 from pathlib import Path
 from typing import Optional
+import httpx
 import pytz
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.types import (Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup,
                            InlineKeyboardButton, FSInputFile)
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import StatesGroup, State
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from openai import OpenAI
+from aiohttp import web
 from app_utils import (
     generate_unique_code,
     validate_email,
     validate_phone,
     sanitize_filename,
-    get_user_storage_dir,
-    resolve_user_file_path,
 )
+from blob_store import BlobStore, iter_file_chunks
+from upload_pipeline import QuotaExceeded, UploadPipeline
+from scheduler import ReminderScheduler
+from content_filter import ContentFilter
+from conversation_store import ConversationStore
+from fsm_storage import SQLiteFSMStorage
+from flood_control import FloodControl, FloodControlMiddleware, parse_limits
+from gpt_pool import FairRequestPool
+from gpt_stream import ThrottledEditor
+from outbound import GLOBAL_RATE, RETRYABLE_ERRORS, DeliveryQueue, RateLimitMiddleware, SendRateLimiter
+from loop_watchdog import LoopWatchdog, SamplingProfiler, handler_codes
+from metrics import LAG_BUCKETS, REGISTRY, MetricsMiddleware, fsm_state_counts, start_metrics_server
+from response_cache import ResponseCache, make_cache_key
+from sharding import HashRing, shard_path
+from storage import Storage, create_storage
+from webhook import create_webhook_app
+from recurrence import RecurrenceError, describe_rule, next_occurrence, parse_rule
+from task_index import TaskIndex
+from task_transfer import TaskExportFile, import_task_stream, resolve_due, task_file_kind
+from task_journal import add_entry, new_task_id, remove_entry
+from warmup import Warmup, WarmupMiddleware
 
 load_dotenv()
 
 API_TOKEN = os.getenv("API_TOKEN")
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-client: Optional[OpenAI] = OpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
+client = None
+GPT_CONNECTION_ERRORS = (httpx.TransportError,)
 
 logging.basicConfig(level=logging.INFO)
 
-bot: Optional[Bot] = Bot(token=API_TOKEN) if API_TOKEN else None
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
+SHARD_INDEX = int(os.getenv("AIO_SHARD_INDEX", "0"))
+SHARD_COUNT = int(os.getenv("AIO_SHARD_COUNT", "1"))
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory")
+FSM_DB_PATH = os.getenv("FSM_DB_PATH", "fsm.sqlite3")
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", "86400"))
+fsm_storage = (SQLiteFSMStorage(FSM_DB_PATH, state_ttl=FSM_STATE_TTL) if FSM_STORAGE == "sqlite"
+               else MemoryStorage())
+
+bot: Optional[Bot] = None
+send_limiter = SendRateLimiter(global_rate=GLOBAL_RATE / SHARD_COUNT)
+dp = Dispatcher(storage=fsm_storage)
+THROTTLE_LIMITS = os.getenv("THROTTLE_LIMITS", "")
+flood_control = FloodControl(parse_limits(THROTTLE_LIMITS)) if THROTTLE_LIMITS.lower() != 'off' else None
+if flood_control is not None:
+    dp.message.middleware(FloodControlMiddleware(flood_control))
+    dp.callback_query.middleware(FloodControlMiddleware(flood_control))
+WARMUP_WAIT_SECONDS = float(os.getenv("WARMUP_WAIT_SECONDS", "30"))
+warmup = Warmup(WARMUP_WAIT_SECONDS)
+dp.message.middleware(WarmupMiddleware(warmup))
+dp.callback_query.middleware(WarmupMiddleware(warmup))
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
 
 DATA_FILE = 'users_data.json'
 TASKS_FILE = 'tasks_data.json'
+TASKS_JOURNAL_FILE = 'tasks_data.journal'
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "aio.sqlite3")
+GPT_CONCURRENCY = int(os.getenv("GPT_CONCURRENCY", "4"))
+GPT_PER_USER_INFLIGHT = int(os.getenv("GPT_PER_USER_INFLIGHT", "1"))
+GPT_SLOW_QUEUE_SECONDS = 1.0
+GPT_STREAMING = os.getenv("GPT_STREAMING", "0") == "1"
+GPT_STREAM_EDIT_INTERVAL = float(os.getenv("GPT_STREAM_EDIT_INTERVAL", "1.0"))
+GPT_HISTORY_TOKENS = int(os.getenv("GPT_HISTORY_TOKENS", "1500"))
+GPT_HISTORY_TOTAL_TOKENS = int(os.getenv("GPT_HISTORY_TOTAL_TOKENS", "2000000"))
+GPT_MAX_SESSIONS = int(os.getenv("GPT_MAX_SESSIONS", "10000"))
+GPT_SESSION_TTL = float(os.getenv("GPT_SESSION_TTL", "3600"))
+GPT_HISTORY_SUMMARY = os.getenv("GPT_HISTORY_SUMMARY", "0") == "1"
+GPT_CACHE_SIZE = int(os.getenv("GPT_CACHE_SIZE", "0"))
+GPT_CACHE_TTL = float(os.getenv("GPT_CACHE_TTL", "86400"))
+GPT_CACHE_PATH = os.getenv("GPT_CACHE_PATH") or None
+GPT_MODEL = "gpt-4o-mini"
+REMINDER_RETRY_SECONDS = 300
+UPDATES_MODE = os.getenv("UPDATES_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_LISTEN_HOST = os.getenv("WEBHOOK_LISTEN_HOST", "0.0.0.0")
+WEBHOOK_LISTEN_PORT = int(os.getenv("WEBHOOK_LISTEN_PORT", "8080"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LOOP_WATCHDOG_MS = int(os.getenv("LOOP_WATCHDOG_MS", "0"))
+LOOP_PROFILE_PATH = os.getenv("LOOP_PROFILE_PATH") or None
+LOOP_PROFILE_INTERVAL_MS = float(os.getenv("LOOP_PROFILE_INTERVAL_MS", "10"))
+GPT_TEMPERATURE = 0.7
 FILE_STORAGE_PATH = Path('user_files')
 MAX_FILE_SIZE_BYTES = 20 * 1024 * 1024
-FILE_STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "120"))
+FILES_PAGE_SIZE = 8
+MB = 1024 * 1024
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_BYTE_RATE = int(os.getenv("UPLOAD_BYTE_RATE_KB", "0")) * 1024
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_MB", "500")) * MB
+UPLOAD_PROGRESS_MIN_BYTES = 5 * MB
+UPLOAD_PROGRESS_INTERVAL = 2.0
+SCHEDULE_PAGE_SIZE = 10
+SCHEDULE_RANGES = {'next': "Ближайшие", 'today': "Сегодня", 'week': "Неделя", 'all': "Все"}
 
 almaty_tz = pytz.timezone('Asia/Almaty')
 
 user_events = {}
-conversation_history = {}
 
-DISCORD_INVITE_PATTERN = re.compile(r'https://discord.gg/Gy4xbacfES', re.IGNORECASE)
+BLOCKLIST_PATH = os.getenv("BLOCKLIST_PATH", "blocklist.txt")
+BLOCKLIST_RELOAD_SECONDS = float(os.getenv("BLOCKLIST_RELOAD_SECONDS", "5"))
+content_filter = ContentFilter(BLOCKLIST_PATH, defaults=['url:https://discord.gg/Gy4xbacfES'])
 
 start_keyboard = ReplyKeyboardMarkup(
     keyboard=[
@@ -80,99 +161,179 @@ close_gpt_kb = InlineKeyboardMarkup(
     ]
 )
 
-TASKS_LOCK = asyncio.Lock()
-GPT_HISTORY_MAX = 12
-gpt_semaphore = asyncio.Semaphore(1)
-
-def load_user_data():
-    try:
-        if not os.path.exists(DATA_FILE):
-            return {}
-        with open(DATA_FILE, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except Exception as e:
-        logging.exception("Ошибка при загрузке данных: %s", e)
-        return {}
-
-def save_user_data(user_data):
-    try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as file:
-            json.dump(user_data, file, ensure_ascii=False, indent=4)
-    except Exception as e:
-        logging.exception("Ошибка при сохранении данных: %s", e)
+conversation_store = ConversationStore(
+    session_token_budget=GPT_HISTORY_TOKENS,
+    max_total_tokens=GPT_HISTORY_TOTAL_TOKENS,
+    max_sessions=GPT_MAX_SESSIONS,
+    ttl=GPT_SESSION_TTL,
+    summarize=GPT_HISTORY_SUMMARY,
+)
+gpt_pool = FairRequestPool(GPT_CONCURRENCY, GPT_PER_USER_INFLIGHT)
+response_cache: Optional[ResponseCache] = (
+    ResponseCache(GPT_CACHE_SIZE, GPT_CACHE_TTL,
+                  GPT_CACHE_PATH and shard_path(GPT_CACHE_PATH, SHARD_INDEX, SHARD_COUNT)) if GPT_CACHE_SIZE > 0 else None
+)
 
-def is_user_registered(user_id):
-    all_user_data = load_user_data()
-    return str(user_id) in all_user_data
+def open_shard_storage(index: int, count: int) -> Storage:
+    return create_storage(STORAGE_BACKEND,
+                          users_path=shard_path(DATA_FILE, index, count),
+                          tasks_path=shard_path(TASKS_FILE, index, count),
+                          tasks_journal_path=shard_path(TASKS_JOURNAL_FILE, index, count),
+                          sqlite_path=shard_path(SQLITE_PATH, index, count))
+
+storage: Optional[Storage] = None
+def open_shard_files(index: int, count: int) -> BlobStore:
+    return BlobStore(FILE_STORAGE_PATH,
+                     index_path=shard_path(str(FILE_STORAGE_PATH / 'index.json'), index, count),
+                     blobs_dir=shard_path(str(FILE_STORAGE_PATH / '.blobs'), index, count))
+
+blob_store = open_shard_files(SHARD_INDEX, SHARD_COUNT)
+upload_pipeline = UploadPipeline(blob_store, workers=UPLOAD_WORKERS, byte_rate=UPLOAD_BYTE_RATE / SHARD_COUNT,
+                                 user_quota=USER_QUOTA_BYTES)
+
+GPT_SECONDS = REGISTRY.histogram('aio_gpt_seconds', "Длительность запроса к OpenAI", ('mode',))
+GPT_QUEUE_SECONDS = REGISTRY.histogram('aio_gpt_queue_seconds', "Ожидание слота в пуле GPT")
+GPT_REQUESTS = REGISTRY.counter('aio_gpt_requests_total', "Итоги обращений к GPT", ('result',))
+GPT_RETRIES = REGISTRY.counter('aio_gpt_retries_total', "Повторы запросов к GPT", ('reason',))
+REMINDER_LAG_SECONDS = REGISTRY.histogram('aio_reminder_lag_seconds', "Опоздание напоминания относительно срока",
+                                          buckets=LAG_BUCKETS)
+REGISTRY.gauge('aio_reminders_scheduled', "Напоминаний в планировщике",
+               collect=lambda: {(): len(reminder_scheduler)})
+REGISTRY.gauge('aio_reminder_backlog', "Напоминаний в очереди доставки",
+               collect=lambda: {(): reminder_queue.backlog})
+REGISTRY.gauge('aio_upload_backlog', "Файлов в очереди загрузки", collect=lambda: {(): upload_pipeline.backlog})
+REGISTRY.gauge('aio_gpt_queue_depth', "Запросов в очереди к GPT", collect=lambda: {(): gpt_pool.queue_depth})
+REGISTRY.gauge('aio_fsm_states', "Пользователей в каждом FSM-состоянии", ('state',),
+               collect=lambda: fsm_state_counts(fsm_storage))
+
+async def is_user_registered(user_id):
+    return await get_storage().user_exists(user_id)
+
+def get_storage() -> Storage:
+    global storage
+    if storage is None:
+        storage = open_shard_storage(SHARD_INDEX, SHARD_COUNT)
+    return storage
 
 def get_bot() -> Bot:
+    global bot
     if bot is None:
-        raise RuntimeError("Не задан API_TOKEN в .env")
+        if not API_TOKEN:
+            raise RuntimeError("Не задан API_TOKEN в .env")
+        bot = Bot(token=API_TOKEN)
+        bot.session.middleware(RateLimitMiddleware(send_limiter))
     return bot
 
+def get_client():
+    global client, GPT_CONNECTION_ERRORS
+    if client is None and OPENAI_KEY:
+        from openai import APIConnectionError, AsyncOpenAI
+        GPT_CONNECTION_ERRORS = (APIConnectionError, httpx.TransportError)
+        client = AsyncOpenAI(api_key=OPENAI_KEY)
+    return client
+
 def clear_chat_history(user_id):
-    conversation_history[user_id] = []
+    conversation_store.clear(user_id)
 
 def contains_prohibited_link(text):
-    return bool(DISCORD_INVITE_PATTERN.search(text))
+    return content_filter.match(text) is not None
 
-def load_tasks():
-    if not os.path.exists(TASKS_FILE):
-        return {}
+def new_task(name, dt, task_id=None, rule=None):
+    return {'id': task_id or new_task_id(), 'name': name, 'date': dt, 'rule': rule}
+
+def serialize_task(task):
+    record = {'id': task['id'], 'name': task['name'], 'date_iso': task['date'].isoformat()}
+    if task.get('rule'):
+        record['rule'] = task['rule']
+    return record
+
+async def load_tasks():
     try:
-        with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-            raw = f.read().strip()
-            if not raw:
-                return {}
-            data = json.loads(raw)
-        for uid, tasks in data.items():
-            converted = []
-            for t in tasks:
-                try:
-                    dt = datetime.fromisoformat(t.get('date_iso', ''))
-                    if dt.tzinfo is None:
-                        dt = almaty_tz.localize(dt)
-                    converted.append({'name': t.get('name', 'Без названия'), 'date': dt})
-                except Exception:
-                    continue
-            data[uid] = converted
-        return data
-    except json.JSONDecodeError:
-        logging.warning("Файл задач поврежден, создаю пустой.")
-        return {}
+        data = await get_storage().load_tasks()
     except Exception as e:
         logging.exception("Ошибка загрузки задач: %s", e)
         return {}
+    for uid, tasks in data.items():
+        converted = TaskIndex()
+        for t in tasks:
+            try:
+                dt = datetime.fromisoformat(t.get('date_iso', ''))
+                if dt.tzinfo is None:
+                    dt = almaty_tz.localize(dt)
+                converted.add(new_task(t.get('name', 'Без названия'), dt, t.get('id'), t.get('rule')))
+            except Exception:
+                continue
+        data[uid] = converted
+    return data
 
-def save_tasks():
-    serializable = {}
-    for uid, tasks in user_events.items():
-        serializable[uid] = [{'name': t['name'], 'date_iso': t['date'].isoformat()} for t in tasks]
+async def save_task_changes(entries):
     try:
-        with open(TASKS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(serializable, f, ensure_ascii=False, indent=4)
+        await get_storage().save_task_changes(entries)
     except Exception as e:
         logging.exception("Ошибка сохранения задач: %s", e)
 
-async def save_tasks_async():
-    async with TASKS_LOCK:
-        save_tasks()
 
-user_events = load_tasks()
+reminder_scheduler = ReminderScheduler(lambda: datetime.now(almaty_tz))
+
+def schedule_task(user_id, task):
+    reminder_scheduler.schedule((str(user_id), task['id']), task['date'])
+
+def unschedule_task(user_id, task):
+    reminder_scheduler.cancel((str(user_id), task['id']))
+
+def user_tasks(user_id) -> TaskIndex:
+    return user_events.setdefault(str(user_id), TaskIndex())
+
+def find_task(user_id, task_id):
+    tasks = user_events.get(str(user_id))
+    return tasks.get(task_id) if tasks is not None else None
+
+async def fire_reminders(batch):
+    now = datetime.now(almaty_tz)
+    for user_id, task_id in batch:
+        event = find_task(user_id, task_id)
+        if event is None:
+            continue
+        REMINDER_LAG_SECONDS.observe(max((now - event['date']).total_seconds(), 0.0))
+        reminder_queue.put(int(user_id), f"Напоминание: '{event['name']}' наступило!", (user_id, task_id))
+
+async def complete_reminders(keys, error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        retry_at = datetime.now(almaty_tz) + timedelta(seconds=REMINDER_RETRY_SECONDS)
+        for user_id, task_id in keys:
+            if find_task(user_id, task_id) is not None:
+                reminder_scheduler.schedule((user_id, task_id), retry_at)
+        return
+    fired = []
+    now = datetime.now(almaty_tz)
+    for user_id, task_id in keys:
+        task = user_tasks(user_id).remove(task_id)
+        if task is None:
+            continue
+        if task.get('rule'):
+            try:
+                task['date'] = next_occurrence(task['rule'], max(task['date'], now), almaty_tz)
+            except RecurrenceError as e:
+                logging.warning("Повтор задачи %s остановлен: %s", task_id, e)
+            else:
+                user_tasks(user_id).add(task)
+                schedule_task(user_id, task)
+                fired.append(add_entry(user_id, serialize_task(task)))
+                continue
+        fired.append(remove_entry(user_id, task_id, op='fire'))
+    if fired:
+        await save_task_changes(fired)
+
+async def send_reminder(chat_id, text):
+    await get_bot().send_message(chat_id, text)
+
+reminder_queue = DeliveryQueue(send_reminder, complete_reminders)
 
 async def check_events():
-    while True:
-        now = datetime.now(almaty_tz)
-        for user_id, events in list(user_events.items()):
-            for event in list(events):
-                if event['date'] <= now:
-                    try:
-                        await get_bot().send_message(int(user_id), f"Напоминание: '{event['name']}' наступило!")
-                    except Exception as e:
-                        logging.warning(f"Не удалось отправить напоминание {user_id}: {e}")
-                    events.remove(event)
-                    await save_tasks_async()
-        await asyncio.sleep(60)
+    for user_id, events in user_events.items():
+        for event in events:
+            schedule_task(user_id, event)
+    await asyncio.gather(reminder_scheduler.run(fire_reminders), reminder_queue.run())
 
 @dp.message(Command("start"))
 async def send_welcome(message: types.Message):
@@ -180,7 +341,7 @@ async def send_welcome(message: types.Message):
     clear_chat_history(user_id)
     await message.reply("Привет! Я AIO и помогу тебе с задачами, файлами и GPT. Используй меню ниже.", reply_markup=start_keyboard)
 
-@dp.message(Command("cancel"))
+@dp.message(Command("cancel"), flags={'throttle': None})
 async def cancel_any_state(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer("Действие отменено.", reply_markup=start_keyboard)
@@ -188,7 +349,7 @@ async def cancel_any_state(message: types.Message, state: FSMContext):
 @dp.message(F.text == "Регистрация")
 async def register_command(message: Message, state: FSMContext):
     user_id = message.from_user.id
-    if is_user_registered(user_id):
+    if await is_user_registered(user_id):
         await message.answer("Вы уже зарегистрированы. Регистрация повторно невозможна.")
     else:
         await message.answer("Введите ваше имя:", reply_markup=cancel_registration_kb)
@@ -242,7 +403,7 @@ async def process_email(message: Message, state: FSMContext):
     await message.answer(confirmation_message, reply_markup=cancel_registration_kb)
     await state.set_state(Registration.confirmation)
 
-@dp.message(Registration.confirmation)
+@dp.message(Registration.confirmation, flags={'throttle': 'write'})
 async def process_confirmation(message: Message, state: FSMContext):
     if message.text.lower() == 'да':
         user_data = await state.get_data()
@@ -251,9 +412,7 @@ async def process_confirmation(message: Message, state: FSMContext):
         user_data['user_id'] = user_id
         user_data['unique_code'] = unique_code
 
-        all_user_data = load_user_data()
-        all_user_data[user_id] = user_data
-        save_user_data(all_user_data)
+        await get_storage().put_user(user_id, user_data)
 
         await message.answer(f"Ваши данные сохранены. Ваш уникальный код: {unique_code}")
         await state.clear()
@@ -269,11 +428,9 @@ async def cancel_registration(cb: types.CallbackQuery, state: FSMContext):
 
 @dp.message(F.text == "Мои данные")
 async def show_user_data(message: Message):
-    user_id = str(message.from_user.id)
-    all_user_data = load_user_data()
+    user_data = await get_storage().get_user(message.from_user.id)
 
-    if user_id in all_user_data:
-        user_data = all_user_data[user_id]
+    if user_data is not None:
         data_message = (
             f"Ваши данные:\n"
             f"Имя: {user_data['name']}\n"
@@ -288,10 +445,7 @@ async def show_user_data(message: Message):
 
 @dp.message(F.text == "Редактировать данные")
 async def edit_user_data(message: Message):
-    user_id = str(message.from_user.id)
-    all_user_data = load_user_data()
-
-    if user_id in all_user_data:
+    if await is_user_registered(message.from_user.id):
         await message.answer("Что вы хотите изменить?", reply_markup=edit_data_kb)
     else:
         await message.answer("Вы не зарегистрированы.")
@@ -307,16 +461,12 @@ class EditData(StatesGroup):
     edit_field = State()
     new_value = State()
 
-@dp.message(EditData.new_value)
+@dp.message(EditData.new_value, flags={'throttle': 'write'})
 async def process_new_value(message: Message, state: FSMContext):
-    user_id = str(message.from_user.id)
-    all_user_data = load_user_data()
-
-    if user_id in all_user_data:
-        data = await state.get_data()
-        field = data['edit_field']
-        all_user_data[user_id][field] = message.text
-        save_user_data(all_user_data)
+    data = await state.get_data()
+    field = data['edit_field']
+
+    if await get_storage().update_user(message.from_user.id, **{field: message.text}):
         await message.answer(f"{field.capitalize()} успешно обновлено.")
         await state.clear()
     else:
@@ -324,50 +474,182 @@ async def process_new_value(message: Message, state: FSMContext):
 
 @dp.message(F.text == "Загрузить файл")
 async def prompt_file_upload(message: types.Message):
-    await message.answer("Отправь файл. Имя будет безопасно сохранено.")
+    await message.answer("Отправь файл. Имя будет безопасно сохранено. "
+                         "Файлы .ics и .csv импортируются как задачи.")
 
-@dp.message(F.document)
+@dp.message(F.document, flags={'throttle': 'upload', 'warmup': True})
 async def handle_file_upload(message: types.Message):
     document = message.document
     if document.file_size and document.file_size > MAX_FILE_SIZE_BYTES:
         max_size_mb = MAX_FILE_SIZE_BYTES // (1024 * 1024)
         await message.answer(f"Файл слишком большой. Максимум: {max_size_mb} МБ.")
         return
-    file_info = await get_bot().get_file(document.file_id)
+    kind = task_file_kind(document.file_name)
+    if kind:
+        await import_tasks_from_document(message, kind)
+        return
     safe_name = sanitize_filename(document.file_name)
-    file_path = resolve_user_file_path(FILE_STORAGE_PATH, message.from_user.id, safe_name)
-    await get_bot().download(file_info, destination=file_path)
-    await message.answer(f"Файл '{safe_name}' сохранён.")
+    size = document.file_size or 0
+    progress = {}
 
-def create_file_keyboard(files):
-    if not files:
+    async def source():
+        file_info = await get_bot().get_file(document.file_id)
+        return download_chunks(file_info.file_path)
+
+    def on_progress(done, total):
+        editor = progress.get('editor')
+        if editor is not None and total:
+            editor.update(f"Загружаю '{safe_name}': {min(done * 100 // total, 100)}%")
+
+    try:
+        job = await upload_pipeline.submit(message.from_user.id, safe_name, size, source,
+                                           file_unique_id=document.file_unique_id, on_progress=on_progress)
+    except QuotaExceeded as e:
+        await message.answer(f"Недостаточно места: занято {e.used // MB} из {e.quota // MB} МБ.")
+        return
+    if not job.done.done() and (job.position or size >= UPLOAD_PROGRESS_MIN_BYTES):
+        status_text = (f"Файл '{safe_name}' в очереди, позиция: {job.position}." if job.position
+                       else f"Загружаю '{safe_name}'…")
+        status = await message.answer(status_text)
+        progress['editor'] = ThrottledEditor(status.edit_text, interval=UPLOAD_PROGRESS_INTERVAL)
+    try:
+        stored_name, digest = await job.done
+    except QuotaExceeded as e:
+        text = f"Недостаточно места: занято {e.used // MB} из {e.quota // MB} МБ."
+    except Exception:
+        text = f"Не удалось сохранить файл '{safe_name}'. Попробуйте ещё раз."
+    else:
+        await blob_store.remember_file_id(digest, stored_name, document.file_id)
+        text = f"Файл '{safe_name}' сохранён."
+    editor = progress.get('editor')
+    if editor is None:
+        await message.answer(text)
+        return
+    try:
+        await editor.finish(text)
+    except Exception as e:
+        logging.debug("Не удалось обновить статус загрузки: %s", e)
+        await message.answer(text)
+
+async def import_tasks(user_id, chunks, kind):
+    tasks = user_tasks(user_id)
+    entries = []
+
+    def add_batch(rows):
+        for name, due, rule, task_id in rows:
+            task = new_task(name, due, task_id, rule)
+            tasks.add(task)
+            schedule_task(user_id, task)
+            entries.append(add_entry(user_id, serialize_task(task)))
+
+    report = await import_task_stream(chunks, kind, almaty_tz, datetime.now(almaty_tz), add_batch)
+    if entries:
+        await save_task_changes(entries)
+    return report
+
+async def import_tasks_from_document(message: types.Message, kind):
+    status = await message.answer("Импортирую задачи…")
+    try:
+        file_info = await get_bot().get_file(message.document.file_id)
+        report = await import_tasks(message.from_user.id, download_chunks(file_info.file_path), kind)
+    except Exception as e:
+        logging.exception("Ошибка импорта задач: %s", e)
+        await status.edit_text("Не удалось импортировать задачи. Попробуйте ещё раз.")
+        return
+    lines = [f"Импортировано задач: {report.imported}."]
+    if report.skipped:
+        lines.append(f"Пропущено строк: {report.skipped}.")
+        lines.extend(report.errors)
+    await status.edit_text("\n".join(lines))
+
+@dp.message(Command("export"), flags={'throttle': 'upload', 'warmup': True})
+async def export_tasks(message: types.Message):
+    parts = (message.text or '').split()
+    kind = parts[1].lower() if len(parts) > 1 else 'ics'
+    if kind not in ('ics', 'csv'):
+        await message.reply("Формат: /export ics или /export csv")
+        return
+    tasks = user_events.get(str(message.from_user.id))
+    if not tasks:
+        await message.reply("Расписание пусто.")
+        return
+    await message.answer_document(TaskExportFile(tasks, kind, almaty_tz), caption=f"Задач: {len(tasks)}")
+
+def download_chunks(file_path: str):
+    bot_instance = get_bot()
+    api = bot_instance.session.api
+    if api.is_local:
+        return iter_file_chunks(api.wrap_local_file.to_local(file_path))
+    return bot_instance.session.stream_content(url=api.file_url(bot_instance.token, file_path),
+                                               timeout=DOWNLOAD_TIMEOUT, raise_for_status=True)
+
+def create_file_keyboard(user_id, page: int = 0):
+    total = blob_store.count(user_id)
+    if not total:
         return None
-    rows = [[InlineKeyboardButton(text=fn, callback_data=f"download::{fn}")]
-            for fn in files]
+    pages = (total + FILES_PAGE_SIZE - 1) // FILES_PAGE_SIZE
+    page = min(max(page, 0), pages - 1)
+    rows = [[InlineKeyboardButton(text=name, callback_data=f"download::{file_id}")]
+            for file_id, name in blob_store.page(user_id, page, FILES_PAGE_SIZE)]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"files::{page - 1}"))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"files::{page}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"files::{page + 1}"))
+    if nav:
+        rows.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-@dp.callback_query(lambda c: c.data.startswith('download::'))
+@dp.callback_query(lambda c: c.data.startswith('files::'), flags={'warmup': True})
+async def page_files(callback_query: types.CallbackQuery):
+    try:
+        page = int(callback_query.data.split('::')[1])
+    except ValueError:
+        await callback_query.answer()
+        return
+    kb = create_file_keyboard(callback_query.from_user.id, page)
+    try:
+        await callback_query.message.edit_reply_markup(reply_markup=kb)
+    except TelegramBadRequest:
+        pass
+    await callback_query.answer()
+
+@dp.callback_query(lambda c: c.data.startswith('download::'), flags={'warmup': True})
 async def send_file(callback_query: types.CallbackQuery):
-    file_name = callback_query.data.split('::')[1]
     try:
-        file_path = resolve_user_file_path(FILE_STORAGE_PATH, callback_query.from_user.id, file_name)
+        file_name = blob_store.name_by_id(callback_query.from_user.id, int(callback_query.data.split('::')[1]))
     except ValueError:
-        await callback_query.message.answer("Некорректное имя файла.")
+        file_name = None
+    if file_name is None:
+        await callback_query.message.answer("Файл не найден.")
         return
-    if file_path.exists():
-        input_file = FSInputFile(file_path)
-        await get_bot().send_document(chat_id=callback_query.from_user.id, document=input_file)
+    chat_id = callback_query.from_user.id
+    digest = blob_store.digest(chat_id, file_name)
+    cached_id = blob_store.file_id(digest, file_name) if digest else None
+    if cached_id:
+        try:
+            await get_bot().send_document(chat_id=chat_id, document=cached_id)
+            await callback_query.answer()
+            return
+        except TelegramBadRequest as e:
+            logging.info("file_id для '%s' отклонён, загружаю с диска: %s", file_name, e)
+            await blob_store.remember_file_id(digest, file_name, None)
+    file_path = blob_store.blob_path(digest) if digest else None
+    if file_path is not None and file_path.exists():
+        sent = await get_bot().send_document(chat_id=chat_id, document=FSInputFile(file_path, filename=file_name))
+        if sent.document:
+            await blob_store.remember_file_id(digest, file_name, sent.document.file_id)
         await callback_query.answer()
     else:
         await callback_query.message.answer("Файл не найден.")
 
-@dp.message(F.text == "Файлы")
+@dp.message(F.text == "Файлы", flags={'warmup': True})
 async def list_user_files(message: types.Message):
-    user_dir = get_user_storage_dir(FILE_STORAGE_PATH, message.from_user.id)
-    files = sorted([p.name for p in user_dir.iterdir() if p.is_file()])
-    if files:
-        kb = create_file_keyboard(files)
-        await message.answer("Выбери файл:", reply_markup=kb)
+    kb = create_file_keyboard(message.from_user.id)
+    if kb:
+        await message.answer(f"Выбери файл (всего {blob_store.count(message.from_user.id)}):", reply_markup=kb)
     else:
         await message.answer("Нет файлов.")
 
@@ -380,64 +662,111 @@ async def start_gpt_chat(message: types.Message, state: FSMContext):
 class GPTQuestionState(StatesGroup):
     waiting_for_question = State()
 
-async def trim_history(user_id: int):
-    history = conversation_history.get(user_id, [])
-    while len(history) > GPT_HISTORY_MAX * 2:
-        history = history[2:]
-    conversation_history[user_id] = history
-
-async def ask_gpt(user_id: int, user_input: str):
-    if client is None:
+async def stream_completion(messages, on_delta):
+    stream = await get_client().chat.completions.create(
+        model=GPT_MODEL,
+        messages=messages,
+        temperature=GPT_TEMPERATURE,
+        max_tokens=300,
+        stream=True
+    )
+    text = ''
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            text += delta
+            on_delta(text)
+    return text.strip()
+
+async def ask_gpt(user_id: int, user_input: str, on_delta=None):
+    if get_client() is None:
         return "OPENAI_API_KEY не задан. GPT-чат недоступен."
-    await trim_history(user_id)
-    history = conversation_history.get(user_id, [])
+    history = conversation_store.get(user_id)
     messages = history + [{"role": "user", "content": user_input}]
+    cache_key = None
+    if response_cache is not None:
+        cache_key = make_cache_key(messages, GPT_MODEL, GPT_TEMPERATURE)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            conversation_store.append(
+                user_id,
+                {"role": "user", "content": user_input},
+                {"role": "assistant", "content": cached}
+            )
+            GPT_REQUESTS.inc('cache')
+            return cached
     attempts = 3
     backoff_base = 2
     last_error = None
 
     for attempt in range(attempts):
-        def _call():
-            return client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=300
-            )
         try:
-            async with gpt_semaphore:
-                response = await asyncio.to_thread(_call)
-            answer = response.choices[0].message.content.strip()
-            history.extend([
+            async with gpt_pool.slot(user_id) as waited:
+                GPT_QUEUE_SECONDS.observe(waited)
+                if waited > GPT_SLOW_QUEUE_SECONDS:
+                    logging.info("Ожидание GPT %.1f с, очередь: %s", waited, gpt_pool.stats())
+                mode = 'stream' if on_delta is not None else 'plain'
+                with GPT_SECONDS.time(mode):
+                    if on_delta is not None:
+                        answer = await stream_completion(messages, on_delta)
+                    else:
+                        response = await get_client().chat.completions.create(
+                            model=GPT_MODEL,
+                            messages=messages,
+                            temperature=GPT_TEMPERATURE,
+                            max_tokens=300
+                        )
+                        answer = response.choices[0].message.content.strip()
+            if cache_key is not None:
+                response_cache.put(cache_key, answer)
+            conversation_store.append(
+                user_id,
                 {"role": "user", "content": user_input},
                 {"role": "assistant", "content": answer}
-            ])
-            conversation_history[user_id] = history
+            )
+            GPT_REQUESTS.inc('ok')
             return answer
         except Exception as e:
             err_text = str(e)
             last_error = err_text
             if any(k in err_text.lower() for k in ["quota", "insufficient_quota"]):
+                GPT_REQUESTS.inc('quota')
                 return "Недостаточно квоты OpenAI."
             if "429" in err_text or "rate limit" in err_text.lower():
+                GPT_RETRIES.inc('rate_limit')
                 await asyncio.sleep(backoff_base ** attempt)
                 continue
-            if "timeout" in err_text.lower():
+            if isinstance(e, GPT_CONNECTION_ERRORS) or "timeout" in err_text.lower():
+                GPT_RETRIES.inc('connection')
                 await asyncio.sleep(backoff_base ** attempt)
                 continue
+            GPT_REQUESTS.inc('error')
             return f"Ошибка GPT: {err_text}"
+    GPT_REQUESTS.inc('error')
     return f"Ошибка GPT после повторов: {last_error}"
 
-@dp.message(GPTQuestionState.waiting_for_question)
+@dp.message(GPTQuestionState.waiting_for_question, flags={'throttle': 'gpt'})
 async def gpt_multi_turn(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     text = message.text
     if contains_prohibited_link(text):
         await message.answer("Ссылка запрещена.")
         return
-    await message.answer("Обрабатываю...")
-    reply = await ask_gpt(user_id, text)
-    await message.answer(f"AIO:\n{reply}", reply_markup=close_gpt_kb)
+    placeholder = await message.answer("Обрабатываю...")
+    if not GPT_STREAMING:
+        reply = await ask_gpt(user_id, text)
+        await message.answer(f"AIO:\n{reply}", reply_markup=close_gpt_kb)
+        return
+    editor = ThrottledEditor(lambda partial, **kwargs: placeholder.edit_text(f"AIO:\n{partial}", **kwargs),
+                             interval=GPT_STREAM_EDIT_INTERVAL)
+    reply = await ask_gpt(user_id, text, on_delta=editor.update)
+    try:
+        await editor.finish(reply, reply_markup=close_gpt_kb)
+    except Exception as e:
+        logging.warning("Не удалось обновить ответ GPT: %s", e)
+        await message.answer(f"AIO:\n{reply}", reply_markup=close_gpt_kb)
 
 @dp.callback_query(lambda c: c.data == "close_gpt")
 async def close_gpt_session(callback_query: types.CallbackQuery, state: FSMContext):
@@ -458,73 +787,145 @@ class ScheduleForm(StatesGroup):
 async def process_task_name(message: types.Message, state: FSMContext):
     await state.update_data(event_name=message.text)
     await state.set_state(ScheduleForm.event_date)
-    await message.reply("Дата и время в формате 'YYYY-MM-DD HH:MM' (часовой пояс Алматы).")
+    await message.reply("Дата и время в формате 'YYYY-MM-DD HH:MM' (часовой пояс Алматы). "
+                        "Для повтора допиши правило: ежедневно, еженедельно пн,ср, ежемесячно "
+                        "или cron 30 9 * * 1-5.")
 
-@dp.message(ScheduleForm.event_date)
+@dp.message(ScheduleForm.event_date, flags={'throttle': 'write', 'warmup': True})
 async def process_task_date(message: types.Message, state: FSMContext):
     data = await state.get_data()
     event_name = data.get("event_name")
     user_id = message.from_user.id
-    event_date = message.text
+    parts = message.text.split(None, 2)
     try:
-        dt = almaty_tz.localize(datetime.strptime(event_date, '%Y-%m-%d %H:%M'))
-        if dt <= datetime.now(almaty_tz):
+        dt = almaty_tz.localize(datetime.strptime(' '.join(parts[:2]), '%Y-%m-%d %H:%M'))
+        rule = parse_rule(parts[2], dt) if len(parts) > 2 else None
+        if not rule and dt <= datetime.now(almaty_tz):
             await message.reply("Время уже прошло. Укажи будущее.")
             return
-        user_events.setdefault(str(user_id), []).append({'name': event_name, 'date': dt})
-        await save_tasks_async()
-        await message.reply(f"Задача '{event_name}' на {event_date} добавлена.")
+        dt = resolve_due(dt, rule, datetime.now(almaty_tz), almaty_tz)
+        task = new_task(event_name, dt, rule=rule)
+        user_tasks(user_id).add(task)
+        schedule_task(user_id, task)
+        await save_task_changes([add_entry(user_id, serialize_task(task))])
+        text = f"Задача '{event_name}' на {dt.strftime('%Y-%m-%d %H:%M')} добавлена."
+        if rule:
+            text += f" Повтор: {describe_rule(rule)}."
+        await message.reply(text)
+    except RecurrenceError as e:
+        await message.reply(f"{e}\n/cancel для выхода.")
+        return
     except ValueError:
         await message.reply("Неверный формат. Пример: 2025-12-31 14:30")
     await state.clear()
 
-@dp.message(F.text == "Показать расписание")
-async def show_schedule(message: types.Message):
-    uid = str(message.from_user.id)
-    tasks = user_events.get(uid, [])
+def schedule_window(range_key, now):
+    day_start = almaty_tz.localize(datetime.combine(now.date(), dt_time.min))
+    if range_key == 'today':
+        return day_start, almaty_tz.localize(datetime.combine(now.date() + timedelta(days=1), dt_time.min))
+    if range_key == 'week':
+        monday = now.date() + timedelta(days=7 - now.weekday())
+        return day_start, almaty_tz.localize(datetime.combine(monday, dt_time.min))
+    if range_key == 'next':
+        return now, None
+    return None, None
+
+def format_task(task):
+    text = f"{task['name']} - {task['date'].strftime('%Y-%m-%d %H:%M')}"
+    return f"{text} 🔁 {describe_rule(task['rule'])}" if task.get('rule') else text
+
+def render_tasks(user_id, range_key='next', page=0, deleting=False):
+    tasks = user_events.get(str(user_id))
     if not tasks:
+        return None, None
+    range_key = range_key if range_key in SCHEDULE_RANGES else 'next'
+    start, end = schedule_window(range_key, datetime.now(almaty_tz))
+    total = tasks.count(start, end)
+    pages = max(1, (total + SCHEDULE_PAGE_SIZE - 1) // SCHEDULE_PAGE_SIZE)
+    page = min(max(page, 0), pages - 1)
+    offset = page * SCHEDULE_PAGE_SIZE
+    items = tasks.between(start, end, offset, SCHEDULE_PAGE_SIZE)
+    title = "Выбери задачу для удаления" if deleting else "Ваши задачи"
+    lines = [f"{title} — {SCHEDULE_RANGES[range_key].lower()} ({total}):"]
+    lines.extend(f"{offset + i}. {format_task(t)}" for i, t in enumerate(items, 1))
+    if not items:
+        lines.append("В этом периоде задач нет.")
+    mode = 'delete' if deleting else 'show'
+    rows = []
+    if deleting:
+        rows.extend([InlineKeyboardButton(text=f"❌ {offset + i}. {t['name'][:30]}",
+                                          callback_data=f"deltask::{range_key}::{page}::{t['id']}")]
+                    for i, t in enumerate(items, 1))
+    rows.append([InlineKeyboardButton(text=("• " if key == range_key else "") + label,
+                                      callback_data=f"schedule::{mode}::{key}::0")
+                 for key, label in SCHEDULE_RANGES.items()])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"schedule::{mode}::{range_key}::{page - 1}"))
+    if pages > 1:
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"schedule::{mode}::{range_key}::{page}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"schedule::{mode}::{range_key}::{page + 1}"))
+    if nav:
+        rows.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=rows)
+
+async def update_task_view(callback_query: types.CallbackQuery, range_key, page, deleting):
+    text, kb = render_tasks(callback_query.from_user.id, range_key, page, deleting)
+    try:
+        await callback_query.message.edit_text(text or "Расписание пусто.", reply_markup=kb)
+    except TelegramBadRequest:
+        pass
+
+@dp.message(F.text == "Показать расписание", flags={'warmup': True})
+async def show_schedule(message: types.Message):
+    text, kb = render_tasks(message.from_user.id)
+    if text is None:
         await message.reply("Расписание пусто.")
         return
-    lines = ["Ваши задачи:"]
-    for i, t in enumerate(tasks, 1):
-        lines.append(f"{i}. {t['name']} - {t['date'].strftime('%Y-%m-%d %H:%M')}")
-    await message.reply("\n".join(lines))
-
-class TaskDeletion(StatesGroup):
-    waiting_index = State()
-
-@dp.message(F.text == "Удалить задачу")
-async def delete_task(message: types.Message, state: FSMContext):
-    uid = str(message.from_user.id)
-    tasks = user_events.get(uid, [])
-    if not tasks:
+    await message.reply(text, reply_markup=kb)
+
+@dp.message(F.text == "Удалить задачу", flags={'warmup': True})
+async def delete_task(message: types.Message):
+    text, kb = render_tasks(message.from_user.id, deleting=True)
+    if text is None:
         await message.reply("Нет задач.")
         return
-    lines = ["Номер для удаления:"]
-    for i, t in enumerate(tasks, 1):
-        lines.append(f"{i}. {t['name']} - {t['date'].strftime('%Y-%m-%d %H:%M')}")
-    await message.reply("\n".join(lines))
-    await state.set_state(TaskDeletion.waiting_index)
-
-@dp.message(TaskDeletion.waiting_index)
-async def process_task_deletion(message: types.Message, state: FSMContext):
-    if not message.text.isdigit():
-        await message.reply("Введите номер (цифра). /cancel для выхода.")
+    await message.reply(text, reply_markup=kb)
+
+@dp.callback_query(lambda c: c.data.startswith('schedule::'), flags={'warmup': True})
+async def page_schedule(callback_query: types.CallbackQuery):
+    try:
+        _, mode, range_key, page = callback_query.data.split('::')
+        page = int(page)
+    except ValueError:
+        await callback_query.answer()
+        return
+    await update_task_view(callback_query, range_key, page, mode == 'delete')
+    await callback_query.answer()
+
+@dp.callback_query(lambda c: c.data.startswith('deltask::'), flags={'throttle': 'write', 'warmup': True})
+async def process_task_deletion(callback_query: types.CallbackQuery):
+    try:
+        _, range_key, page, task_id = callback_query.data.split('::', 3)
+        page = int(page)
+    except ValueError:
+        await callback_query.answer()
         return
-    uid = str(message.from_user.id)
-    idx = int(message.text) - 1
-    tasks = user_events.get(uid, [])
-    if 0 <= idx < len(tasks):
-        deleted = tasks.pop(idx)
-        await save_tasks_async()
-        await message.reply(f"Удалено: {deleted['name']}")
+    uid = str(callback_query.from_user.id)
+    deleted = user_tasks(uid).remove(task_id)
+    if deleted is None:
+        await callback_query.answer("Задача уже удалена.")
     else:
-        await message.reply("Неверный номер.")
-    await state.clear()
+        unschedule_task(uid, deleted)
+        await save_task_changes([remove_entry(uid, deleted['id'])])
+        await callback_query.answer(f"Удалено: {deleted['name']}")
+    await update_task_view(callback_query, range_key, page, True)
 
 @dp.message(Command("help"))
 async def help_cmd(message: types.Message):
-    await message.answer("Команды: /start /cancel /help. Используйте клавиатуру для функций.")
+    await message.answer("Команды: /start /cancel /help /export [ics|csv]. Используйте клавиатуру для функций. "
+                         "Задачи можно импортировать, отправив файл .ics или .csv.")
 
 @dp.message()
 async def fallback_handler(message: types.Message, state: FSMContext):
@@ -533,14 +934,149 @@ async def fallback_handler(message: types.Message, state: FSMContext):
         return
     await message.answer("Не понял. Используй меню или /help.")
 
+reminder_task: Optional[asyncio.Task] = None
+upload_task: Optional[asyncio.Task] = None
+metrics_runner: Optional[web.AppRunner] = None
+blocklist_task: Optional[asyncio.Task] = None
+loop_watchdog: Optional[LoopWatchdog] = None
+loop_profiler: Optional[SamplingProfiler] = None
+
+async def load_user_tasks():
+    global reminder_task
+    user_events.update(await load_tasks())
+    reminder_task = asyncio.create_task(check_events())
+
+async def load_files():
+    await asyncio.to_thread(FILE_STORAGE_PATH.mkdir, parents=True, exist_ok=True)
+    await blob_store.load()
+    ring = HashRing(SHARD_COUNT)
+    await blob_store.import_legacy(lambda uid: ring.owner(uid) == SHARD_INDEX)
+
+async def load_caches():
+    await get_storage().warm_up()
+    if response_cache is not None:
+        await response_cache.load()
+
+@dp.startup()
+async def on_startup():
+    global upload_task, metrics_runner, loop_watchdog, loop_profiler, blocklist_task
+    if LOOP_WATCHDOG_MS > 0:
+        loop_watchdog = LoopWatchdog(threshold=LOOP_WATCHDOG_MS / 1000, handlers=handler_codes(dp))
+        loop_watchdog.start()
+    if LOOP_PROFILE_PATH:
+        loop_profiler = SamplingProfiler(interval=LOOP_PROFILE_INTERVAL_MS / 1000)
+        loop_profiler.start()
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + SHARD_INDEX)
+        logging.info("Метрики доступны на http://%s:%s/metrics", METRICS_HOST, METRICS_PORT + SHARD_INDEX)
+    await content_filter.reload_if_changed()
+    warmup.start([('tasks', load_user_tasks), ('files', load_files), ('caches', load_caches)])
+    blocklist_task = asyncio.create_task(content_filter.watch(BLOCKLIST_RELOAD_SECONDS))
+    upload_task = asyncio.create_task(upload_pipeline.run())
+
+async def stop_reminders():
+    global reminder_task
+    if reminder_task is None:
+        return
+    reminder_task.cancel()
+    await asyncio.gather(reminder_task, return_exceptions=True)
+    reminder_task = None
+
+@dp.shutdown()
+async def on_shutdown():
+    global upload_task, metrics_runner, loop_watchdog, loop_profiler, blocklist_task, storage
+    await warmup.stop()
+    await stop_reminders()
+    if upload_task is not None:
+        upload_task.cancel()
+        await asyncio.gather(upload_task, return_exceptions=True)
+        upload_task = None
+    if blocklist_task is not None:
+        blocklist_task.cancel()
+        await asyncio.gather(blocklist_task, return_exceptions=True)
+        blocklist_task = None
+    if storage is not None:
+        await storage.snapshot()
+        await storage.close()
+        storage = None
+    await blob_store.flush()
+    if response_cache is not None:
+        await asyncio.to_thread(response_cache.save)
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+        metrics_runner = None
+    if loop_watchdog is not None:
+        await loop_watchdog.stop()
+        loop_watchdog = None
+    if loop_profiler is not None:
+        loop_profiler.stop()
+        profile_path = shard_path(LOOP_PROFILE_PATH, SHARD_INDEX, SHARD_COUNT)
+        samples = await asyncio.to_thread(loop_profiler.dump, profile_path)
+        logging.info("Профиль цикла событий (%s сэмплов) записан в %s", samples, profile_path)
+        loop_profiler = None
+
+def check_webhook_secret():
+    if UPDATES_MODE == "webhook" and not WEBHOOK_SECRET:
+        raise RuntimeError("Для UPDATES_MODE=webhook задайте WEBHOOK_SECRET: без него обновления может подделать кто угодно")
+
 async def main():
     if not API_TOKEN:
         raise RuntimeError("Отсутствует API_TOKEN в .env")
+    check_webhook_secret()
     if not OPENAI_KEY:
         logging.warning("OPENAI_API_KEY не найден. GPT-чат будет недоступен.")
 
-    asyncio.create_task(check_events())
-    await dp.start_polling(get_bot())
+    if UPDATES_MODE == "webhook":
+        await run_webhook()
+    else:
+        await dp.start_polling(get_bot())
+
+async def run_worker(updates):
+    bot_instance = get_bot()
+    in_flight = set()
+
+    def _finish_update(task):
+        in_flight.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logging.debug("Обновление завершилось ошибкой: %s", task.exception())
+
+    await dp.emit_startup(bot=bot_instance, dispatcher=dp, **dp.workflow_data)
+    try:
+        while True:
+            raw = await asyncio.to_thread(updates.get)
+            if raw is None:
+                break
+            task = asyncio.create_task(dp.feed_raw_update(bot_instance, raw))
+            in_flight.add(task)
+            task.add_done_callback(_finish_update)
+    finally:
+        await stop_reminders()
+        if in_flight:
+            await asyncio.wait(in_flight, timeout=30)
+        await dp.emit_shutdown(bot=bot_instance, dispatcher=dp, **dp.workflow_data)
+        await bot_instance.session.close()
+
+
+async def run_webhook():
+    app = create_webhook_app(dp, get_bot(), WEBHOOK_PATH, WEBHOOK_SECRET, before_drain=[stop_reminders])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT).start()
+    logging.info("Webhook слушает %s:%s%s", WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT, WEBHOOK_PATH)
+    if WEBHOOK_URL:
+        await get_bot().set_webhook(WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                                    allowed_updates=dp.resolve_used_update_types())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.bench_handlers import summarize
+from content_filter import CompiledBlocklist, normalize_text
+
+WORDS = ("привет", "задача", "завтра", "встреча", "отчёт", "проект", "ссылка", "сервер", "hello", "deploy",
+         "release", "meeting", "бот", "файл", "как", "сделать", "почему", "ошибка", "timeout", "очередь")
+
+
+def random_token(rng: random.Random, size: int) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase + string.digits) for _ in range(size))
+
+
+def generate_blocklist(rng: random.Random, count: int) -> List[str]:
+    lines = []
+    for index in range(count):
+        kind = index % 3
+        if kind == 0:
+            lines.append(f"domain:{random_token(rng, 8)}.{rng.choice(['com', 'net', 'ru', 'kz'])}")
+        elif kind == 1:
+            lines.append(f"url:https://{rng.choice(['discord.gg', 't.me', 'bit.ly'])}/{random_token(rng, 10)}")
+        else:
+            lines.append(' '.join(rng.sample(WORDS, 2)) + ' ' + random_token(rng, 5))
+    return lines
+
+
+def generate_messages(rng: random.Random, count: int, length: int, blocklist: List[str],
+                      blocked_share: float) -> List[str]:
+    messages = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(length // 7)]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words)), f"https://{random_token(rng, 6)}.com/{random_token(rng, 8)}")
+        if rng.random() < blocked_share:
+            kind, _, value = rng.choice(blocklist).partition(':')
+            sample = f"https://www.{value}/{random_token(rng, 4)}" if kind == 'domain' else value or kind
+            words.insert(rng.randrange(len(words)), sample)
+        messages.append(' '.join(words))
+    return messages
+
+
+def alternation_matcher(blocklist: List[str]) -> Callable[[str], bool]:
+    needles = [normalize_text(line.split(':', 1)[1] if line.startswith(('domain:', 'url:')) else line)
+               for line in blocklist]
+    pattern = re.compile('|'.join(map(re.escape, sorted(needles, key=len, reverse=True))))
+    return lambda text: pattern.search(normalize_text(text)) is not None
+
+
+def regex_chain_matcher(blocklist: List[str]) -> Callable[[str], bool]:
+    patterns = [re.compile(re.escape(line.split(':', 1)[1] if line.startswith(('domain:', 'url:')) else line),
+                           re.IGNORECASE) for line in blocklist]
+    return lambda text: any(pattern.search(text) for pattern in patterns)
+
+
+def measure(build: Callable[[], Callable[[str], bool]], messages: List[str]) -> dict:
+    started = time.perf_counter()
+    match = build()
+    compile_seconds = time.perf_counter() - started
+    samples = []
+    hits = 0
+    started = time.perf_counter()
+    for message in messages:
+        began = time.perf_counter()
+        hits += bool(match(message))
+        samples.append(time.perf_counter() - began)
+    return summarize(samples, time.perf_counter() - started, compile_ms=round(compile_seconds * 1000, 1), hits=hits)
+
+
+def run(args) -> Dict[str, dict]:
+    rng = random.Random(args.seed)
+    blocklist = generate_blocklist(rng, args.patterns)
+    messages = generate_messages(rng, args.messages, args.length, blocklist, args.blocked_share)
+    builders = {
+        'automaton': lambda: CompiledBlocklist.from_lines(blocklist).match,
+        'alternation': lambda: alternation_matcher(blocklist),
+    }
+    if args.patterns <= args.chain_limit:
+        builders['regex_chain'] = lambda: regex_chain_matcher(blocklist)
+    return {name: measure(build, messages) for name, build in builders.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Микробенчмарк фильтра запрещённого контента")
+    parser.add_argument('--patterns', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--length', type=int, default=300, help="длина сообщения, символов")
+    parser.add_argument('--chain-limit', type=int, default=10000, help="до скольких шаблонов мерить цепочку regex")
+    parser.add_argument('--blocked-share', type=float, default=0.05, help="доля сообщений с запрещённым шаблоном")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help="куда записать результаты")
+    args = parser.parse_args(argv)
+    results = run(args)
+    print(f"{'matcher':<14}{'compile ms':>12}{'msg/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'hits':>7}")
+    for name, row in results.items():
+        print(f"{name:<14}{row['compile_ms']:>12}{row['throughput']:>10}{row['p50_ms']:>10}"
+              f"{row['p99_ms']:>10}{row['hits']:>7}")
+    if args.json_path:
+        with open(os.path.abspath(args.json_path), 'w', encoding='utf-8') as f:
+            json.dump({'params': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from benchmarks.fakes import BENCH_TOKEN, FakeSession, StubOpenAI
+
+SCENARIOS = ('registration', 'tasks_create', 'tasks_list', 'tasks_delete', 'files', 'gpt_chat', 'reminder_burst')
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples: List[float], elapsed: float, **extra) -> dict:
+    return {
+        'events': len(samples),
+        'seconds': round(elapsed, 4),
+        'throughput': round(len(samples) / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'max_ms': round(max(samples, default=0.0) * 1000, 3),
+        **extra,
+    }
+
+
+class Harness:
+    def __init__(self, app, bot: Bot, concurrency: int):
+        self.app = app
+        self.bot = bot
+        self.concurrency = concurrency
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def message(self, user_id: int, text: Optional[str] = None, document: Optional[dict] = None) -> Update:
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': user_id, 'type': 'private'},
+                   'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}}
+        if text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if document is not None:
+            message['document'] = document
+        return Update.model_validate({'update_id': next(self._update_ids), 'message': message},
+                                     context={'bot': self.bot})
+
+    def callback(self, user_id: int, data: str) -> Update:
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': user_id, 'type': 'private'}, 'text': '…'}
+        query = {'id': str(next(self._update_ids)), 'chat_instance': str(user_id), 'data': data,
+                 'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}'}, 'message': message}
+        return Update.model_validate({'update_id': next(self._update_ids), 'callback_query': query},
+                                     context={'bot': self.bot})
+
+    async def run_users(self, user_ids: Iterable[int], script: Callable[[int], Iterable[Update]]) -> dict:
+        samples: List[float] = []
+        semaphore = asyncio.Semaphore(self.concurrency)
+        requests_before = sum(self.bot.session.requests.values())
+
+        async def run_user(user_id: int) -> None:
+            async with semaphore:
+                for update in script(user_id):
+                    started = time.perf_counter()
+                    await self.app.dp.feed_update(self.bot, update)
+                    samples.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - started
+        return summarize(samples, elapsed, api_calls=sum(self.bot.session.requests.values()) - requests_before)
+
+
+def future_date(offset_minutes: int) -> str:
+    return (datetime.now() + timedelta(days=1, minutes=offset_minutes)).strftime('%Y-%m-%d %H:%M')
+
+
+async def reminder_burst(app, count: int, users: List[int]) -> dict:
+    queue = app.reminder_queue
+    original_send = queue._send
+    samples: List[float] = []
+    due = datetime.now(app.almaty_tz) - timedelta(seconds=1)
+    scheduled_at = time.perf_counter()
+
+    async def timed_send(chat_id, text):
+        await original_send(chat_id, text)
+        samples.extend([time.perf_counter() - scheduled_at] * (text.count('\n') + 1))
+
+    queue._send = timed_send
+    try:
+        for index in range(count):
+            user_id = str(users[index % len(users)])
+            task = app.new_task(f'Напоминание {index}', due)
+            app.user_tasks(user_id).add(task)
+            app.schedule_task(user_id, task)
+        while len(samples) < count:
+            await asyncio.sleep(0.005)
+        elapsed = time.perf_counter() - scheduled_at
+    finally:
+        queue._send = original_send
+    return summarize(samples, elapsed, delivered_messages=queue.delivered)
+
+
+async def run_benchmark(args) -> Dict[str, dict]:
+    import AIO
+
+    logging.getLogger().setLevel(logging.DEBUG if args.verbose else logging.WARNING)
+    session = FakeSession(latency=args.api_latency)
+    bot = Bot(token=BENCH_TOKEN, session=session)
+    AIO.bot = bot
+    AIO.client = StubOpenAI(latency=args.gpt_latency)
+    harness = Harness(AIO, bot, args.concurrency)
+    users = list(range(1000, 1000 + args.users))
+    selected = args.scenarios or SCENARIOS
+    results: Dict[str, dict] = {}
+
+    await AIO.dp.emit_startup(bot=bot, dispatcher=AIO.dp)
+    await AIO.warmup.wait()
+    try:
+        if 'registration' in selected:
+            results['registration'] = await harness.run_users(users, lambda uid: [
+                harness.message(uid, "Регистрация"), harness.message(uid, "Анна"),
+                harness.message(uid, "Иванова"), harness.message(uid, "+77001234567"),
+                harness.message(uid, f"user{uid}@example.com"), harness.message(uid, "да"),
+            ])
+        if 'tasks_create' in selected:
+            results['tasks_create'] = await harness.run_users(users, lambda uid: [
+                update for index in range(args.tasks) for update in (
+                    harness.message(uid, "Создать задачу"), harness.message(uid, f"Задача {index}"),
+                    harness.message(uid, future_date(index)))
+            ])
+        if 'tasks_list' in selected:
+            results['tasks_list'] = await harness.run_users(users, lambda uid: [
+                harness.message(uid, "Показать расписание"), harness.callback(uid, "schedule::show::all::1"),
+                harness.callback(uid, "schedule::show::week::0"),
+            ])
+        if 'tasks_delete' in selected:
+            results['tasks_delete'] = await harness.run_users(users, lambda uid: delete_script(
+                AIO, harness, uid, max(1, args.tasks // 2)))
+        if 'files' in selected:
+            await seed_files(AIO, users, args.files)
+            results['files'] = await harness.run_users(users, lambda uid: [
+                harness.message(uid, "Файлы"), harness.callback(uid, "files::1"),
+                harness.callback(uid, "download::1"), harness.callback(uid, "download::1"),
+            ])
+        if 'gpt_chat' in selected:
+            results['gpt_chat'] = await harness.run_users(users, lambda uid: [
+                harness.message(uid, "GPT чат"),
+                *(harness.message(uid, f"Вопрос номер {index}") for index in range(args.gpt_messages)),
+            ])
+        if 'reminder_burst' in selected:
+            results['reminder_burst'] = await reminder_burst(AIO, args.reminders or args.users * 2, users)
+    finally:
+        await AIO.dp.emit_shutdown(bot=bot, dispatcher=AIO.dp)
+    return results
+
+
+def delete_script(app, harness: Harness, user_id: int, count: int) -> Iterator[Update]:
+    for _ in range(count):
+        yield harness.message(user_id, "Удалить задачу")
+        tasks = app.user_events.get(str(user_id))
+        if not tasks:
+            return
+        yield harness.callback(user_id, f"deltask::all::0::{next(iter(tasks))['id']}")
+
+
+async def seed_files(app, users: List[int], per_user: int) -> None:
+    async def chunks(payload: bytes):
+        yield payload
+
+    for user_id in users:
+        for index in range(per_user):
+            await app.blob_store.add(user_id, f'file_{index:04}.txt', chunks(f'{user_id}:{index}'.encode()))
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(results: Dict[str, dict], baseline: Optional[Dict[str, dict]] = None) -> None:
+    header = f"{'scenario':<16}{'events':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header + ('   Δops/s   Δp95' if baseline else ''))
+    for name, row in results.items():
+        line = (f"{name:<16}{row['events']:>8}{row['throughput']:>10}{row['p50_ms']:>10}"
+                f"{row['p95_ms']:>10}{row['p99_ms']:>10}")
+        previous = (baseline or {}).get(name)
+        if previous and previous.get('throughput'):
+            line += (f"{(row['throughput'] / previous['throughput'] - 1) * 100:>+8.1f}%"
+                     f"{(row['p95_ms'] / previous['p95_ms'] - 1) * 100 if previous['p95_ms'] else 0:>+6.1f}%")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков AIO без сети")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tasks', type=int, default=10, help="задач на пользователя")
+    parser.add_argument('--files', type=int, default=20, help="файлов на пользователя")
+    parser.add_argument('--gpt-messages', type=int, default=3)
+    parser.add_argument('--reminders', type=int, default=0, help="по умолчанию users * 2")
+    parser.add_argument('--concurrency', type=int, default=50, help="сколько пользователей активны одновременно")
+    parser.add_argument('--api-latency', type=float, default=0.0, help="задержка ответа Bot API, сек")
+    parser.add_argument('--gpt-latency', type=float, default=0.2, help="задержка ответа OpenAI, сек")
+    parser.add_argument('--scenarios', nargs='*', choices=SCENARIOS)
+    parser.add_argument('--json', dest='json_path', help="куда записать результаты")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix='aio-bench-')
+    os.chdir(workdir)
+    os.environ['API_TOKEN'] = BENCH_TOKEN
+    os.environ.setdefault('THROTTLE_LIMITS', 'off')
+    os.environ.pop('OPENAI_API_KEY', None)
+    results = asyncio.run(run_benchmark(args))
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('json_path', 'baseline', 'verbose')},
+        'scenarios': results,
+    }
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('scenarios')
+    print_report(results, baseline)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
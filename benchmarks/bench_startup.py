@@ -0,0 +1,132 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from task_journal import TaskJournal, add_entry
+
+LAYOUTS = ('journal', 'snapshot')
+TASKS_FILE = 'tasks_data.json'
+TASKS_JOURNAL_FILE = 'tasks_data.journal'
+
+
+def seed_data(workdir: str, users: int, tasks: int) -> None:
+    due = datetime.now().astimezone() + timedelta(days=1)
+    journal = TaskJournal(os.path.join(workdir, TASKS_FILE), os.path.join(workdir, TASKS_JOURNAL_FILE))
+    for user_id in range(1000, 1000 + users):
+        journal.append(add_entry(user_id, {'id': f'{user_id}-{index}', 'name': f'Задача {index}',
+                                           'date_iso': (due + timedelta(minutes=index)).isoformat()})
+                       for index in range(tasks))
+    journal.close()
+    records = {str(user_id): {'user_id': str(user_id), 'name': 'Анна', 'surname': 'Иванова',
+                              'phone': '+77001234567', 'email': f'user{user_id}@example.com',
+                              'unique_code': f'{user_id:08}'} for user_id in range(1000, 1000 + users)}
+    with open(os.path.join(workdir, 'users_data.json'), 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False)
+
+
+async def measure_startup() -> dict:
+    existing = set(os.listdir('.'))
+    started = time.perf_counter()
+    import AIO
+    imported = time.perf_counter()
+    created = sorted(set(os.listdir('.')) - existing)
+    from aiogram import Bot
+    from benchmarks.bench_handlers import Harness
+    from benchmarks.fakes import BENCH_TOKEN, FakeSession
+
+    bot = Bot(BENCH_TOKEN, session=FakeSession())
+    AIO.bot = bot
+    harness = Harness(AIO, bot, 1)
+    began = time.perf_counter()
+    await AIO.dp.emit_startup(bot=bot, dispatcher=AIO.dp)
+    startup = time.perf_counter() - began
+    await AIO.dp.feed_update(bot, harness.message(1000, "/start"))
+    first_reply = time.perf_counter() - began
+    await AIO.dp.feed_update(bot, harness.message(1000, "Показать расписание"))
+    first_schedule = time.perf_counter() - began
+    await AIO.warmup.wait()
+    warm = time.perf_counter() - began
+    tasks = sum(len(index) for index in AIO.user_events.values())
+    began = time.perf_counter()
+    await AIO.dp.emit_shutdown(bot=bot, dispatcher=AIO.dp)
+    return {
+        'import_ms': round((imported - started) * 1000, 1),
+        'startup_ms': round(startup * 1000, 1),
+        'first_reply_ms': round(first_reply * 1000, 1),
+        'first_schedule_ms': round(first_schedule * 1000, 1),
+        'warm_ms': round(warm * 1000, 1),
+        'shutdown_ms': round((time.perf_counter() - began) * 1000, 1),
+        'tasks': tasks,
+        'import_side_effects': created,
+    }
+
+
+def run_child(workdir: str) -> dict:
+    from benchmarks.fakes import BENCH_TOKEN
+
+    env = dict(os.environ, API_TOKEN=BENCH_TOKEN, THROTTLE_LIMITS='off', PYTHONPATH=str(ROOT))
+    env.pop('OPENAI_API_KEY', None)
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child'], cwd=workdir,
+                               env=env, capture_output=True, text=True, check=True)
+    row = json.loads(completed.stdout.strip().splitlines()[-1])
+    row['process_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return row
+
+
+def median_row(rows: List[dict]) -> dict:
+    merged = dict(rows[-1])
+    for key in rows[-1]:
+        if key.endswith('_ms'):
+            merged[key] = round(statistics.median(row[key] for row in rows), 1)
+    return merged
+
+
+def run(args) -> Dict[str, dict]:
+    samples: Dict[str, List[dict]] = {layout: [] for layout in LAYOUTS}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory(prefix='aio-startup-') as workdir:
+            seed_data(workdir, args.users, args.tasks)
+            for layout in LAYOUTS:
+                samples[layout].append(run_child(workdir))
+    return {layout: median_row(rows) for layout, rows in samples.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Время импорта и холодного старта AIO")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=50, help="задач на пользователя")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--json', dest='json_path', help="куда записать результаты")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(asyncio.run(measure_startup()), ensure_ascii=False))
+        return
+    results = run(args)
+    print(f"{'layout':<10}{'import ms':>11}{'startup ms':>12}{'1st reply':>11}{'schedule':>10}"
+          f"{'warm ms':>10}{'stop ms':>10}{'process ms':>12}{'tasks':>8}")
+    for layout, row in results.items():
+        print(f"{layout:<10}{row['import_ms']:>11}{row['startup_ms']:>12}{row['first_reply_ms']:>11}"
+              f"{row['first_schedule_ms']:>10}{row['warm_ms']:>10}{row['shutdown_ms']:>10}"
+              f"{row['process_ms']:>12}{row['tasks']:>8}")
+    if args.json_path:
+        with open(os.path.abspath(args.json_path), 'w', encoding='utf-8') as f:
+            json.dump({'params': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
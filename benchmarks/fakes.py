@@ -0,0 +1,84 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram.client.session.base import BaseSession
+
+BENCH_TOKEN = '42:BENCHMARK'
+MESSAGE_METHODS = {'SendMessage', 'SendDocument', 'EditMessageText', 'EditMessageReplyMarkup'}
+
+
+class FakeSession(BaseSession):
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.requests: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        name = type(method).__name__
+        self.requests[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        content = json.dumps({'ok': True, 'result': self._result(name, method)})
+        return self.check_response(bot=bot, method=method, status_code=200, content=content).result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield url.encode('utf-8').ljust(chunk_size, b'.')
+
+    async def close(self) -> None:
+        pass
+
+    def _result(self, name: str, method):
+        if name == 'GetFile':
+            return {'file_id': method.file_id, 'file_unique_id': method.file_id, 'file_path': f'documents/{method.file_id}'}
+        if name not in MESSAGE_METHODS:
+            return True
+        chat_id = getattr(method, 'chat_id', None) or 1
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'}, 'text': getattr(method, 'text', None) or ''}
+        if name == 'SendDocument':
+            file_id = f'sent-{message["message_id"]}'
+            message['document'] = {'file_id': file_id, 'file_unique_id': file_id}
+        return message
+
+
+class _StubStream:
+    def __init__(self, text: str, latency: float):
+        self._words = text.split(' ')
+        self._delay = latency / max(len(self._words), 1)
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for word in self._words:
+            await asyncio.sleep(self._delay)
+            delta = SimpleNamespace(content=word + ' ')
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class _StubCompletions:
+    def __init__(self, latency: float, answer: str):
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+
+    async def create(self, model: str, messages, stream: bool = False, **kwargs):
+        self.calls += 1
+        if stream:
+            return _StubStream(self.answer, self.latency)
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content=self.answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StubOpenAI:
+    def __init__(self, latency: float = 0.5, answer: str = 'Это тестовый ответ модели для нагрузочного прогона.'):
+        self.completions = _StubCompletions(latency, answer)
+        self.chat = SimpleNamespace(completions=self.completions)
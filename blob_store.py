@@ -0,0 +1,355 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterable, Callable, Dict, List, Optional, Set, Tuple
+
+from app_utils import sanitize_filename
+from metrics import PERSIST_SECONDS
+from user_repository import FLUSH_DELAY_SECONDS, write_json_atomic
+
+CHUNK_SIZE = 65536
+
+
+class _BlobWriter:
+    def __init__(self, path: Path):
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, 'wb')
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        return self._hash.hexdigest()
+
+    def abort(self) -> None:
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+async def iter_file_chunks(path, chunk_size: int = CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+
+
+class BlobStore:
+    def __init__(self, root, index_path=None, blobs_dir=None, flush_delay: float = FLUSH_DELAY_SECONDS):
+        self.root = Path(root)
+        self.blobs_dir = Path(blobs_dir) if blobs_dir else self.root / '.blobs'
+        self.index_path = str(index_path or self.root / 'index.json')
+        self._blobs: Dict[str, dict] = {}
+        self._unique: Dict[str, str] = {}
+        self._unique_by_digest: Dict[str, Set[str]] = {}
+        self._users: Dict[str, dict] = {}
+        self._by_id: Dict[str, Dict[int, str]] = {}
+        self._sorted: Dict[str, List[str]] = {}
+        self._usage: Dict[str, int] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self.flush_delay = flush_delay
+        self._dirty = False
+        self._orphans: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / digest
+
+    def names(self, user_id) -> List[str]:
+        self._ensure_loaded()
+        user_id = str(user_id)
+        names = self._sorted.get(user_id)
+        if names is None:
+            names = self._sorted[user_id] = sorted(self._files(user_id))
+        return names
+
+    def usage(self, user_id) -> int:
+        self._ensure_loaded()
+        return self._usage.get(str(user_id), 0)
+
+    def count(self, user_id) -> int:
+        self._ensure_loaded()
+        return len(self._files(str(user_id)))
+
+    def page(self, user_id, page: int, size: int) -> List[Tuple[int, str]]:
+        names = self.names(user_id)[page * size:(page + 1) * size]
+        files = self._files(str(user_id))
+        return [(files[name]['id'], name) for name in names]
+
+    def entry(self, user_id, name: str) -> Optional[dict]:
+        self._ensure_loaded()
+        return self._files(str(user_id)).get(sanitize_filename(name))
+
+    def name_by_id(self, user_id, file_id: int) -> Optional[str]:
+        self._ensure_loaded()
+        return self._by_id.get(str(user_id), {}).get(file_id)
+
+    def path(self, user_id, name: str) -> Optional[Path]:
+        digest = self.digest(user_id, name)
+        return self.blob_path(digest) if digest else None
+
+    def digest(self, user_id, name: str) -> Optional[str]:
+        entry = self.entry(user_id, name)
+        return entry['digest'] if entry else None
+
+    def find_unique(self, file_unique_id: Optional[str]) -> Optional[str]:
+        self._ensure_loaded()
+        digest = self._unique.get(file_unique_id) if file_unique_id else None
+        if digest and digest in self._blobs and self.blob_path(digest).exists():
+            return digest
+        return None
+
+    def file_id(self, digest: str, name: str) -> Optional[str]:
+        self._ensure_loaded()
+        return self._blobs.get(digest, {}).get('file_ids', {}).get(name)
+
+    async def remember_file_id(self, digest: str, name: str, file_id: Optional[str]) -> None:
+        self._ensure_loaded()
+        async with self._lock:
+            blob = self._blobs.get(digest)
+            if blob is None:
+                return
+            file_ids = blob.setdefault('file_ids', {})
+            if file_ids.get(name) == file_id:
+                return
+            if file_id is None:
+                del file_ids[name]
+            else:
+                file_ids[name] = file_id
+            self._mark_dirty()
+
+    def refs(self, digest: str) -> int:
+        self._ensure_loaded()
+        return self._blobs.get(digest, {}).get('refs', 0)
+
+    async def add(self, user_id, name: str, chunks: AsyncIterable[bytes],
+                  file_unique_id: Optional[str] = None) -> Tuple[str, str]:
+        self._ensure_loaded()
+        tmp_dir = self.blobs_dir / 'tmp'
+        await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+        writer = await asyncio.to_thread(_BlobWriter, tmp_dir / uuid.uuid4().hex)
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(writer.write, chunk)
+            digest = await asyncio.to_thread(writer.finish)
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
+        async with self._lock:
+            await asyncio.to_thread(self._place, writer.path, digest)
+            self._blobs.setdefault(digest, {'size': writer.size, 'refs': 0})
+            if file_unique_id:
+                self._remember_unique(file_unique_id, digest)
+            name = await self._link(user_id, name, digest)
+        return name, digest
+
+    async def link(self, user_id, name: str, digest: str) -> Optional[str]:
+        self._ensure_loaded()
+        async with self._lock:
+            if digest not in self._blobs or not self.blob_path(digest).exists():
+                return None
+            return await self._link(user_id, name, digest)
+
+    async def unlink(self, user_id, name: str) -> bool:
+        self._ensure_loaded()
+        user_id = str(user_id)
+        async with self._lock:
+            files = self._files(user_id)
+            entry = files.pop(sanitize_filename(name), None)
+            if entry is None:
+                return False
+            self._by_id[user_id].pop(entry['id'], None)
+            self._sorted.pop(user_id, None)
+            self._usage[user_id] -= entry['size']
+            if not files:
+                self._users.pop(user_id, None)
+                self._by_id.pop(user_id, None)
+                self._usage.pop(user_id, None)
+            self._mark_dirty(self._release(entry['digest']))
+        return True
+
+    async def flush(self) -> None:
+        self._cancel_timer()
+        async with self._lock:
+            if not self._dirty:
+                return
+            orphans, self._orphans = self._orphans, set()
+            self._dirty = False
+            try:
+                with PERSIST_SECONDS.time('files'):
+                    await asyncio.to_thread(write_json_atomic, self.index_path, self._state())
+            except Exception as e:
+                logging.exception("Ошибка сохранения индекса файлов: %s", e)
+                self._orphans |= orphans
+                self._mark_dirty()
+                return
+            for digest in orphans:
+                if digest not in self._blobs:
+                    await asyncio.to_thread(self.blob_path(digest).unlink, True)
+
+    def user_ids(self) -> List[str]:
+        self._ensure_loaded()
+        return list(self._users)
+
+    async def move_user(self, user_id, target: 'BlobStore') -> int:
+        user_id = str(user_id)
+        moved = 0
+        for name in list(self.names(user_id)):
+            digest = self.digest(user_id, name)
+            file_id = self.file_id(digest, name)
+            try:
+                stored, copied = await target.add(user_id, name, iter_file_chunks(self.blob_path(digest)))
+            except FileNotFoundError:
+                logging.warning("Блоб %s файла '%s' пользователя %s не найден, запись удалена", digest, name, user_id)
+            else:
+                if file_id:
+                    await target.remember_file_id(copied, stored, file_id)
+                moved += 1
+            await self.unlink(user_id, name)
+        return moved
+
+    async def import_legacy(self, owns: Optional[Callable[[str], bool]] = None) -> int:
+        self._ensure_loaded()
+        imported = 0
+        for user_dir in sorted(self.root.iterdir()) if self.root.exists() else []:
+            if not user_dir.is_dir() or user_dir.name.startswith('.'):
+                continue
+            if owns is not None and not owns(user_dir.name):
+                continue
+            for file in sorted(user_dir.iterdir()):
+                if file.is_file():
+                    await self.add(user_dir.name, file.name, iter_file_chunks(file))
+                    file.unlink()
+                    imported += 1
+            try:
+                user_dir.rmdir()
+            except OSError:
+                pass
+        if imported:
+            logging.info("Перенесено файлов в хранилище блобов: %s", imported)
+        return imported
+
+    async def _link(self, user_id, name: str, digest: str) -> str:
+        name = sanitize_filename(name)
+        user_id = str(user_id)
+        user = self._users.setdefault(user_id, {'next_id': 1, 'files': {}})
+        entry = user['files'].get(name)
+        previous = entry['digest'] if entry else None
+        if previous == digest:
+            return name
+        if entry is None:
+            entry = user['files'][name] = {'id': user['next_id']}
+            user['next_id'] += 1
+            self._by_id.setdefault(user_id, {})[entry['id']] = name
+            self._sorted.pop(user_id, None)
+        else:
+            self._usage[user_id] -= entry['size']
+        entry.update(digest=digest, size=self._blobs[digest]['size'], mtime=time.time())
+        self._usage[user_id] = self._usage.get(user_id, 0) + entry['size']
+        self._blobs[digest]['refs'] += 1
+        self._mark_dirty(self._release(previous) if previous else None)
+        return name
+
+    def _files(self, user_id: str) -> Dict[str, dict]:
+        user = self._users.get(user_id)
+        return user['files'] if user else {}
+
+    def _release(self, digest: str) -> Optional[str]:
+        blob = self._blobs.get(digest)
+        if blob is None:
+            return None
+        blob['refs'] -= 1
+        if blob['refs'] > 0:
+            return None
+        del self._blobs[digest]
+        for file_unique_id in self._unique_by_digest.pop(digest, ()):
+            del self._unique[file_unique_id]
+        return digest
+
+    def _remember_unique(self, file_unique_id: str, digest: str) -> None:
+        previous = self._unique.get(file_unique_id)
+        if previous == digest:
+            return
+        if previous is not None:
+            self._unique_by_digest[previous].discard(file_unique_id)
+        self._unique[file_unique_id] = digest
+        self._unique_by_digest.setdefault(digest, set()).add(file_unique_id)
+
+    def _mark_dirty(self, orphan: Optional[str] = None) -> None:
+        self._dirty = True
+        if orphan:
+            self._orphans.add(orphan)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.flush_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    def _cancel_timer(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _place(self, tmp_path: Path, digest: str) -> None:
+        target = self.blob_path(digest)
+        if target.exists():
+            tmp_path.unlink()
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+
+    def _state(self) -> dict:
+        return {'blobs': self._blobs, 'unique': self._unique, 'users': self._users}
+
+    async def load(self) -> None:
+        if self._loaded:
+            return
+        state = await asyncio.to_thread(self._read_index)
+        if not self._loaded:
+            self._apply_index(state)
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._apply_index(self._read_index())
+
+    def _read_index(self) -> Optional[dict]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.exception("Ошибка загрузки индекса файлов: %s", e)
+            return None
+
+    def _apply_index(self, state: Optional[dict]) -> None:
+        self._loaded = True
+        if state is None:
+            return
+        self._blobs = state.get('blobs', {})
+        self._unique = state.get('unique', {})
+        self._unique_by_digest = {}
+        for file_unique_id, digest in self._unique.items():
+            self._unique_by_digest.setdefault(digest, set()).add(file_unique_id)
+        self._users = {uid: _upgrade_user(user, self._blobs) for uid, user in state.get('users', {}).items()}
+        self._by_id = {uid: {entry['id']: name for name, entry in user['files'].items()}
+                       for uid, user in self._users.items()}
+        self._usage = {uid: sum(entry['size'] for entry in user['files'].values())
+                       for uid, user in self._users.items()}
+
+
+def _upgrade_user(user: dict, blobs: Dict[str, dict]) -> dict:
+    if 'files' in user:
+        return user
+    files = {name: {'id': number, 'digest': digest, 'size': blobs.get(digest, {}).get('size', 0), 'mtime': 0}
+             for number, (name, digest) in enumerate(sorted(user.items()), start=1)}
+    return {'next_id': len(files) + 1, 'files': files}
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import unquote
+
+IGNORED_CHARS = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad\x02'))
+URL_PATTERN = re.compile(r'(?:[a-z][a-z0-9+.-]*://)?((?:[\w-]+\.)+[\w-]{2,})(?::\d+)?(/\S*)?')
+URL_ANCHOR = '\x02'
+TRAILING_PUNCTUATION = '.,;:!?)]}>»"\''
+DEFAULT_RELOAD_SECONDS = 5.0
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize('NFKC', text).translate(IGNORED_CHARS).casefold()
+    return ' '.join(text.split())
+
+
+def normalize_host(host: str) -> str:
+    host = host.strip('.').casefold()
+    return host[4:] if host.startswith('www.') else host
+
+
+def normalize_url(host: str, path: Optional[str] = None) -> str:
+    path = unquote(path or '').casefold().rstrip(TRAILING_PUNCTUATION).rstrip('/')
+    path = re.sub(r'/{2,}', '/', path)
+    return normalize_host(host) + path
+
+
+def extract_urls(text: str) -> List[Tuple[str, str]]:
+    return [(normalize_host(match.group(1)), normalize_url(match.group(1), match.group(2)))
+            for match in URL_PATTERN.finditer(text)]
+
+
+def parse_blocklist(lines: Iterable[str]) -> Tuple[Set[str], List[str], List[str]]:
+    domains: Set[str] = set()
+    urls: List[str] = []
+    phrases: List[str] = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        kind, _, value = line.partition(':')
+        kind = kind.strip().lower()
+        if kind == 'domain':
+            domains.add(normalize_host(normalize_text(value)))
+        elif kind == 'url' or '://' in line:
+            match = URL_PATTERN.match(normalize_text(value if kind == 'url' else line))
+            if match is not None:
+                urls.append(normalize_url(match.group(1), match.group(2)))
+        else:
+            phrase = normalize_text(value if kind == 'phrase' else line)
+            if phrase:
+                phrases.append(phrase)
+    return domains, urls, phrases
+
+
+class Automaton:
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+        self._link: List[int] = [0]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def search(self, text: str) -> Optional[str]:
+        return next((pattern for _, pattern in self.finditer(text)), None)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        goto, fail, output, link = self._goto, self._fail, self._output, self._link
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            match = state if output[state] is not None else link[state]
+            while match:
+                yield end, output[match]
+                match = link[match]
+
+    def _add(self, pattern: str) -> None:
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = self._goto[state][char] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._link.append(0)
+            state = next_state
+        self._output[state] = pattern
+
+    def _build(self) -> None:
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                target = target if target != child else 0
+                self._fail[child] = target
+                self._link[child] = target if self._output[target] is not None else self._link[target]
+                queue.append(child)
+
+
+class CompiledBlocklist:
+    def __init__(self, domains: Iterable[str], urls: Iterable[str], phrases: Iterable[str]):
+        self.domains = frozenset(domains)
+        urls = list(urls)
+        phrases = list(phrases)
+        self.size = len(self.domains) + len(urls) + len(phrases)
+        self.automaton = Automaton([*phrases, *(URL_ANCHOR + url for url in urls)])
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> 'CompiledBlocklist':
+        return cls(*parse_blocklist(lines))
+
+    def match(self, text: str) -> Optional[str]:
+        normalized = normalize_text(text)
+        found = self.automaton.search(normalized)
+        if found is not None:
+            return found
+        for host, url in extract_urls(normalized):
+            labels = host.split('.')
+            for index in range(len(labels) - 1):
+                domain = '.'.join(labels[index:])
+                if domain in self.domains:
+                    return domain
+            anchored = URL_ANCHOR + url
+            for end, found in self.automaton.finditer(anchored):
+                if found.startswith(URL_ANCHOR) and (end == len(anchored) or anchored[end] in '/?#&'):
+                    return found[1:]
+        return None
+
+
+class ContentFilter:
+    def __init__(self, path=None, defaults: Iterable[str] = ()):
+        self.path = str(path) if path else None
+        self.defaults = list(defaults)
+        self.compiled = CompiledBlocklist.from_lines(self.defaults)
+        self._signature: Optional[Tuple[float, int]] = None
+
+    def match(self, text: str) -> Optional[str]:
+        return self.compiled.match(text)
+
+    async def reload_if_changed(self) -> bool:
+        signature = self._stat()
+        if signature == self._signature:
+            return False
+        try:
+            if signature is None:
+                compiled = CompiledBlocklist.from_lines(self.defaults)
+            else:
+                compiled = await asyncio.to_thread(self._compile_file)
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning("Не удалось перечитать список блокировок %s: %s", self.path, e)
+            return False
+        self.compiled = compiled
+        self._signature = signature
+        logging.info("Список блокировок загружен: %s шаблонов", compiled.size)
+        return True
+
+    async def watch(self, interval: float = DEFAULT_RELOAD_SECONDS) -> None:
+        while True:
+            await self.reload_if_changed()
+            await asyncio.sleep(interval)
+
+    def _compile_file(self) -> CompiledBlocklist:
+        with open(self.path, 'r', encoding='utf-8-sig') as f:
+            return CompiledBlocklist.from_lines(f)
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        if not self.path:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
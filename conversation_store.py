@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Hashable, List
+
+SUMMARY_PREFIX = "Краткое содержание предыдущего диалога:\n"
+SUMMARY_LINE_CHARS = 120
+
+
+def estimate_tokens(message: dict) -> int:
+    return len(message.get('content') or '') // 4 + 4
+
+
+class _Session:
+    __slots__ = ('messages', 'tokens', 'summary', 'summary_tokens', 'touched')
+
+    def __init__(self, now: float):
+        self.messages: Deque[dict] = deque()
+        self.tokens = 0
+        self.summary: Deque[str] = deque()
+        self.summary_tokens = 0
+        self.touched = now
+
+    @property
+    def total_tokens(self) -> int:
+        return self.tokens + self.summary_tokens
+
+
+class ConversationStore:
+    def __init__(self, session_token_budget: int = 1500, max_total_tokens: int = 2_000_000,
+                 max_sessions: int = 10_000, ttl: float = 3600, summarize: bool = False,
+                 summary_token_budget: int = 300, clock: Callable[[], float] = time.monotonic):
+        self.session_token_budget = session_token_budget
+        self.max_total_tokens = max_total_tokens
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.summarize = summarize
+        self.summary_token_budget = summary_token_budget
+        self._clock = clock
+        self._sessions: "OrderedDict[Hashable, _Session]" = OrderedDict()
+        self._total_tokens = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: Hashable) -> bool:
+        return user_id in self._sessions
+
+    @property
+    def total_tokens(self) -> int:
+        return self._total_tokens
+
+    def get(self, user_id: Hashable) -> List[dict]:
+        self.evict_expired()
+        session = self._sessions.get(user_id)
+        if session is None:
+            return []
+        self._touch(user_id, session)
+        history = list(session.messages)
+        if session.summary:
+            history.insert(0, {'role': 'system', 'content': SUMMARY_PREFIX + '\n'.join(session.summary)})
+        return history
+
+    def append(self, user_id: Hashable, *messages: dict) -> None:
+        self.evict_expired()
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = _Session(self._clock())
+        self._touch(user_id, session)
+        before = session.total_tokens
+        for message in messages:
+            session.messages.append(message)
+            session.tokens += estimate_tokens(message)
+        self._trim(session)
+        self._total_tokens += session.total_tokens - before
+        self._enforce_limits(keep=user_id)
+
+    def clear(self, user_id: Hashable) -> None:
+        session = self._sessions.pop(user_id, None)
+        if session is not None:
+            self._total_tokens -= session.total_tokens
+
+    def evict_expired(self) -> None:
+        deadline = self._clock() - self.ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.touched > deadline:
+                break
+            self._evict(user_id)
+
+    def _touch(self, user_id: Hashable, session: _Session) -> None:
+        session.touched = self._clock()
+        self._sessions.move_to_end(user_id)
+
+    def _trim(self, session: _Session) -> None:
+        while session.tokens > self.session_token_budget and len(session.messages) > 2:
+            dropped = [session.messages.popleft(), session.messages.popleft()]
+            session.tokens -= sum(estimate_tokens(m) for m in dropped)
+            if self.summarize:
+                self._fold(session, dropped)
+
+    def _fold(self, session: _Session, dropped: List[dict]) -> None:
+        for message in dropped:
+            author = "Пользователь" if message.get('role') == 'user' else "AIO"
+            content = ' '.join((message.get('content') or '').split())
+            if len(content) > SUMMARY_LINE_CHARS:
+                content = content[:SUMMARY_LINE_CHARS - 1] + '…'
+            line = f"{author}: {content}"
+            session.summary.append(line)
+            session.summary_tokens += len(line) // 4 + 1
+        while session.summary_tokens > self.summary_token_budget and session.summary:
+            session.summary_tokens -= len(session.summary.popleft()) // 4 + 1
+
+    def _enforce_limits(self, keep: Hashable) -> None:
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions
+                                           or self._total_tokens > self.max_total_tokens):
+            user_id = next(iter(self._sessions))
+            if user_id == keep:
+                break
+            self._evict(user_id)
+
+    def _evict(self, user_id: Hashable) -> None:
+        self.clear(user_id)
+        self.evicted += 1
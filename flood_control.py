@@ -0,0 +1,118 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery
+
+from metrics import REGISTRY, Counter
+from outbound import TokenBucket
+
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    'gpt': (6, 3),
+    'upload': (10, 5),
+    'write': (30, 10),
+    'click': (60, 20),
+}
+DEFAULT_ACTION = 'click'
+IDLE_SECONDS = 600.0
+MAX_TRACKED_USERS = 100_000
+
+THROTTLED = REGISTRY.counter('aio_throttled_total', "Отклонённые из-за флуда обновления", ('action',))
+
+
+def parse_limits(text: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    limits = dict(DEFAULT_LIMITS)
+    for item in (text or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        action, _, spec = item.partition('=')
+        per_minute, _, burst = spec.partition('/')
+        try:
+            per_minute = float(per_minute)
+            burst = float(burst) if burst else max(per_minute / 2, 1.0)
+        except ValueError:
+            raise ValueError(f"Неверный лимит «{item}», ожидается action=в_минуту/запас") from None
+        limits[action.strip()] = (per_minute, burst)
+    return limits
+
+
+class _UserState:
+    __slots__ = ('buckets', 'updated', 'notified_until')
+
+    def __init__(self, now: float):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.updated = now
+        self.notified_until = 0.0
+
+
+class FloodControl:
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = DEFAULT_LIMITS, idle_ttl: float = IDLE_SECONDS,
+                 max_users: int = MAX_TRACKED_USERS, clock: Callable[[], float] = time.monotonic):
+        self.limits = dict(limits)
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self._clock = clock
+        self._users: "OrderedDict[Hashable, _UserState]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def check(self, user_id: Hashable, action: str) -> float:
+        per_minute, burst = self.limits.get(action) or self.limits.get(DEFAULT_ACTION, (0, 0))
+        if per_minute <= 0:
+            return 0.0
+        now = self._clock()
+        self._evict(now)
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(now)
+        self._users.move_to_end(user_id)
+        state.updated = now
+        bucket = state.buckets.get(action)
+        if bucket is None:
+            bucket = state.buckets[action] = TokenBucket(per_minute / 60, burst, now)
+        wait = bucket.delay(now)
+        if wait <= 0:
+            bucket.consume()
+        return wait
+
+    def should_notify(self, user_id: Hashable, wait: float) -> bool:
+        state = self._users.get(user_id)
+        now = self._clock()
+        if state is None or now < state.notified_until:
+            return False
+        state.notified_until = now + wait
+        return True
+
+    def _evict(self, now: float) -> None:
+        while self._users:
+            user_id, state = next(iter(self._users.items()))
+            if now - state.updated < self.idle_ttl and len(self._users) < self.max_users:
+                return
+            del self._users[user_id]
+
+
+class FloodControlMiddleware(BaseMiddleware):
+    def __init__(self, control: FloodControl, throttled: Counter = THROTTLED):
+        self.control = control
+        self.throttled = throttled
+
+    async def __call__(self, handler, event, data):
+        action = get_flag(data, 'throttle', default=DEFAULT_ACTION)
+        user = data.get('event_from_user')
+        if action is None or user is None:
+            return await handler(event, data)
+        wait = self.control.check(user.id, action)
+        if wait <= 0:
+            return await handler(event, data)
+        self.throttled.inc(action)
+        notice = f"Слишком часто. Повторите через {math.ceil(wait)} с." if self.control.should_notify(user.id, wait) else None
+        if isinstance(event, CallbackQuery):
+            await event.answer(notice)
+        elif notice:
+            await event.answer(notice)
+        return None
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import suppress
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from metrics import PERSIST_SECONDS
+from storage import SqliteWorker
+
+FSM_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS fsm (key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, updated REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_fsm_updated ON fsm (updated)",
+)
+
+
+class _Record:
+    __slots__ = ('state', 'data', 'loaded')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], loaded: float):
+        self.state = state
+        self.data = data
+        self.loaded = loaded
+
+
+class SQLiteFSMStorage(BaseStorage):
+    def __init__(self, path, state_ttl: float = 86400, cache_ttl: float = 5.0, flush_interval: float = 0.5,
+                 key_builder: Optional[KeyBuilder] = None, clock: Callable[[], float] = time.time):
+        self.db = SqliteWorker(path, FSM_SCHEMA, name='fsm-storage')
+        self.state_ttl = state_ttl
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._clock = clock
+        self._cache: Dict[str, _Record] = {}
+        self._dirty: Dict[str, _Record] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._record(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        record = await self._record(key)
+        record.data = data.copy()
+        self._mark_dirty(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key)).data.copy()
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        batch = self._dirty
+        self._dirty = {}
+        now = self._clock()
+        rows = [(name, record.state, json.dumps(record.data, ensure_ascii=False), now)
+                for name, record in batch.items()]
+        try:
+            with PERSIST_SECONDS.time('fsm'):
+                await self.db.run(_write_batch, rows)
+        except Exception as e:
+            logging.exception("Ошибка записи FSM-состояний: %s", e)
+            for name, record in batch.items():
+                self._dirty.setdefault(name, record)
+
+    async def sweep_expired(self) -> int:
+        deadline = self._clock() - self.state_ttl
+        self._last_sweep = self._clock()
+        return await self.db.run(_delete_expired, deadline)
+
+    async def state_counts(self) -> Dict[str, int]:
+        await self.flush()
+        rows = await self.db.run(_count_states, self._clock() - self.state_ttl)
+        return dict(rows)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        await self.flush()
+        await self.db.close()
+
+    async def _record(self, key: StorageKey) -> _Record:
+        name = self.key_builder.build(key)
+        now = self._clock()
+        record = self._cache.get(name)
+        if record is not None and (name in self._dirty or now - record.loaded < self.cache_ttl):
+            return record
+        row = await self.db.run(_read, name, now - self.state_ttl)
+        record = _Record(row[0], json.loads(row[1]), now) if row else _Record(None, {}, now)
+        if name in self._dirty:
+            return self._cache[name]
+        self._cache[name] = record
+        return record
+
+    def _mark_dirty(self, key: StorageKey, record: _Record) -> None:
+        name = self.key_builder.build(key)
+        record.loaded = self._clock()
+        self._cache[name] = record
+        self._dirty[name] = record
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict_cache()
+            if self._clock() - self._last_sweep > self.state_ttl / 24:
+                await self.sweep_expired()
+            if not self._dirty and not self._cache:
+                return
+
+    def _evict_cache(self) -> None:
+        deadline = self._clock() - self.cache_ttl
+        stale = [name for name, record in self._cache.items() if record.loaded < deadline and name not in self._dirty]
+        for name in stale:
+            del self._cache[name]
+
+
+def _read(conn, name: str, not_before: float) -> Optional[Tuple[Optional[str], str]]:
+    return conn.execute("SELECT state, data FROM fsm WHERE key = ? AND updated >= ?", (name, not_before)).fetchone()
+
+
+def _write_batch(conn, rows) -> None:
+    with conn:
+        for name, state, data, updated in rows:
+            if state is None and data == '{}':
+                conn.execute("DELETE FROM fsm WHERE key = ?", (name,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO fsm (key, state, data, updated) VALUES (?, ?, ?, ?)",
+                             (name, state, data, updated))
+
+
+def _count_states(conn, not_before: float):
+    return conn.execute("SELECT COALESCE(state, 'none'), COUNT(*) FROM fsm WHERE updated >= ? GROUP BY state",
+                        (not_before,)).fetchall()
+
+
+def _delete_expired(conn, deadline: float) -> int:
+    with conn:
+        return conn.execute("DELETE FROM fsm WHERE updated < ?", (deadline,)).rowcount
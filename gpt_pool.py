@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable
+
+
+class FairRequestPool:
+    def __init__(self, concurrency: int = 4, per_user_limit: int = 1):
+        if concurrency < 1 or per_user_limit < 1:
+            raise ValueError("concurrency и per_user_limit должны быть >= 1")
+        self.concurrency = concurrency
+        self.per_user_limit = per_user_limit
+        self._active = 0
+        self._in_flight: Dict[Hashable, int] = {}
+        self._waiters: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._ring: Deque[Hashable] = deque()
+        self._queued = 0
+        self.granted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        return self._active
+
+    def stats(self) -> dict:
+        return {
+            'concurrency': self.concurrency,
+            'in_flight': self._active,
+            'queue_depth': self._queued,
+            'waiting_users': len(self._ring),
+            'granted': self.granted,
+            'avg_wait_seconds': self.total_wait / self.granted if self.granted else 0.0,
+            'max_wait_seconds': self.max_wait,
+        }
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable):
+        waited = await self.acquire(user_id)
+        try:
+            yield waited
+        finally:
+            self.release(user_id)
+
+    async def acquire(self, user_id: Hashable) -> float:
+        started = time.monotonic()
+        if not self._queued and self._can_run(user_id):
+            self._grant(user_id)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            queue = self._waiters.get(user_id)
+            if queue is None:
+                queue = self._waiters[user_id] = deque()
+                self._ring.append(user_id)
+            queue.append(future)
+            self._queued += 1
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(user_id)
+                else:
+                    self._forget(user_id, future)
+                raise
+        waited = time.monotonic() - started
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def release(self, user_id: Hashable) -> None:
+        self._active -= 1
+        left = self._in_flight[user_id] - 1
+        if left:
+            self._in_flight[user_id] = left
+        else:
+            del self._in_flight[user_id]
+        self._dispatch()
+
+    def _can_run(self, user_id: Hashable) -> bool:
+        return self._active < self.concurrency and self._in_flight.get(user_id, 0) < self.per_user_limit
+
+    def _grant(self, user_id: Hashable) -> None:
+        self._active += 1
+        self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+        self.granted += 1
+
+    def _dispatch(self) -> None:
+        checked = 0
+        while self._ring and self._active < self.concurrency and checked < len(self._ring):
+            user_id = self._ring[0]
+            self._ring.rotate(-1)
+            if not self._can_run(user_id):
+                checked += 1
+                continue
+            checked = 0
+            queue = self._waiters[user_id]
+            future = queue.popleft()
+            self._queued -= 1
+            if not queue:
+                del self._waiters[user_id]
+                self._ring.pop()
+            if future.done():
+                continue
+            self._grant(user_id)
+            future.set_result(None)
+
+    def _forget(self, user_id: Hashable, future: asyncio.Future) -> None:
+        queue = self._waiters.get(user_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[user_id]
+            self._ring.remove(user_id)
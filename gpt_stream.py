@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+EDIT_INTERVAL_SECONDS = 1.0
+
+
+class ThrottledEditor:
+    def __init__(self, edit: Callable[..., Awaitable], interval: float = EDIT_INTERVAL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._edit = edit
+        self._interval = interval
+        self._clock = clock
+        self._latest = ''
+        self._shown = ''
+        self._last_edit: Optional[float] = None
+        self._pending: Optional[asyncio.Task] = None
+        self.edits = 0
+
+    def update(self, text: str) -> None:
+        self._latest = text
+        if self._pending is not None and not self._pending.done():
+            return
+        if self._last_edit is not None and self._clock() - self._last_edit < self._interval:
+            return
+        if not text.strip() or text == self._shown:
+            return
+        self._pending = asyncio.create_task(self._push(text))
+
+    async def finish(self, text: str, **kwargs) -> None:
+        if self._pending is not None:
+            await asyncio.gather(self._pending, return_exceptions=True)
+        await self._edit(text, **kwargs)
+        self._shown = text
+        self.edits += 1
+
+    async def _push(self, text: str) -> None:
+        self._last_edit = self._clock()
+        try:
+            await self._edit(text)
+            self._shown = text
+            self.edits += 1
+        except Exception as e:
+            logging.debug("Промежуточное обновление ответа не удалось: %s", e)
@@ -0,0 +1,145 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Iterable, List, Optional, Set
+
+from metrics import REGISTRY
+
+LOOP_LAG_SECONDS = REGISTRY.histogram('aio_loop_lag_seconds', "Задержка цикла событий",
+                                      buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0))
+LOOP_STALLS = REGISTRY.counter('aio_loop_stalls_total', "Блокировки цикла событий дольше порога", ('handler',))
+
+
+def handler_codes(dispatcher) -> Set:
+    codes = set()
+    for router in dispatcher.chain_tail:
+        for observer in router.observers.values():
+            for handler in observer.handlers:
+                code = getattr(handler.callback, '__code__', None)
+                if code is not None:
+                    codes.add(code)
+    return codes
+
+
+def collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return code.co_name in ('select', 'poll') and code.co_filename.endswith('selectors.py')
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.2, interval: float = 0.05,
+                 on_stall: Optional[Callable[[float, str, List[traceback.FrameSummary]], None]] = None,
+                 handlers: Iterable = ()):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_stall = on_stall or self._log_stall
+        self.handlers = set(handlers)
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._monitor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._monitor = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._monitor.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        if self._monitor is not None:
+            await asyncio.to_thread(self._monitor.join)
+            self._monitor = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+            self._beat = now
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < self.threshold or reported == beat:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None or _is_idle(frame):
+                continue
+            reported = beat
+            handler = self._handler_name(frame)
+            self.stalls += 1
+            LOOP_STALLS.inc(handler)
+            self.on_stall(stalled, handler, traceback.extract_stack(frame))
+
+    def _handler_name(self, frame) -> str:
+        while frame is not None:
+            if frame.f_code in self.handlers:
+                return frame.f_code.co_name
+            frame = frame.f_back
+        return 'unknown'
+
+    @staticmethod
+    def _log_stall(stalled: float, handler: str, stack: List[traceback.FrameSummary]) -> None:
+        logging.warning("Цикл событий заблокирован уже %.0f мс (обработчик: %s):\n%s",
+                        stalled * 1000, handler, ''.join(traceback.format_list(stack)))
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.samples: collections.Counter = collections.Counter()
+        self._thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, thread_id: Optional[int] = None) -> None:
+        self._thread_id = thread_id or threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, name='loop-profiler', daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def dump(self, path) -> int:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return sum(self.samples.values())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None or (not self.include_idle and _is_idle(frame)):
+                continue
+            self.samples[collapse_stack(frame)] += 1
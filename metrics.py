@@ -0,0 +1,199 @@
+import bisect
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from aiogram import BaseMiddleware
+from aiohttp import web
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Samples = Dict[Tuple[str, ...], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Samples = {}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    async def render(self) -> List[str]:
+        return [f'{self.name}{_labels(self.label_names, key)} {_number(value)}' for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 collect: Optional[Callable[[], Union[Samples, Awaitable[Samples]]]] = None):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    async def render(self) -> List[str]:
+        if self._collect is not None:
+            values = self._collect()
+            if inspect.isawaitable(values):
+                values = await values
+            self._values = dict(values)
+        return await super().render()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    async def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = (), collect=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, collect))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    async def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(await metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if existing.kind != metric.kind:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована как {existing.kind}")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = Registry()
+HANDLER_SECONDS = REGISTRY.histogram('aio_handler_seconds', "Время обработки обновления", ('handler',))
+HANDLER_ERRORS = REGISTRY.counter('aio_handler_errors_total', "Ошибки обработчиков", ('handler', 'error'))
+PERSIST_SECONDS = REGISTRY.histogram('aio_persist_seconds', "Время записи данных на диск", ('target',))
+
+
+class MetricsMiddleware(BaseMiddleware):
+    def __init__(self, latency: Histogram = HANDLER_SECONDS, errors: Counter = HANDLER_ERRORS):
+        self.latency = latency
+        self.errors = errors
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - started, name)
+
+
+async def fsm_state_counts(storage) -> Samples:
+    if hasattr(storage, 'state_counts'):
+        return {(state,): count for state, count in (await storage.state_counts()).items()}
+    counts: Samples = {}
+    for record in getattr(storage, 'storage', {}).values():
+        state = record.state or 'none'
+        counts[(state,)] = counts.get((state,), 0) + 1
+    return counts
+
+
+def create_metrics_app(registry: Registry = REGISTRY) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=(await registry.render()).encode('utf-8'), headers={'Content-Type': CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    return app
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = REGISTRY) -> web.AppRunner:
+    runner = web.AppRunner(create_metrics_app(registry))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
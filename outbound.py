@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, List, Optional
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+PER_CHAT_BURST = 3
+IDLE_BUCKET_SECONDS = 60.0
+RETRYABLE_ERRORS = (TelegramRetryAfter, TelegramNetworkError, TelegramServerError)
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now: float, cost: float = 1.0) -> float:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float = 1.0) -> None:
+        self.tokens -= cost
+
+
+class SendRateLimiter:
+    def __init__(self, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 per_chat_burst: int = PER_CHAT_BURST, idle_ttl: float = IDLE_BUCKET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock())
+        self._chats: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    def block(self, seconds: float) -> None:
+        self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+    def reserve(self, chat_id: Hashable) -> float:
+        now = self._clock()
+        self._evict_idle(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst, now)
+        self._chats.move_to_end(chat_id)
+        wait = max(self._global.delay(now), bucket.delay(now))
+        if wait <= 0:
+            self._global.consume()
+            bucket.consume()
+        return wait
+
+    async def acquire(self, chat_id: Hashable) -> None:
+        while True:
+            wait = self.reserve(chat_id)
+            if wait <= 0:
+                return
+            self.throttled += 1
+            await asyncio.sleep(wait)
+
+    def _evict_idle(self, now: float) -> None:
+        while self._chats:
+            chat_id, bucket = next(iter(self._chats.items()))
+            if now - bucket.updated < self.idle_ttl:
+                return
+            del self._chats[chat_id]
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: SendRateLimiter, max_retries: int = 3):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self.limiter.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning("Telegram просит подождать %s с (%s)", e.retry_after, type(method).__name__)
+                self.limiter.block(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+
+
+class _Delivery:
+    __slots__ = ('chat_id', 'texts', 'tokens', 'attempts', 'sending')
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.texts: List[str] = []
+        self.tokens: List[Hashable] = []
+        self.attempts = 0
+        self.sending = False
+
+
+class DeliveryQueue:
+    def __init__(self, send: Callable[[int, str], Awaitable],
+                 on_done: Callable[[List[Hashable], Optional[Exception]], Awaitable],
+                 workers: int = 8, max_attempts: int = 5, retry_delay: float = 5.0, max_batch: int = 20):
+        self._send = send
+        self._on_done = on_done
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._open = {}
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    @property
+    def backlog(self) -> int:
+        return self.queue.qsize()
+
+    def put(self, chat_id: int, text: str, token: Hashable) -> None:
+        item = self._open.get(chat_id)
+        if item is None or item.sending or len(item.texts) >= self.max_batch:
+            item = self._open[chat_id] = _Delivery(chat_id)
+            self.queue.put_nowait(item)
+        item.texts.append(text)
+        item.tokens.append(token)
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._deliver(item)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, item: _Delivery) -> None:
+        item.sending = True
+        if self._open.get(item.chat_id) is item:
+            del self._open[item.chat_id]
+        try:
+            await self._send(item.chat_id, '\n'.join(item.texts))
+        except RETRYABLE_ERRORS as e:
+            item.attempts += 1
+            if item.attempts < self.max_attempts:
+                self.retried += 1
+                delay = self.retry_delay * 2 ** (item.attempts - 1)
+                logging.warning("Повтор доставки для %s через %s с: %s", item.chat_id, delay, e)
+                asyncio.get_running_loop().call_later(delay, self.queue.put_nowait, item)
+                return
+            self.failed += 1
+            logging.warning("Не удалось доставить %s после %s попыток: %s", item.chat_id, item.attempts, e)
+            await self._on_done(item.tokens, e)
+            return
+        except Exception as e:
+            self.failed += 1
+            logging.warning("Не удалось отправить сообщение %s: %s", item.chat_id, e)
+            await self._on_done(item.tokens, e)
+            return
+        self.delivered += 1
+        await self._on_done(item.tokens, None)
@@ -0,0 +1,149 @@
+import calendar
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Callable, FrozenSet, List, Tuple
+
+MAX_SEARCH_DAYS = 366 * 5
+
+WEEKDAYS = {'пн': 1, 'вт': 2, 'ср': 3, 'чт': 4, 'пт': 5, 'сб': 6, 'вс': 7,
+            'mon': 1, 'tue': 2, 'wed': 3, 'thu': 4, 'fri': 5, 'sat': 6, 'sun': 7}
+WEEKDAY_NAMES = ('пн', 'вт', 'ср', 'чт', 'пт', 'сб', 'вс')
+KEYWORDS = {'ежедневно': 'daily', 'daily': 'daily',
+            'еженедельно': 'weekly', 'weekly': 'weekly',
+            'ежемесячно': 'monthly', 'monthly': 'monthly',
+            'cron': 'cron'}
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+TIME_PATTERN = re.compile(r'^([01]\d|2[0-3]):([0-5]\d)$')
+
+
+class RecurrenceError(ValueError):
+    pass
+
+
+def parse_rule(text: str, first: datetime) -> str:
+    words = text.strip().lower().split(None, 1)
+    if not words:
+        raise RecurrenceError("Пустое правило повторения.")
+    kind = KEYWORDS.get(words[0])
+    rest = words[1].strip() if len(words) > 1 else ''
+    at = first.strftime('%H:%M')
+    if kind == 'daily' and not rest:
+        rule = f'daily {at}'
+    elif kind == 'weekly':
+        days = _parse_weekdays(rest) if rest else [first.isoweekday()]
+        rule = f"weekly {','.join(map(str, days))} {at}"
+    elif kind == 'monthly' and not rest:
+        rule = f'monthly {first.day} {at}'
+    elif kind == 'cron':
+        rule = f'cron {rest}'
+    else:
+        raise RecurrenceError("Не понял правило. Примеры: ежедневно, еженедельно пн,ср, ежемесячно, cron 30 9 * * 1-5")
+    compile_rule(rule)
+    return rule
+
+
+def describe_rule(rule: str) -> str:
+    kind, *args = rule.split()
+    if kind == 'daily':
+        return f"каждый день в {args[0]}"
+    if kind == 'weekly':
+        days = ','.join(WEEKDAY_NAMES[int(day) - 1] for day in args[0].split(','))
+        return f"по {days} в {args[1]}"
+    if kind == 'monthly':
+        return f"{args[0]}-го числа каждого месяца в {args[1]}"
+    return f"по расписанию cron «{' '.join(args)}»"
+
+
+def next_occurrence(rule: str, after: datetime, tz) -> datetime:
+    matches_day, times = compile_rule(rule)
+    local = after.astimezone(tz)
+    day = local.date()
+    for _ in range(MAX_SEARCH_DAYS):
+        if matches_day(day):
+            for moment in times:
+                candidate = tz.normalize(tz.localize(datetime.combine(day, moment)))
+                if candidate > after:
+                    return candidate
+        day += timedelta(days=1)
+    raise RecurrenceError(f"У правила «{rule}» нет ближайших повторений.")
+
+
+def compile_rule(rule: str) -> Tuple[Callable[[date], bool], List[time]]:
+    kind, *args = rule.split()
+    try:
+        if kind == 'daily' and len(args) == 1:
+            return (lambda day: True), [_parse_time(args[0])]
+        if kind == 'weekly' and len(args) == 2:
+            days = frozenset(_parse_weekdays(args[0]))
+            return (lambda day: day.isoweekday() in days), [_parse_time(args[1])]
+        if kind == 'monthly' and len(args) == 2:
+            day_of_month = int(args[0])
+            if not 1 <= day_of_month <= 31:
+                raise RecurrenceError(f"Нет такого числа месяца: {day_of_month}")
+            return (lambda day: day.day == min(day_of_month, calendar.monthrange(day.year, day.month)[1])), \
+                [_parse_time(args[1])]
+        if kind == 'cron' and len(args) == 5:
+            return _compile_cron(args)
+    except RecurrenceError:
+        raise
+    except ValueError as e:
+        raise RecurrenceError(f"Неверное правило «{rule}»: {e}") from e
+    raise RecurrenceError(f"Неверное правило «{rule}»")
+
+
+def _compile_cron(fields: List[str]) -> Tuple[Callable[[date], bool], List[time]]:
+    minutes, hours, days, months, weekdays = (_parse_cron_field(field, bounds)
+                                              for field, bounds in zip(fields, CRON_FIELDS))
+    weekdays = frozenset(day % 7 for day in weekdays)
+    any_day, any_weekday = fields[2] == '*', fields[4] == '*'
+
+    def matches(day: date) -> bool:
+        if day.month not in months:
+            return False
+        by_day = day.day in days
+        by_weekday = day.isoweekday() % 7 in weekdays
+        if any_day or any_weekday:
+            return by_day and by_weekday
+        return by_day or by_weekday
+
+    return matches, [time(hour, minute) for hour in sorted(hours) for minute in sorted(minutes)]
+
+
+def _parse_cron_field(field: str, bounds: Tuple[int, int]) -> FrozenSet[int]:
+    low, high = bounds
+    values = set()
+    for part in field.split(','):
+        spec, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if spec == '*':
+            start, stop = low, high
+        elif '-' in spec:
+            start, stop = map(int, spec.split('-', 1))
+        else:
+            start = int(spec)
+            stop = high if step > 1 else start
+        if step < 1 or not low <= start <= stop <= high:
+            raise ValueError(f"поле «{field}» вне диапазона {low}-{high}")
+        values.update(range(start, stop + 1, step))
+    return frozenset(values)
+
+
+def _parse_weekdays(text: str) -> List[int]:
+    days = set()
+    for part in re.split(r'[\s,]+', text.strip()):
+        if not part:
+            continue
+        day = WEEKDAYS.get(part) or (int(part) if part.isdigit() else None)
+        if day is None or not 1 <= day <= 7:
+            raise RecurrenceError(f"Не понял день недели «{part}»")
+        days.add(day)
+    if not days:
+        raise RecurrenceError("Не указаны дни недели.")
+    return sorted(days)
+
+
+def _parse_time(text: str) -> time:
+    match = TIME_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"неверное время «{text}»")
+    return time(int(match.group(1)), int(match.group(2)))
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+from user_repository import write_json_atomic
+
+
+def normalize_content(content: str) -> str:
+    return ' '.join((content or '').split()).casefold()
+
+
+def make_cache_key(messages: Iterable[dict], model: str, temperature: float) -> str:
+    payload = {
+        'model': model,
+        'temperature': temperature,
+        'messages': [[m.get('role'), normalize_content(m.get('content'))] for m in messages],
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400, path: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._loaded = path is None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        self._ensure_loaded()
+        item = self._entries.get(key)
+        if item is None or item[0] <= self._clock():
+            if item is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: str, value: str) -> None:
+        self._ensure_loaded()
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        now = self._clock()
+        data = [[key, expires, value] for key, (expires, value) in self._entries.items() if expires > now]
+        try:
+            write_json_atomic(self.path, data)
+        except Exception as e:
+            logging.exception("Ошибка сохранения кэша GPT: %s", e)
+
+    async def load(self) -> None:
+        if self._loaded:
+            return
+        data = await asyncio.to_thread(self._read)
+        if not self._loaded:
+            self._apply(data)
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self._apply(self._read())
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.warning("Кэш GPT не загружен: %s", e)
+            return []
+
+    def _apply(self, data: list) -> None:
+        self._loaded = True
+        now = self._clock()
+        for key, expires, value in data[-self.max_entries:]:
+            if expires > now:
+                self._entries[key] = (expires, value)
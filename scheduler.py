@@ -0,0 +1,87 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+MAX_SLEEP_SECONDS = 300
+
+
+class ReminderScheduler:
+    def __init__(self, clock: Callable[[], datetime], max_sleep: float = MAX_SLEEP_SECONDS):
+        self._clock = clock
+        self._max_sleep = max_sleep
+        self._heap: List[list] = []
+        self._entries: Dict[Hashable, list] = {}
+        self._counter = itertools.count()
+        self._cancelled = 0
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: Hashable, due: datetime) -> None:
+        self.cancel(key)
+        entry = [due, next(self._counter), key, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[-1] = False
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2:
+            self._compact()
+        self._wakeup.set()
+        return True
+
+    def next_due(self) -> Optional[datetime]:
+        self._drop_cancelled_head()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Hashable]:
+        batch = []
+        while True:
+            self._drop_cancelled_head()
+            if not self._heap or self._heap[0][0] > now:
+                return batch
+            entry = heapq.heappop(self._heap)
+            del self._entries[entry[2]]
+            batch.append(entry[2])
+
+    async def run(self, fire: Callable[[List[Hashable]], Awaitable[None]]) -> None:
+        while True:
+            self._wakeup.clear()
+            due = self.next_due()
+            timeout = self._max_sleep
+            if due is not None:
+                timeout = min(timeout, max(0.0, (due - self._clock()).total_seconds()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            batch = self.pop_due(self._clock())
+            if not batch:
+                continue
+            try:
+                await fire(batch)
+            except Exception as e:
+                logging.exception("Ошибка при обработке напоминаний: %s", e)
+
+    def _drop_cancelled_head(self) -> None:
+        while self._heap and not self._heap[0][-1]:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+
+    def _compact(self) -> None:
+        self._heap = [entry for entry in self._heap if entry[-1]]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
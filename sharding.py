@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from blob_store import BlobStore
+from storage import Storage
+from task_journal import add_entry, remove_entry
+
+VIRTUAL_NODES = 160
+SHARDS_META_FILE = 'shards.json'
+
+
+def _point(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, nodes: int, replicas: int = VIRTUAL_NODES):
+        if nodes < 1:
+            raise ValueError("Нужен хотя бы один воркер")
+        self.nodes = nodes
+        ring = sorted((_point(f"worker-{node}#{replica}"), node)
+                      for node in range(nodes) for replica in range(replicas))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+
+    def owner(self, key) -> int:
+        index = bisect.bisect(self._points, _point(str(key)))
+        return self._owners[index % len(self._points)]
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    if count <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}{ext}"
+
+
+def update_user_id(update: dict) -> Optional[int]:
+    for key, event in update.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return user['id']
+        chat = event.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def read_shard_count(meta_path: str = SHARDS_META_FILE) -> int:
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return int(json.load(f)['count'])
+    except FileNotFoundError:
+        return 1
+    except Exception as e:
+        logging.warning("Не удалось прочитать %s: %s", meta_path, e)
+        return 1
+
+
+def write_shard_count(count: int, meta_path: str = SHARDS_META_FILE) -> None:
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'count': count}, f)
+
+
+async def rebalance(old_count: int, new_count: int,
+                    open_storage: Callable[[int, int], Storage],
+                    open_files: Optional[Callable[[int, int], BlobStore]] = None) -> int:
+    ring = HashRing(new_count)
+    targets: Dict[int, Storage] = {}
+    file_targets: Dict[int, BlobStore] = {}
+    moved = 0
+    try:
+        for index in range(old_count):
+            source = open_storage(index, old_count)
+            files = open_files(index, old_count) if open_files is not None else None
+            try:
+                users = await source.all_users()
+                tasks = await source.load_tasks()
+                file_users = set(files.user_ids()) if files is not None else set()
+                owners = {uid: ring.owner(uid) for uid in set(users) | set(tasks) | file_users}
+                leaving = [uid for uid, owner in owners.items()
+                           if old_count <= 1 or new_count <= 1 or owner != index]
+                for uid in leaving:
+                    owner = owners[uid]
+                    target = targets.get(owner)
+                    if target is None:
+                        target = targets[owner] = open_storage(owner, new_count)
+                        await target.load_tasks()
+                    if uid in users:
+                        await target.put_user(uid, users[uid])
+                        await source.delete_user(uid)
+                    records = tasks.get(uid, [])
+                    if records:
+                        await target.save_task_changes(add_entry(uid, record) for record in records)
+                        await source.save_task_changes(remove_entry(uid, record['id']) for record in records)
+                    if uid in file_users:
+                        file_target = file_targets.get(owner)
+                        if file_target is None:
+                            file_target = file_targets[owner] = open_files(owner, new_count)
+                        await files.move_user(uid, file_target)
+                moved += len(leaving)
+            finally:
+                await source.close()
+                if files is not None:
+                    await files.flush()
+    finally:
+        for target in targets.values():
+            await target.close()
+        for file_target in file_targets.values():
+            await file_target.flush()
+    return moved
+
+
+def _worker_main(index: int, count: int, updates) -> None:
+    os.environ['AIO_SHARD_INDEX'] = str(index)
+    os.environ['AIO_SHARD_COUNT'] = str(count)
+    import AIO
+    asyncio.run(AIO.run_worker(updates))
+
+
+class Supervisor:
+    def __init__(self, workers: int):
+        self.ring = HashRing(workers)
+        self.workers = workers
+        self._ctx = multiprocessing.get_context('spawn')
+        self._queues = [self._ctx.Queue() for _ in range(workers)]
+        self._processes: List[multiprocessing.Process] = [None] * workers
+        self.routed = [0] * workers
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def route(self, update: dict) -> int:
+        user_id = update_user_id(update)
+        index = self.ring.owner(user_id) if user_id is not None else 0
+        if not self._processes[index].is_alive():
+            logging.error("Воркер %s упал, перезапускаю", index)
+            self._spawn(index)
+        self._queues[index].put(update)
+        self.routed[index] += 1
+        return index
+
+    def stop(self, timeout: float = 60) -> None:
+        for queue in self._queues:
+            queue.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def _spawn(self, index: int) -> None:
+        process = self._ctx.Process(target=_worker_main, args=(index, self.workers, self._queues[index]),
+                                    name=f"aio-worker-{index}", daemon=False)
+        process.start()
+        self._processes[index] = process
+
+
+async def _poll(bot, supervisor: Supervisor, stop: asyncio.Event, allowed_updates) -> None:
+    offset = None
+    while not stop.is_set():
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=25, allowed_updates=allowed_updates)
+        except Exception as e:
+            logging.warning("Ошибка получения обновлений: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            supervisor.route(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def _serve_webhook(supervisor: Supervisor, stop: asyncio.Event, host: str, port: int, path: str,
+                         secret_token: Optional[str]) -> None:
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and not secrets.compare_digest(
+                request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret_token):
+            return web.Response(status=401)
+        supervisor.route(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_supervisor(workers: int, open_storage: Callable[[int, int], Storage],
+                         serve: Callable[[Supervisor, asyncio.Event], Awaitable],
+                         open_files: Optional[Callable[[int, int], BlobStore]] = None) -> None:
+    previous = read_shard_count()
+    if previous != workers:
+        moved = await rebalance(previous, workers, open_storage, open_files)
+        write_shard_count(workers)
+        logging.info("Перераспределено пользователей: %s (%s -> %s воркеров)", moved, previous, workers)
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await serve(supervisor, stop)
+    finally:
+        await asyncio.to_thread(supervisor.stop)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запуск AIO в нескольких процессах")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    import AIO
+    AIO.check_webhook_secret()
+
+    def open_storage(index: int, count: int) -> Storage:
+        return AIO.open_shard_storage(index, count)
+
+    async def serve(supervisor: Supervisor, stop: asyncio.Event) -> None:
+        if AIO.UPDATES_MODE == 'webhook':
+            if AIO.WEBHOOK_URL:
+                await AIO.get_bot().set_webhook(AIO.WEBHOOK_URL.rstrip('/') + AIO.WEBHOOK_PATH,
+                                                secret_token=AIO.WEBHOOK_SECRET,
+                                                allowed_updates=AIO.dp.resolve_used_update_types())
+            await _serve_webhook(supervisor, stop, AIO.WEBHOOK_LISTEN_HOST, AIO.WEBHOOK_LISTEN_PORT,
+                                 AIO.WEBHOOK_PATH, AIO.WEBHOOK_SECRET)
+            return
+        await AIO.get_bot().delete_webhook()
+        poller = asyncio.create_task(_poll(AIO.get_bot(), supervisor, stop, AIO.dp.resolve_used_update_types()))
+        await stop.wait()
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+
+    asyncio.run(run_supervisor(args.workers, open_storage, serve, AIO.open_shard_files))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+import abc
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from metrics import PERSIST_SECONDS
+from task_journal import TaskJournal, add_entry, new_task_id
+from user_repository import UserRepository
+
+
+def task_due_ts(record: dict) -> float:
+    return datetime.fromisoformat(record['date_iso']).timestamp()
+
+
+class Storage(abc.ABC):
+    @abc.abstractmethod
+    async def get_user(self, user_id) -> Optional[dict]:
+        ...
+
+    async def user_exists(self, user_id) -> bool:
+        return await self.get_user(user_id) is not None
+
+    @abc.abstractmethod
+    async def put_user(self, user_id, record: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def update_user(self, user_id, **fields) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def delete_user(self, user_id) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def all_users(self) -> Dict[str, dict]:
+        ...
+
+    @abc.abstractmethod
+    async def load_tasks(self) -> Dict[str, List[dict]]:
+        ...
+
+    @abc.abstractmethod
+    async def save_task_changes(self, entries: Iterable[dict]) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def tasks_due_before(self, moment: datetime) -> List[Tuple[str, dict]]:
+        ...
+
+    async def warm_up(self) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
+
+    async def snapshot(self) -> None:
+        await self.flush()
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+class JsonStorage(Storage):
+    def __init__(self, users_path, tasks_path, tasks_journal_path: Optional[str] = None):
+        self.users = UserRepository(users_path)
+        self.journal = TaskJournal(tasks_path, tasks_journal_path)
+        self._tasks: Dict[str, Dict[str, dict]] = {}
+        self._lock = asyncio.Lock()
+        self._compaction: Optional[asyncio.Task] = None
+        self._tasks_loaded = False
+
+    async def get_user(self, user_id) -> Optional[dict]:
+        await self.users.load()
+        return self.users.get(user_id)
+
+    async def user_exists(self, user_id) -> bool:
+        await self.users.load()
+        return self.users.exists(user_id)
+
+    async def put_user(self, user_id, record: dict) -> None:
+        await self.users.load()
+        self.users.put(user_id, record)
+
+    async def update_user(self, user_id, **fields) -> bool:
+        await self.users.load()
+        return self.users.update(user_id, **fields)
+
+    async def delete_user(self, user_id) -> bool:
+        await self.users.load()
+        return self.users.delete(user_id)
+
+    async def all_users(self) -> Dict[str, dict]:
+        await self.users.load()
+        return dict(self.users.users)
+
+    async def load_tasks(self) -> Dict[str, List[dict]]:
+        async with self._lock:
+            data = await asyncio.to_thread(self.journal.load)
+            missing_ids = False
+            self._tasks = {}
+            for uid, records in data.items():
+                for record in records:
+                    if not record.get('id'):
+                        record['id'] = new_task_id()
+                        missing_ids = True
+                    self._tasks.setdefault(uid, {})[record['id']] = record
+            self._tasks_loaded = True
+            if missing_ids:
+                await asyncio.to_thread(self.journal.compact, self._snapshot())
+            return self._snapshot()
+
+    async def save_task_changes(self, entries: Iterable[dict]) -> None:
+        entries = list(entries)
+        async with self._lock:
+            with PERSIST_SECONDS.time('tasks'):
+                self.journal.append(entries)
+            for entry in entries:
+                self._apply(entry)
+            if self.journal.needs_compaction() and (self._compaction is None or self._compaction.done()):
+                self._compaction = asyncio.create_task(self.compact())
+
+    async def tasks_due_before(self, moment: datetime) -> List[Tuple[str, dict]]:
+        limit = moment.timestamp()
+        return [(uid, record) for uid, records in self._tasks.items()
+                for record in records.values() if task_due_ts(record) < limit]
+
+    async def compact(self) -> None:
+        async with self._lock:
+            seq = self.journal.rotate()
+            snapshot = self._snapshot()
+        try:
+            with PERSIST_SECONDS.time('tasks_snapshot'):
+                await asyncio.to_thread(self.journal.write_snapshot, snapshot, seq)
+        except Exception as e:
+            logging.exception("Ошибка сжатия журнала задач: %s", e)
+
+    async def warm_up(self) -> None:
+        await self.users.load()
+
+    async def flush(self) -> None:
+        await self.users.flush()
+
+    async def snapshot(self) -> None:
+        await self.flush()
+        if self._compaction is not None:
+            await self._compaction
+        if self._tasks_loaded and self.journal.pending:
+            await self.compact()
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._compaction is not None:
+            await self._compaction
+        self.journal.close()
+
+    def _apply(self, entry: dict) -> None:
+        uid = entry['uid']
+        if entry['op'] == 'add':
+            self._tasks.setdefault(uid, {})[entry['task']['id']] = entry['task']
+            return
+        records = self._tasks.get(uid, {})
+        records.pop(entry['id'], None)
+        if not records:
+            self._tasks.pop(uid, None)
+
+    def _snapshot(self) -> Dict[str, List[dict]]:
+        return {uid: list(records.values()) for uid, records in self._tasks.items() if records}
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS tasks (user_id TEXT NOT NULL, id TEXT NOT NULL, due_ts REAL NOT NULL, "
+    "data TEXT NOT NULL, PRIMARY KEY (user_id, id))",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks (due_ts)",
+)
+
+
+class SqliteWorker:
+    def __init__(self, path, schema: Iterable[str] = (), name: str = 'sqlite'):
+        self.path = str(path)
+        self.schema = tuple(schema)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self.run(lambda conn: conn.close())
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+    def _call(self, fn, args):
+        return fn(self._connection(), *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+
+class SqliteStorage(Storage):
+    def __init__(self, path):
+        self.db = SqliteWorker(path, SCHEMA, name='sqlite-storage')
+
+    async def get_user(self, user_id) -> Optional[dict]:
+        row = await self.db.run(_fetchone, "SELECT data FROM users WHERE user_id = ?", (str(user_id),))
+        return json.loads(row[0]) if row else None
+
+    async def put_user(self, user_id, record: dict) -> None:
+        await self.db.run(_execute, "INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)",
+                          (str(user_id), json.dumps(record, ensure_ascii=False)))
+
+    async def update_user(self, user_id, **fields) -> bool:
+        return await self.db.run(_update_user, str(user_id), fields)
+
+    async def delete_user(self, user_id) -> bool:
+        return await self.db.run(_delete_user, str(user_id))
+
+    async def all_users(self) -> Dict[str, dict]:
+        rows = await self.db.run(_fetchall, "SELECT user_id, data FROM users", ())
+        return {uid: json.loads(data) for uid, data in rows}
+
+    async def load_tasks(self) -> Dict[str, List[dict]]:
+        rows = await self.db.run(_fetchall, "SELECT user_id, data FROM tasks ORDER BY due_ts", ())
+        tasks: Dict[str, List[dict]] = {}
+        for uid, data in rows:
+            tasks.setdefault(uid, []).append(json.loads(data))
+        return tasks
+
+    async def save_task_changes(self, entries: Iterable[dict]) -> None:
+        with PERSIST_SECONDS.time('tasks'):
+            await self.db.run(_save_task_changes, list(entries))
+
+    async def tasks_due_before(self, moment: datetime) -> List[Tuple[str, dict]]:
+        rows = await self.db.run(_fetchall, "SELECT user_id, data FROM tasks WHERE due_ts < ? ORDER BY due_ts",
+                                 (moment.timestamp(),))
+        return [(uid, json.loads(data)) for uid, data in rows]
+
+    async def close(self) -> None:
+        await self.db.close()
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+def _execute(conn, sql, params):
+    with conn:
+        conn.execute(sql, params)
+
+
+def _update_user(conn, user_id, fields) -> bool:
+    with conn:
+        row = conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return False
+        record = {**json.loads(row[0]), **fields}
+        conn.execute("UPDATE users SET data = ? WHERE user_id = ?", (json.dumps(record, ensure_ascii=False), user_id))
+        return True
+
+
+def _delete_user(conn, user_id) -> bool:
+    with conn:
+        return conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,)).rowcount > 0
+
+
+def _save_task_changes(conn, entries) -> None:
+    with conn:
+        for entry in entries:
+            if entry['op'] == 'add':
+                task = entry['task']
+                conn.execute("INSERT OR REPLACE INTO tasks (user_id, id, due_ts, data) VALUES (?, ?, ?, ?)",
+                             (entry['uid'], task['id'], task_due_ts(task), json.dumps(task, ensure_ascii=False)))
+            else:
+                conn.execute("DELETE FROM tasks WHERE user_id = ? AND id = ?", (entry['uid'], entry['id']))
+
+
+def create_storage(backend: str, users_path, tasks_path, tasks_journal_path=None, sqlite_path='aio.sqlite3') -> Storage:
+    if backend == 'json':
+        return JsonStorage(users_path, tasks_path, tasks_journal_path)
+    if backend == 'sqlite':
+        return SqliteStorage(sqlite_path)
+    raise ValueError(f"Неизвестный STORAGE_BACKEND: {backend}")
+
+
+async def migrate_json_to_sqlite(users_path, tasks_path, sqlite_path, tasks_journal_path=None) -> Tuple[int, int]:
+    source = JsonStorage(users_path, tasks_path, tasks_journal_path)
+    target = SqliteStorage(sqlite_path)
+    try:
+        users = await source.all_users()
+        for user_id, record in users.items():
+            await target.put_user(user_id, record)
+        tasks = await source.load_tasks()
+        await target.save_task_changes(add_entry(uid, record) for uid, records in tasks.items() for record in records)
+    finally:
+        source.journal.close()
+        await target.close()
+    return len(users), sum(len(records) for records in tasks.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Утилиты хранилища AIO")
+    commands = parser.add_subparsers(dest='command', required=True)
+    migrate = commands.add_parser('migrate', help="Импорт JSON-файлов в SQLite")
+    migrate.add_argument('--users', default='users_data.json')
+    migrate.add_argument('--tasks', default='tasks_data.json')
+    migrate.add_argument('--journal', default=None)
+    migrate.add_argument('--db', default='aio.sqlite3')
+    args = parser.parse_args(argv)
+
+    users, tasks = asyncio.run(migrate_json_to_sqlite(args.users, args.tasks, args.db, args.journal))
+    print(f"Перенесено пользователей: {users}, задач: {tasks}")
+
+
+if __name__ == '__main__':
+    main()
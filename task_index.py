@@ -0,0 +1,56 @@
+import bisect
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class TaskIndex:
+    def __init__(self, tasks: Iterable[dict] = ()):
+        self._keys: List[Tuple[datetime, str]] = []
+        self._tasks: Dict[str, dict] = {}
+        for task in tasks:
+            self.add(task)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def __iter__(self) -> Iterator[dict]:
+        return (self._tasks[task_id] for _, task_id in self._keys)
+
+    def get(self, task_id: str) -> Optional[dict]:
+        return self._tasks.get(task_id)
+
+    def add(self, task: dict) -> None:
+        self.remove(task['id'])
+        self._tasks[task['id']] = task
+        bisect.insort(self._keys, (task['date'], task['id']))
+
+    def remove(self, task_id: str) -> Optional[dict]:
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return None
+        position = bisect.bisect_left(self._keys, (task['date'], task_id))
+        del self._keys[position]
+        return task
+
+    def count(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        lo, hi = self._bounds(start, end)
+        lo = min(lo + max(offset, 0), hi)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self._tasks[task_id] for _, task_id in self._keys[lo:hi]]
+
+    def upcoming(self, now: datetime, limit: int) -> List[dict]:
+        return self.between(now, None, limit=limit)
+
+    def _bounds(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+        lo = bisect.bisect_left(self._keys, (start,)) if start is not None else 0
+        hi = bisect.bisect_left(self._keys, (end,)) if end is not None else len(self._keys)
+        return lo, max(lo, hi)
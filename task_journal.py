@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+COMPACT_EVERY = 1000
+
+
+def new_task_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def add_entry(user_id, record: dict) -> dict:
+    return {'op': 'add', 'uid': str(user_id), 'task': record}
+
+
+def remove_entry(user_id, task_id: str, op: str = 'delete') -> dict:
+    return {'op': op, 'uid': str(user_id), 'id': task_id}
+
+
+class TaskJournal:
+    def __init__(self, snapshot_path, journal_path: Optional[str] = None,
+                 compact_every: int = COMPACT_EVERY, fsync: bool = False):
+        self.snapshot_path = str(snapshot_path)
+        self.journal_path = journal_path or self.snapshot_path + '.journal'
+        self.compacting_path = self.journal_path + '.compacting'
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._seq = 0
+        self._pending = 0
+        self._file = None
+
+    def load(self) -> Dict[str, List[dict]]:
+        snapshot, snapshot_seq = self._read_snapshot()
+        tasks = {uid: {record.get('id') or f'#{index}': record for index, record in enumerate(records)}
+                 for uid, records in snapshot.items()}
+        self._seq = snapshot_seq
+        self._pending = 0
+        for path in (self.compacting_path, self.journal_path):
+            for entry in self._read_journal(path):
+                seq = entry.get('seq', 0)
+                self._seq = max(self._seq, seq)
+                if seq <= snapshot_seq:
+                    continue
+                self._pending += 1
+                self._apply(tasks, entry)
+        return {uid: list(records.values()) for uid, records in tasks.items() if records}
+
+    def append(self, entries: Iterable[dict]) -> None:
+        lines = []
+        for entry in entries:
+            self._seq += 1
+            lines.append(json.dumps(dict(entry, seq=self._seq), ensure_ascii=False))
+        if not lines:
+            return
+        if self._file is None:
+            self._drop_torn_tail()
+            self._file = open(self.journal_path, 'a', encoding='utf-8')
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._pending += len(lines)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def needs_compaction(self) -> bool:
+        return self._pending >= self.compact_every
+
+    def rotate(self) -> int:
+        self.close()
+        if os.path.exists(self.journal_path) and not os.path.exists(self.compacting_path):
+            os.replace(self.journal_path, self.compacting_path)
+        self._pending = 0
+        return self._seq
+
+    def write_snapshot(self, tasks: Dict[str, List[dict]], seq: int) -> None:
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'seq': seq, 'tasks': tasks}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+
+    def compact(self, tasks: Dict[str, List[dict]]) -> None:
+        self.write_snapshot(tasks, self.rotate())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _drop_torn_tail(self) -> None:
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            offset = end
+            while offset > 0:
+                start = max(0, offset - 4096)
+                f.seek(start)
+                chunk = f.read(offset - start)
+                newline = chunk.rfind(b'\n')
+                if newline >= 0:
+                    offset = start + newline + 1
+                    break
+                offset = start
+            if offset < end:
+                logging.warning("Отброшен незавершенный хвост журнала %s (%s байт)", self.journal_path, end - offset)
+                f.truncate(offset)
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return {}, 0
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            raw = f.read().strip()
+        if not raw:
+            return {}, 0
+        try:
+            data = json.loads(raw)
+        except json.JSONDecodeError:
+            logging.warning("Снимок задач поврежден, восстанавливаю из журнала.")
+            return {}, 0
+        if isinstance(data, dict) and set(data) == {'seq', 'tasks'}:
+            return data['tasks'], data['seq']
+        return data, 0
+
+    @staticmethod
+    def _read_journal(path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning("Пропущена поврежденная запись журнала %s:%s", path, line_no)
+
+    @staticmethod
+    def _apply(tasks, entry):
+        uid = entry.get('uid')
+        op = entry.get('op')
+        if op == 'add':
+            records = tasks.setdefault(uid, {})
+            records.pop(entry['task'].get('id'), None)
+            records[entry['task'].get('id')] = entry['task']
+        elif op in ('delete', 'fire'):
+            records = tasks.get(uid, {})
+            records.pop(entry.get('id'), None)
+            if not records:
+                tasks.pop(uid, None)
@@ -0,0 +1,342 @@
+import asyncio
+import codecs
+import csv
+import hashlib
+import io
+import re
+from datetime import datetime, time, timedelta
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+from aiogram.types import InputFile
+
+from recurrence import RecurrenceError, compile_rule, next_occurrence, parse_rule
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 5
+ALL_DAY_TIME = time(9, 0)
+CSV_COLUMNS = ('name', 'date', 'rule', 'id')
+CSV_HEADERS = {'name': 'name', 'название': 'name', 'задача': 'name', 'summary': 'name',
+               'date': 'date', 'дата': 'date', 'start': 'date',
+               'rule': 'rule', 'повтор': 'rule', 'id': 'id'}
+ICS_WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+TASK_ID_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+
+Row = Tuple[str, datetime, Optional[str], Optional[str]]
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors: List[str] = []
+
+    def fail(self, line_no: int, error: Exception) -> None:
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"строка {line_no}: {error}")
+
+
+def task_file_kind(filename: Optional[str]) -> Optional[str]:
+    suffix = (filename or '').rsplit('.', 1)[-1].lower()
+    return suffix if suffix in ('ics', 'csv') else None
+
+
+def resolve_due(due: datetime, rule: Optional[str], now: datetime, tz) -> datetime:
+    due = tz.localize(due) if due.tzinfo is None else due.astimezone(tz)
+    if rule:
+        return next_occurrence(rule, max(due - timedelta(minutes=1), now), tz)
+    if due <= now:
+        raise ValueError("время уже прошло")
+    return due
+
+
+def resolve_rule(text: Optional[str], due: datetime) -> Optional[str]:
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        compile_rule(text)
+        return text
+    except RecurrenceError:
+        return parse_rule(text, due)
+
+
+def import_task_id(value: Optional[str]) -> Optional[str]:
+    value = (value or '').strip()
+    if not value:
+        return None
+    local = value[:-4] if value.endswith('@aio') else value
+    if TASK_ID_PATTERN.match(local):
+        return local
+    return hashlib.md5(value.encode('utf-8')).hexdigest()[:12]
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    tail = ''
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail.rstrip('\r')
+
+
+async def iter_csv_records(lines: AsyncIterable[str]) -> AsyncIterator[Tuple[int, List[str]]]:
+    delimiter = None
+    pending: List[str] = []
+    start = 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not pending:
+            start = line_no
+        pending.append(line)
+        text = '\n'.join(pending)
+        if text.count('"') % 2:
+            continue
+        pending = []
+        if not text.strip():
+            continue
+        if delimiter is None:
+            delimiter = ';' if text.count(';') > text.count(',') else ','
+        yield start, next(csv.reader([text], delimiter=delimiter))
+    if pending:
+        yield start, next(csv.reader(['\n'.join(pending)], delimiter=delimiter or ','))
+
+
+async def iter_csv_rows(lines: AsyncIterable[str]) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    columns = None
+    async for line_no, record in iter_csv_records(lines):
+        if columns is None:
+            named = [CSV_HEADERS.get(cell.strip().lower()) for cell in record]
+            if 'name' in named and 'date' in named:
+                columns = named
+                continue
+            columns = list(CSV_COLUMNS)
+        yield line_no, {column: value for column, value in zip(columns, record) if column}
+
+
+async def iter_ics_events(lines: AsyncIterable[str]) -> AsyncIterator[Tuple[int, Dict[str, Tuple[dict, str]]]]:
+    event: Optional[Dict[str, Tuple[dict, str]]] = None
+    start = 0
+    current: Optional[str] = None
+    line_no = 0
+
+    def flush():
+        if event is not None and current is not None:
+            name, params, value = _parse_ics_line(current)
+            event.setdefault(name, (params, value))
+
+    async for line in lines:
+        line_no += 1
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        flush()
+        current = line
+        upper = line.strip().upper()
+        if upper == 'BEGIN:VEVENT':
+            event, start, current = {}, line_no, None
+        elif upper == 'END:VEVENT':
+            if event is not None:
+                yield start, event
+            event, current = None, None
+    flush()
+
+
+def csv_row(row: Dict[str, str], tz) -> Row:
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError("нет названия")
+    text = (row.get('date') or '').strip()
+    try:
+        due = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"неверная дата «{text}»") from None
+    due = tz.localize(due) if due.tzinfo is None else due.astimezone(tz)
+    return name, due, resolve_rule(row.get('rule'), due), import_task_id(row.get('id'))
+
+
+def ics_row(event: Dict[str, Tuple[dict, str]], tz) -> Row:
+    name = _ics_unescape(event.get('SUMMARY', ({}, ''))[1]).strip()
+    if not name:
+        raise ValueError("нет SUMMARY")
+    if 'DTSTART' not in event:
+        raise ValueError("нет DTSTART")
+    try:
+        due = _ics_datetime(*event['DTSTART'], tz)
+    except ValueError:
+        raise ValueError(f"неверный DTSTART «{event['DTSTART'][1]}»") from None
+    if 'X-AIO-RULE' in event:
+        rule = resolve_rule(_ics_unescape(event['X-AIO-RULE'][1]), due)
+    elif 'RRULE' in event:
+        rule = rrule_to_rule(event['RRULE'][1], due)
+    else:
+        rule = None
+    return name, due, rule, import_task_id(event.get('UID', ({}, ''))[1])
+
+
+def rrule_to_rule(rrule: str, due: datetime) -> str:
+    parts = dict(part.split('=', 1) for part in rrule.upper().split(';') if '=' in part)
+    unsupported = sorted({'COUNT', 'UNTIL'} & set(parts))
+    if parts.get('INTERVAL', '1') != '1':
+        unsupported.append('INTERVAL')
+    if unsupported:
+        raise RecurrenceError(f"RRULE с {', '.join(unsupported)} не поддерживается")
+    at = due.strftime('%H:%M')
+    freq = parts.get('FREQ')
+    if freq == 'DAILY':
+        return f'daily {at}'
+    if freq == 'WEEKLY':
+        days = [ICS_WEEKDAYS.index(day[-2:]) + 1 for day in parts.get('BYDAY', '').split(',')
+                if day[-2:] in ICS_WEEKDAYS] or [due.isoweekday()]
+        return f"weekly {','.join(map(str, sorted(set(days))))} {at}"
+    if freq == 'MONTHLY' and parts.get('BYMONTHDAY', str(due.day)).isdigit():
+        return f"monthly {parts.get('BYMONTHDAY', due.day)} {at}"
+    raise RecurrenceError(f"RRULE «{rrule}» не поддерживается")
+
+
+def rule_to_rrule(rule: str) -> Optional[str]:
+    kind, *args = rule.split()
+    if kind == 'daily':
+        return 'FREQ=DAILY'
+    if kind == 'weekly':
+        return 'FREQ=WEEKLY;BYDAY=' + ','.join(ICS_WEEKDAYS[int(day) - 1] for day in args[0].split(','))
+    if kind == 'monthly':
+        return f'FREQ=MONTHLY;BYMONTHDAY={args[0]}'
+    return None
+
+
+async def import_task_stream(chunks: AsyncIterable[bytes], kind: str, tz, now: datetime,
+                             add_batch: Callable[[List[Row]], None],
+                             batch_size: int = IMPORT_BATCH_SIZE) -> ImportReport:
+    report = ImportReport()
+    batch: List[Row] = []
+    if kind == 'ics':
+        records, to_row = iter_ics_events(iter_lines(chunks)), ics_row
+    else:
+        records, to_row = iter_csv_rows(iter_lines(chunks)), csv_row
+    async for line_no, record in records:
+        try:
+            name, due, rule, task_id = to_row(record, tz)
+            batch.append((name, resolve_due(due, rule, now, tz), rule, task_id))
+        except ValueError as e:
+            report.fail(line_no, e)
+            continue
+        if len(batch) >= batch_size:
+            add_batch(batch)
+            report.imported += len(batch)
+            batch = []
+            await asyncio.sleep(0)
+    if batch:
+        add_batch(batch)
+        report.imported += len(batch)
+    return report
+
+
+def iter_csv_export(tasks: Iterable[dict], tz) -> Iterable[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for task in tasks:
+        writer.writerow((task['name'], task['date'].astimezone(tz).strftime('%Y-%m-%d %H:%M'),
+                         task.get('rule') or '', task['id']))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ics_export(tasks: Iterable[dict], tz, stamp: datetime) -> Iterable[str]:
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//AIO//Tasks//RU\r\nCALSCALE:GREGORIAN\r\n'
+    dtstamp = stamp.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+    for task in tasks:
+        lines = ['BEGIN:VEVENT', f"UID:{task['id']}@aio", f'DTSTAMP:{dtstamp}',
+                 f"DTSTART;TZID={tz.zone}:{task['date'].astimezone(tz).strftime('%Y%m%dT%H%M%S')}",
+                 f"SUMMARY:{_ics_escape(task['name'])}"]
+        rule = task.get('rule')
+        if rule:
+            rrule = rule_to_rrule(rule)
+            if rrule:
+                lines.append(f'RRULE:{rrule}')
+            lines.append(f'X-AIO-RULE:{_ics_escape(rule)}')
+        lines.append('END:VEVENT')
+        yield ''.join(_ics_fold(line) + '\r\n' for line in lines)
+    yield 'END:VCALENDAR\r\n'
+
+
+class TaskExportFile(InputFile):
+    def __init__(self, tasks: Iterable[dict], kind: str, tz, filename: Optional[str] = None):
+        super().__init__(filename=filename or f'tasks.{kind}', chunk_size=EXPORT_CHUNK_SIZE)
+        self.tasks = list(tasks)
+        self.kind = kind
+        self.tz = tz
+
+    async def read(self, bot) -> AsyncIterator[bytes]:
+        if self.kind == 'ics':
+            parts = iter_ics_export(self.tasks, self.tz, datetime.now(self.tz))
+        else:
+            parts = iter_csv_export(self.tasks, self.tz)
+        buffer = bytearray(codecs.BOM_UTF8 if self.kind == 'csv' else b'')
+        for part in parts:
+            buffer += part.encode('utf-8')
+            if len(buffer) >= self.chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+                await asyncio.sleep(0)
+        if buffer:
+            yield bytes(buffer)
+
+
+def _parse_ics_line(line: str) -> Tuple[str, dict, str]:
+    head, _, value = line.partition(':')
+    name, *raw_params = head.split(';')
+    params = {}
+    for param in raw_params:
+        key, _, param_value = param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.strip().upper(), params, value
+
+
+def _ics_datetime(params: dict, value: str, tz) -> datetime:
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return tz.localize(datetime.combine(datetime.strptime(value, '%Y%m%d').date(), ALL_DAY_TIME))
+    if value.endswith('Z'):
+        return pytz.utc.localize(datetime.strptime(value[:-1], '%Y%m%dT%H%M%S')).astimezone(tz)
+    moment = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    try:
+        source = pytz.timezone(params['TZID']) if 'TZID' in params else tz
+    except pytz.UnknownTimeZoneError:
+        source = tz
+    return source.localize(moment).astimezone(tz)
+
+
+def _ics_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_unescape(text: str) -> str:
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), text)
+
+
+def _ics_fold(line: str) -> str:
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size = [], '', 0
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n '.join(parts)
@@ -0,0 +1,134 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from aiogram import Bot
+
+import AIO
+from benchmarks.bench_handlers import Harness
+from benchmarks.fakes import BENCH_TOKEN, FakeSession
+from blob_store import BlobStore
+from upload_pipeline import UploadPipeline
+
+
+class BrokenStreamClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        self.attempts += 1
+        broken = self.attempts <= self.failures
+
+        async def stream():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Частичный "))])
+            if broken:
+                raise httpx.RemoteProtocolError("peer closed connection without sending complete message body")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="ответ"))])
+
+        return stream()
+
+
+@pytest.fixture
+def gpt_client(monkeypatch):
+    async def no_sleep(delay):
+        return None
+
+    monkeypatch.setattr(AIO.asyncio, 'sleep', no_sleep)
+
+    def install(failures):
+        client = BrokenStreamClient(failures)
+        monkeypatch.setattr(AIO, 'client', client)
+        return client
+
+    return install
+
+
+def test_interrupted_stream_is_retried(gpt_client):
+    client = gpt_client(1)
+    retries = AIO.GPT_RETRIES.value('connection')
+    AIO.clear_chat_history(501)
+    partial = []
+    reply = asyncio.run(AIO.ask_gpt(501, "Вопрос", on_delta=partial.append))
+    assert reply == "Частичный ответ"
+    assert client.attempts == 2
+    assert AIO.GPT_RETRIES.value('connection') == retries + 1
+    assert AIO.conversation_store.get(501)[-2:] == [{"role": "user", "content": "Вопрос"},
+                                                    {"role": "assistant", "content": "Частичный ответ"}]
+
+
+def test_stream_failing_every_attempt_leaves_history_unchanged(gpt_client):
+    client = gpt_client(3)
+    AIO.clear_chat_history(502)
+    before = AIO.conversation_store.get(502)
+    reply = asyncio.run(AIO.ask_gpt(502, "Вопрос", on_delta=lambda text: None))
+    assert client.attempts == 3
+    assert reply.startswith("Ошибка GPT после повторов")
+    assert AIO.conversation_store.get(502) == before
+
+
+def test_upload_file_id_is_cached_under_the_sanitized_name(monkeypatch, tmp_path):
+    store = BlobStore(tmp_path / 'files')
+    pipeline = UploadPipeline(store, workers=1)
+    session = FakeSession()
+    bot = Bot(BENCH_TOKEN, session=session)
+    monkeypatch.setattr(AIO, 'bot', bot)
+    monkeypatch.setattr(AIO, 'blob_store', store)
+    monkeypatch.setattr(AIO, 'upload_pipeline', pipeline)
+    harness = Harness(AIO, bot, 1)
+
+    async def scenario():
+        worker = asyncio.create_task(pipeline.run())
+        try:
+            await AIO.dp.feed_update(bot, harness.message(601, document={
+                'file_id': 'F1', 'file_unique_id': 'U1', 'file_name': 'My Report.pdf', 'file_size': 10}))
+            await AIO.dp.feed_update(bot, harness.callback(601, "download::1"))
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    asyncio.run(scenario())
+    name = store.name_by_id(601, 1)
+    assert name == 'My_Report.pdf'
+    digest = store.digest(601, name)
+    assert store.file_id(digest, name) == 'F1'
+    assert store.file_id(digest, 'My Report.pdf') is None
+    assert session.requests['SendDocument'] == 1
+
+
+def test_webhook_mode_refuses_to_start_without_secret(monkeypatch):
+    monkeypatch.setattr(AIO, 'API_TOKEN', BENCH_TOKEN)
+    monkeypatch.setattr(AIO, 'UPDATES_MODE', 'webhook')
+    monkeypatch.setattr(AIO, 'WEBHOOK_SECRET', None)
+    served = []
+
+    async def run_webhook():
+        served.append(True)
+
+    monkeypatch.setattr(AIO, 'run_webhook', run_webhook)
+    with pytest.raises(RuntimeError, match='WEBHOOK_SECRET'):
+        asyncio.run(AIO.main())
+    assert served == []
+    monkeypatch.setattr(AIO, 'WEBHOOK_SECRET', 's3cret')
+    asyncio.run(AIO.main())
+    assert served == [True]
+
+
+@pytest.mark.parametrize('handler', ['list_user_files', 'page_files', 'send_file', 'handle_file_upload'])
+def test_file_handlers_wait_for_warmup(handler):
+    observers = (AIO.dp.message, AIO.dp.callback_query)
+    flags = [h.flags for observer in observers for h in observer.handlers if h.callback is getattr(AIO, handler)]
+    assert flags and flags[0].get('warmup') is True
+
+
+def test_openai_connection_errors_are_retryable_once_client_exists(monkeypatch):
+    from openai import APIConnectionError
+
+    monkeypatch.setattr(AIO, 'OPENAI_KEY', 'sk-test')
+    monkeypatch.setattr(AIO, 'client', None)
+    monkeypatch.setattr(AIO, 'GPT_CONNECTION_ERRORS', AIO.GPT_CONNECTION_ERRORS)
+    assert AIO.get_client() is AIO.client
+    assert issubclass(APIConnectionError, AIO.GPT_CONNECTION_ERRORS)
+    assert issubclass(httpx.ReadError, AIO.GPT_CONNECTION_ERRORS)
@@ -0,0 +1,50 @@
+import asyncio
+from types import SimpleNamespace
+
+from aiogram import Bot
+
+from benchmarks.bench_filter import run as run_filter_benchmark
+from benchmarks.bench_handlers import percentile, summarize
+from benchmarks.bench_startup import run as run_startup_benchmark
+from benchmarks.fakes import BENCH_TOKEN, FakeSession, StubOpenAI
+
+
+def test_percentiles_use_nearest_rank():
+    samples = [n / 1000 for n in range(1, 101)]
+    assert percentile(samples, 50) == 0.05
+    assert percentile(samples, 99) == 0.099
+    assert percentile([], 95) == 0.0
+    assert summarize(samples, 2.0)['throughput'] == 50.0
+
+
+def test_fake_session_answers_without_network():
+    async def scenario():
+        session = FakeSession()
+        bot = Bot(BENCH_TOKEN, session=session)
+        sent = await bot.send_message(7, "привет")
+        edited = await sent.edit_text("пока")
+        document = await bot.send_document(7, 'FILE')
+        reply = await StubOpenAI(latency=0).chat.completions.create(model='m', messages=[])
+        return session, sent, edited, document, reply
+
+    session, sent, edited, document, reply = asyncio.run(scenario())
+    assert sent.chat.id == 7 and edited.text == "пока"
+    assert document.document.file_id.startswith('sent-')
+    assert reply.choices[0].message.content
+    assert session.requests == {'SendMessage': 1, 'EditMessageText': 1, 'SendDocument': 1}
+
+
+def test_filter_benchmark_matchers_agree():
+    results = run_filter_benchmark(SimpleNamespace(seed=3, patterns=300, messages=200, length=120,
+                                                   blocked_share=0.2, chain_limit=300))
+    assert set(results) == {'automaton', 'alternation', 'regex_chain'}
+    assert len({row['hits'] for row in results.values()}) == 1
+    assert results['automaton']['hits'] > 0
+
+
+def test_startup_benchmark_imports_cleanly_and_restarts_from_snapshot():
+    results = run_startup_benchmark(SimpleNamespace(runs=1, users=20, tasks=5))
+    assert set(results) == {'journal', 'snapshot'}
+    for row in results.values():
+        assert row['tasks'] == 100
+        assert row['import_side_effects'] == []
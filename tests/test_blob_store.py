@@ -0,0 +1,177 @@
+import asyncio
+import json
+from pathlib import Path
+
+from metrics import PERSIST_SECONDS
+from blob_store import BlobStore
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def test_identical_uploads_share_one_blob_until_last_reference(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        _, first = await store.add(1, 'report.pdf', chunks(b'hello ', b'world'), file_unique_id='U1')
+        _, second = await store.add(2, 'copy.pdf', chunks(b'hello world'))
+        assert first == second
+        assert store.refs(first) == 2
+        assert len(list((tmp_path / '.blobs').glob('??/*'))) == 1
+
+        assert await store.unlink(1, 'report.pdf')
+        assert store.blob_path(first).exists()
+        assert await store.unlink(2, 'copy.pdf')
+        await store.flush()
+        return first, store
+
+    digest, store = asyncio.run(scenario())
+    assert not store.blob_path(digest).exists()
+    assert store.find_unique('U1') is None
+    assert store.names(1) == [] and store.names(2) == []
+
+
+def test_known_unique_id_links_without_download_and_survives_restart(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        _, digest = await store.add(1, 'photo.jpg', chunks(b'data'), file_unique_id='U1')
+        await store.flush()
+
+        restarted = BlobStore(tmp_path)
+        known = restarted.find_unique('U1')
+        name = await restarted.link(2, '../photo.jpg', known)
+        return digest, known, name, restarted
+
+    digest, known, name, store = asyncio.run(scenario())
+    assert known == digest
+    assert name == 'photo.jpg'
+    assert store.path(2, 'photo.jpg').read_bytes() == b'data'
+    assert store.refs(digest) == 2
+
+
+def test_releasing_a_blob_drops_only_its_unique_ids(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        await store.add(1, 'a.txt', chunks(b'a'), file_unique_id='A1')
+        await store.add(1, 'b.txt', chunks(b'b'), file_unique_id='B1')
+        await store.add(2, 'b.txt', chunks(b'b'), file_unique_id='B2')
+        await store.add(1, 'moved.txt', chunks(b'a'), file_unique_id='M1')
+        await store.add(1, 'moved.txt', chunks(b'b'), file_unique_id='M1')
+        await store.flush()
+        restarted = BlobStore(tmp_path)
+        assert await restarted.unlink(1, 'b.txt') and await restarted.unlink(2, 'b.txt')
+        assert await restarted.unlink(1, 'moved.txt')
+        return restarted
+
+    store = asyncio.run(scenario())
+    assert store.find_unique('A1') == store.digest(1, 'a.txt')
+    assert [store.find_unique(uid) for uid in ('B1', 'B2', 'M1')] == [None, None, None]
+    assert store._unique == {'A1': store.digest(1, 'a.txt')}
+
+
+def test_legacy_user_directories_are_imported(tmp_path: Path):
+    (tmp_path / '7').mkdir()
+    (tmp_path / '7' / 'a.txt').write_bytes(b'same')
+    (tmp_path / '7' / 'b.txt').write_bytes(b'same')
+
+    async def scenario():
+        store = BlobStore(tmp_path)
+        return await store.import_legacy(), store
+
+    imported, store = asyncio.run(scenario())
+    assert imported == 2
+    assert store.names(7) == ['a.txt', 'b.txt']
+    assert store.path(7, 'a.txt') == store.path(7, 'b.txt')
+    assert not (tmp_path / '7').exists()
+
+
+def test_telegram_file_ids_are_cached_per_name_and_persisted(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        _, digest = await store.add(1, 'a.txt', chunks(b'data'))
+        await store.remember_file_id(digest, 'a.txt', 'FILE-1')
+        await store.flush()
+        restarted = BlobStore(tmp_path)
+        cached = restarted.file_id(digest, 'a.txt'), restarted.file_id(digest, 'b.txt')
+        await restarted.remember_file_id(digest, 'a.txt', None)
+        return cached, restarted.file_id(digest, 'a.txt')
+
+    assert asyncio.run(scenario()) == (('FILE-1', None), None)
+
+
+def test_user_index_pages_by_name_and_resolves_stable_numeric_ids(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        for name in ('c.txt', 'a.txt', 'b.txt'):
+            await store.add(1, name, chunks(name.encode()))
+        await store.unlink(1, 'b.txt')
+        await store.add(1, 'd.txt', chunks(b'd'))
+        await store.flush()
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.page(1, 0, 2) == [(2, 'a.txt'), (1, 'c.txt')]
+    assert store.page(1, 1, 2) == [(4, 'd.txt')]
+    assert store.name_by_id(1, 3) is None
+    assert BlobStore(tmp_path).name_by_id(1, 4) == 'd.txt'
+    assert store.entry(1, 'd.txt')['size'] == 1
+
+
+def test_index_written_before_file_metadata_is_upgraded(tmp_path: Path):
+    digest = 'ab' * 32
+    (tmp_path / 'index.json').write_text(json.dumps({
+        'blobs': {digest: {'size': 5, 'refs': 2}},
+        'users': {'1': {'b.txt': digest, 'a.txt': digest}},
+    }), encoding='utf-8')
+
+    store = BlobStore(tmp_path)
+    assert store.page(1, 0, 10) == [(1, 'a.txt'), (2, 'b.txt')]
+    assert store.entry(1, 'b.txt')['size'] == 5
+
+
+def test_replacing_a_name_releases_the_previous_blob(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        _, old = await store.add(1, 'a.txt', chunks(b'old'))
+        _, new = await store.add(1, 'a.txt', chunks(b'newer'))
+        await store.flush()
+        return store, old, new
+
+    store, old, new = asyncio.run(scenario())
+    assert not store.blob_path(old).exists()
+    assert store.refs(new) == 1
+    assert store.usage(1) == 5
+
+
+def test_legacy_import_skips_directories_owned_by_other_shards(tmp_path: Path):
+    for uid in ('7', '8'):
+        (tmp_path / uid).mkdir()
+        (tmp_path / uid / 'a.txt').write_bytes(uid.encode())
+
+    async def scenario():
+        store = BlobStore(tmp_path)
+        return await store.import_legacy(lambda uid: uid == '7'), store
+
+    imported, store = asyncio.run(scenario())
+    assert imported == 1
+    assert store.user_ids() == ['7']
+    assert (tmp_path / '8' / 'a.txt').exists() and not (tmp_path / '7').exists()
+
+
+def test_index_writes_are_coalesced_until_flush(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path, flush_delay=60)
+        writes = PERSIST_SECONDS.count('files')
+        for index in range(20):
+            _, digest = await store.add(1, f'{index}.txt', chunks(str(index).encode()))
+            await store.remember_file_id(digest, f'{index}.txt', f'F{index}')
+        assert PERSIST_SECONDS.count('files') == writes and not (tmp_path / 'index.json').exists()
+        await store.flush()
+        await store.flush()
+        return PERSIST_SECONDS.count('files') - writes
+
+    assert asyncio.run(scenario()) == 1
+    restarted = BlobStore(tmp_path)
+    assert restarted.count(1) == 20
+    assert restarted.file_id(restarted.digest(1, '7.txt'), '7.txt') == 'F7'
@@ -0,0 +1,48 @@
+import asyncio
+import os
+
+from content_filter import Automaton, CompiledBlocklist, ContentFilter
+
+BLOCKLIST = [
+    "# комментарий",
+    "url:https://discord.gg/Gy4xbacfES",
+    "domain:casino.example",
+    "https://t.me/spam_bot",
+    "Купи подписчиков",
+]
+
+
+def test_automaton_reports_overlapping_matches():
+    automaton = Automaton(["he", "she", "his", "hers"])
+    assert list(automaton.finditer("ushers")) == [(4, 'she'), (4, 'he'), (6, 'hers')]
+    assert automaton.search("xyz") is None
+
+
+def test_blocklist_normalizes_urls_and_text():
+    blocklist = CompiledBlocklist.from_lines(BLOCKLIST)
+    assert blocklist.size == 4
+    blocked = ["вот https://discord.gg/Gy4xbacfES!", "WWW.DISCORD.GG/gy4xbacfes/", "discord.gg/%47y4xbacfES",
+               "ｄｉｓｃｏｒｄ.ｇｇ/Gy4x​bacfES", "http://vip.casino.example:8080/x", "t.me/spam_bot?start=1",
+               "КУПИ   подписчиков тут"]
+    allowed = ["discord.gg/Gy4xbacfESX", "notcasino.example", "t.me/spam_bot2", "купи подписку", "discord.gg"]
+    assert [text for text in blocked if blocklist.match(text) is None] == []
+    assert [text for text in allowed if blocklist.match(text) is not None] == []
+    assert blocklist.match("заходи на casino.example") == 'casino.example'
+
+
+def test_filter_reloads_file_atomically(tmp_path):
+    path = tmp_path / 'blocklist.txt'
+    content_filter = ContentFilter(path, defaults=["url:discord.gg/Gy4xbacfES"])
+
+    async def scenario():
+        assert await content_filter.reload_if_changed() is False
+        assert content_filter.match("discord.gg/Gy4xbacfES")
+        path.write_text("domain:spam.example\n", encoding='utf-8')
+        assert await content_filter.reload_if_changed() is True
+        assert content_filter.match("spam.example/x") and not content_filter.match("discord.gg/Gy4xbacfES")
+        assert await content_filter.reload_if_changed() is False
+        os.remove(path)
+        assert await content_filter.reload_if_changed() is True
+        assert content_filter.match("discord.gg/Gy4xbacfES")
+
+    asyncio.run(scenario())
@@ -0,0 +1,44 @@
+from conversation_store import ConversationStore, estimate_tokens
+
+
+def _turn(i, size=40):
+    return ({'role': 'user', 'content': f'вопрос {i} ' + 'x' * size},
+            {'role': 'assistant', 'content': f'ответ {i} ' + 'y' * size})
+
+
+def test_session_is_trimmed_by_token_budget():
+    store = ConversationStore(session_token_budget=60)
+    for i in range(10):
+        store.append(1, *_turn(i))
+
+    history = store.get(1)
+    assert history[-1]['content'].startswith('ответ 9')
+    assert sum(estimate_tokens(m) for m in history) <= 60
+    assert store.total_tokens == sum(estimate_tokens(m) for m in history)
+
+
+def test_older_turns_fold_into_summary():
+    store = ConversationStore(session_token_budget=40, summarize=True, summary_token_budget=200)
+    for i in range(3):
+        store.append(1, *_turn(i))
+
+    history = store.get(1)
+    assert history[0]['role'] == 'system'
+    assert 'вопрос 0' in history[0]['content']
+    assert history[-1]['content'].startswith('ответ 2')
+
+
+def test_idle_sessions_expire_and_lru_bound_applies():
+    now = {'t': 0.0}
+    store = ConversationStore(max_sessions=2, ttl=100, clock=lambda: now['t'])
+    store.append(1, *_turn(1))
+    store.append(2, *_turn(2))
+    store.get(1)
+    store.append(3, *_turn(3))
+    assert 2 not in store
+    assert 1 in store and 3 in store
+
+    now['t'] = 150
+    assert store.get(1) == []
+    assert len(store) == 0
+    assert store.total_tokens == 0
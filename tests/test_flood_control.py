@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.types import CallbackQuery, User
+
+from flood_control import FloodControl, FloodControlMiddleware, parse_limits
+from metrics import Registry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_buckets_are_per_user_and_per_action():
+    clock = Clock()
+    control = FloodControl({'gpt': (6, 2), 'click': (60, 5)}, clock=clock)
+    assert control.check(1, 'gpt') == 0 and control.check(1, 'gpt') == 0
+    assert control.check(1, 'gpt') == pytest.approx(10.0)
+    assert control.check(1, 'click') == 0
+    assert control.check(2, 'gpt') == 0
+    clock.now = 10.0
+    assert control.check(1, 'gpt') == 0
+    assert parse_limits("gpt=12/4, upload=0")['gpt'] == (12.0, 4.0)
+    assert parse_limits("upload=0")['upload'] == (0.0, 1.0)
+    with pytest.raises(ValueError):
+        parse_limits("gpt=часто")
+
+
+def test_idle_users_are_evicted():
+    clock = Clock()
+    control = FloodControl({'click': (60, 1)}, idle_ttl=60, max_users=3, clock=clock)
+    for user_id in range(5):
+        control.check(user_id, 'click')
+    assert len(control) == 3
+    clock.now = 61
+    control.check(99, 'click')
+    assert len(control) == 1
+
+
+def test_middleware_drops_throttled_updates_and_notifies_once():
+    registry = Registry()
+    control = FloodControl({'gpt': (6, 1)}, clock=Clock())
+    middleware = FloodControlMiddleware(control, registry.counter('t', "t", ('action',)))
+    replies, handled = [], []
+
+    async def answer(text):
+        replies.append(text)
+
+    async def handler(event, data):
+        handled.append(event)
+
+    event = SimpleNamespace(answer=answer)
+    data = {'event_from_user': SimpleNamespace(id=7), 'handler': SimpleNamespace(flags={'throttle': 'gpt'})}
+    exempt = {'event_from_user': SimpleNamespace(id=7), 'handler': SimpleNamespace(flags={'throttle': None})}
+
+    async def scenario():
+        for _ in range(3):
+            await middleware(handler, event, data)
+        await middleware(handler, event, exempt)
+
+    asyncio.run(scenario())
+    assert len(handled) == 2
+    assert replies == ["Слишком часто. Повторите через 10 с."]
+    assert middleware.throttled.value('gpt') == 2
+
+
+def test_throttled_callback_is_always_answered(monkeypatch):
+    control = FloodControl({'click': (6, 1)}, clock=Clock())
+    middleware = FloodControlMiddleware(control, Registry().counter('t', "t", ('action',)))
+    answers, handled = [], []
+
+    async def answer(self, text=None, **kwargs):
+        answers.append(text)
+
+    async def handler(event, data):
+        handled.append(event)
+
+    monkeypatch.setattr(CallbackQuery, 'answer', answer)
+    user = User(id=7, is_bot=False, first_name='Анна')
+    event = CallbackQuery(id='1', from_user=user, chat_instance='c', data='files::0')
+    data = {'event_from_user': user, 'handler': SimpleNamespace(flags={})}
+
+    async def scenario():
+        for _ in range(3):
+            await middleware(handler, event, data)
+
+    asyncio.run(scenario())
+    assert len(handled) == 1
+    assert answers == ["Слишком часто. Повторите через 10 с.", None]
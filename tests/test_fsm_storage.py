@@ -0,0 +1,57 @@
+import asyncio
+from pathlib import Path
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from fsm_storage import SQLiteFSMStorage
+
+
+class Flow(StatesGroup):
+    name = State()
+
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+def test_state_survives_restart_and_is_shared(tmp_path: Path):
+    path = tmp_path / 'fsm.sqlite3'
+
+    async def scenario():
+        first = SQLiteFSMStorage(path, flush_interval=0.01)
+        other = SQLiteFSMStorage(path, cache_ttl=0)
+        await first.set_state(KEY, Flow.name)
+        await first.update_data(KEY, {'name': 'Анна'})
+        assert await first.get_state(KEY) == 'Flow:name'
+        await asyncio.sleep(0.05)
+        seen = await other.get_state(KEY), await other.get_data(KEY)
+        await first.close()
+        await other.close()
+
+        restarted = SQLiteFSMStorage(path)
+        restored = await restarted.get_state(KEY), await restarted.get_data(KEY)
+        await restarted.set_state(KEY, None)
+        await restarted.set_data(KEY, {})
+        await restarted.close()
+        return seen, restored
+
+    seen, restored = asyncio.run(scenario())
+    assert seen == ('Flow:name', {'name': 'Анна'})
+    assert restored == ('Flow:name', {'name': 'Анна'})
+
+
+def test_abandoned_states_expire(tmp_path: Path):
+    now = {'t': 1000.0}
+    path = tmp_path / 'fsm.sqlite3'
+
+    async def scenario():
+        store = SQLiteFSMStorage(path, state_ttl=60, cache_ttl=0, clock=lambda: now['t'])
+        await store.set_state(KEY, 'Flow:name')
+        await store.flush()
+        now['t'] += 61
+        expired = await store.get_state(KEY)
+        removed = await store.sweep_expired()
+        await store.close()
+        return expired, removed
+
+    assert asyncio.run(scenario()) == (None, 1)
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from gpt_pool import FairRequestPool
+
+
+def test_waiters_are_served_round_robin_across_users():
+    order = []
+
+    async def scenario():
+        pool = FairRequestPool(concurrency=1, per_user_limit=1)
+        gate = asyncio.Event()
+
+        async def request(user_id, tag):
+            async with pool.slot(user_id):
+                order.append(tag)
+                await gate.wait()
+
+        first = asyncio.create_task(request('busy', 'busy-0'))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(request('busy', f'busy-{i}')) for i in range(1, 4)]
+        tasks.append(asyncio.create_task(request('quiet', 'quiet-1')))
+        await asyncio.sleep(0)
+        assert pool.queue_depth == 4
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert order[:3] == ['busy-0', 'busy-1', 'quiet-1']
+    assert stats['granted'] == 5
+    assert stats['queue_depth'] == 0
+    assert stats['in_flight'] == 0
+
+
+def test_per_user_cap_limits_in_flight_requests():
+    peak = {'value': 0}
+
+    async def scenario():
+        pool = FairRequestPool(concurrency=4, per_user_limit=2)
+
+        async def request():
+            async with pool.slot('user'):
+                peak['value'] = max(peak['value'], pool.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak['value'] == 2
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        pool = FairRequestPool(concurrency=1)
+        await pool.acquire('a')
+        waiter = asyncio.create_task(pool.acquire('b'))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert pool.queue_depth == 0
+        pool.release('a')
+        assert pool.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_capped_user_in_queue_does_not_block_other_users():
+    async def scenario():
+        pool = FairRequestPool(concurrency=4, per_user_limit=1)
+        await pool.acquire('a')
+        held = asyncio.create_task(pool.acquire('a'))
+        await asyncio.sleep(0)
+        assert pool.queue_depth == 1
+        waited = await asyncio.wait_for(pool.acquire('b'), 1)
+        assert pool.in_flight == 2 and pool.queue_depth == 1 and not held.done()
+        pool.release('a')
+        await held
+        pool.release('a')
+        pool.release('b')
+        return waited, pool.stats()
+
+    waited, stats = asyncio.run(scenario())
+    assert waited < 0.1
+    assert stats['in_flight'] == 0 and stats['queue_depth'] == 0
@@ -0,0 +1,46 @@
+import asyncio
+
+from gpt_stream import ThrottledEditor
+
+
+def test_edits_are_throttled_and_final_text_always_lands():
+    edits = []
+    now = {'t': 0.0}
+
+    async def edit(text, **kwargs):
+        edits.append((text, kwargs))
+
+    async def scenario():
+        editor = ThrottledEditor(edit, interval=1.0, clock=lambda: now['t'])
+        editor.update('При')
+        await asyncio.sleep(0)
+        for text in ('Приве', 'Привет', 'Привет,'):
+            now['t'] += 0.3
+            editor.update(text)
+            await asyncio.sleep(0)
+        now['t'] += 0.5
+        editor.update('Привет, мир')
+        await asyncio.sleep(0)
+        await editor.finish('Привет, мир!', reply_markup='kb')
+
+    asyncio.run(scenario())
+    assert edits == [('При', {}), ('Привет, мир', {}), ('Привет, мир!', {'reply_markup': 'kb'})]
+
+
+def test_failed_intermediate_edit_does_not_break_finish():
+    calls = []
+
+    async def edit(text, **kwargs):
+        calls.append(text)
+        if len(calls) == 1:
+            raise RuntimeError('Too Many Requests')
+
+    async def scenario():
+        editor = ThrottledEditor(edit, interval=0)
+        editor.update('частично')
+        await asyncio.sleep(0)
+        await editor.finish('готово')
+        return editor.edits
+
+    assert asyncio.run(scenario()) == 1
+    assert calls == ['частично', 'готово']
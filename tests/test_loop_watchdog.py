@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from loop_watchdog import LoopWatchdog, SamplingProfiler
+
+
+def blocking_handler():
+    time.sleep(0.3)
+
+
+def test_watchdog_names_blocking_handler():
+    stalls = []
+
+    async def scenario():
+        watchdog = LoopWatchdog(threshold=0.1, interval=0.02, handlers=[blocking_handler.__code__],
+                                on_stall=lambda stalled, handler, stack: stalls.append((stalled, handler, stack)))
+        watchdog.start()
+        await asyncio.sleep(0.05)
+        blocking_handler()
+        await asyncio.sleep(0.05)
+        await watchdog.stop()
+        return watchdog
+
+    watchdog = asyncio.run(scenario())
+    assert watchdog.stalls == 1
+    stalled, handler, stack = stalls[0]
+    assert stalled >= 0.1
+    assert handler == 'blocking_handler'
+    assert any(frame.name == 'blocking_handler' for frame in stack)
+
+
+def test_profiler_dumps_collapsed_stacks(tmp_path):
+    async def scenario():
+        profiler = SamplingProfiler(interval=0.005)
+        profiler.start()
+        blocking_handler()
+        await asyncio.sleep(0.1)
+        profiler.stop()
+        return profiler
+
+    profiler = asyncio.run(scenario())
+    path = tmp_path / 'profile.txt'
+    total = profiler.dump(path)
+    lines = path.read_text(encoding='utf-8').splitlines()
+    assert total == sum(int(line.rsplit(' ', 1)[1]) for line in lines)
+    assert any('blocking_handler (test_loop_watchdog.py:' in line for line in lines)
+    assert not any('select (selectors.py' in line for line in lines)
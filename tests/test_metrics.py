@@ -0,0 +1,49 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import MetricsMiddleware, Registry
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    latency = registry.histogram('demo_seconds', "Задержка", ('handler',), buckets=(0.1, 1.0))
+    errors = registry.counter('demo_errors_total', "Ошибки", ('kind',))
+    registry.gauge('demo_depth', "Глубина", collect=lambda: {(): 3})
+    latency.observe(0.05, 'start')
+    latency.observe(0.5, 'start')
+    latency.observe(5, 'start')
+    errors.inc('bad "quote"')
+
+    text = asyncio.run(registry.render())
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{handler="start",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{handler="start",le="1"} 2' in text
+    assert 'demo_seconds_bucket{handler="start",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{handler="start"} 3' in text
+    assert 'demo_errors_total{kind="bad \\"quote\\""} 1' in text
+    assert 'demo_depth 3' in text
+    assert registry.counter('demo_errors_total', "Ошибки") is errors
+
+
+def test_middleware_records_latency_and_errors_per_handler():
+    registry = Registry()
+    middleware = MetricsMiddleware(registry.histogram('h', "h", ('handler',)),
+                                   registry.counter('e', "e", ('handler', 'error')))
+
+    async def send_welcome():
+        pass
+
+    async def ok(event, data):
+        return 'done'
+
+    async def boom(event, data):
+        raise RuntimeError("сбой")
+
+    data = {'handler': SimpleNamespace(callback=send_welcome)}
+    assert asyncio.run(middleware(ok, None, data)) == 'done'
+    with pytest.raises(RuntimeError):
+        asyncio.run(middleware(boom, None, data))
+    assert middleware.latency.count('send_welcome') == 2
+    assert middleware.errors.value('send_welcome', 'RuntimeError') == 1
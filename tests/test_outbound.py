@@ -0,0 +1,67 @@
+import asyncio
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from outbound import DeliveryQueue, RateLimitMiddleware, SendRateLimiter
+
+
+def test_limiter_enforces_global_and_per_chat_rates():
+    now = {'t': 0.0}
+    limiter = SendRateLimiter(global_rate=2, per_chat_rate=1, per_chat_burst=1, clock=lambda: now['t'])
+
+    assert limiter.reserve(1) == 0
+    assert limiter.reserve(1) == 1.0
+    assert limiter.reserve(2) == 0
+    assert limiter.reserve(3) > 0
+    now['t'] = 1.0
+    assert limiter.reserve(1) == 0
+
+    limiter.block(5)
+    assert limiter.reserve(4) == 5.0
+
+
+def test_middleware_honors_retry_after():
+    method = SendMessage(chat_id=1, text='hi')
+    calls = []
+
+    async def make_request(bot, m):
+        calls.append(m)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=m, message='Too Many Requests', retry_after=0)
+        return 'ok'
+
+    middleware = RateLimitMiddleware(SendRateLimiter())
+    assert asyncio.run(middleware(make_request, None, method)) == 'ok'
+    assert len(calls) == 2
+
+
+def test_delivery_queue_coalesces_and_retries():
+    sent = []
+    done = []
+    method = SendMessage(chat_id=1, text='hi')
+
+    async def send(chat_id, text):
+        sent.append((chat_id, text))
+        if chat_id == 1 and len(sent) == 1:
+            raise TelegramRetryAfter(method=method, message='Too Many Requests', retry_after=1)
+        if chat_id == 2:
+            raise TelegramForbiddenError(method=method, message='bot was blocked by the user')
+
+    async def on_done(tokens, error):
+        done.append((tokens, error is None))
+
+    async def scenario():
+        queue = DeliveryQueue(send, on_done, workers=1, retry_delay=0.01)
+        queue.put(1, 'первое', 'a')
+        queue.put(1, 'второе', 'b')
+        queue.put(2, 'третье', 'c')
+        runner = asyncio.create_task(queue.run())
+        await asyncio.sleep(0.1)
+        runner.cancel()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert sent == [(1, 'первое\nвторое'), (2, 'третье'), (1, 'первое\nвторое')]
+    assert done == [(['c'], False), (['a', 'b'], True)]
+    assert (queue.delivered, queue.retried, queue.failed) == (1, 1, 1)
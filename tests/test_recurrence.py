@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+import pytz
+
+from recurrence import RecurrenceError, describe_rule, next_occurrence, parse_rule
+
+almaty = pytz.timezone('Asia/Almaty')
+berlin = pytz.timezone('Europe/Berlin')
+
+
+def local(tz, *args):
+    return tz.localize(datetime(*args))
+
+
+def test_parse_rules_from_first_occurrence():
+    first = local(almaty, 2025, 3, 12, 9, 30)
+    assert parse_rule("ежедневно", first) == 'daily 09:30'
+    assert parse_rule("еженедельно пн, пт", first) == 'weekly 1,5 09:30'
+    assert parse_rule("weekly", first) == 'weekly 3 09:30'
+    assert parse_rule("Ежемесячно", first) == 'monthly 12 09:30'
+    assert parse_rule("cron */15 9-18 * * 1-5", first) == 'cron */15 9-18 * * 1-5'
+    assert describe_rule('weekly 1,5 09:30') == "по пн,пт в 09:30"
+    for bad in ("иногда", "еженедельно пх", "cron 61 * * * *", "cron * * *"):
+        with pytest.raises(RecurrenceError):
+            parse_rule(bad, first)
+
+
+def test_next_occurrence_for_each_kind():
+    after = local(almaty, 2025, 1, 31, 9, 30)
+    assert next_occurrence('daily 09:30', after, almaty) == local(almaty, 2025, 2, 1, 9, 30)
+    assert next_occurrence('weekly 1,5 09:30', after, almaty) == local(almaty, 2025, 2, 3, 9, 30)
+    assert next_occurrence('monthly 31 09:30', after, almaty) == local(almaty, 2025, 2, 28, 9, 30)
+    assert next_occurrence('monthly 31 09:30', local(almaty, 2025, 2, 28, 9, 30), almaty) == \
+        local(almaty, 2025, 3, 31, 9, 30)
+    assert next_occurrence('cron 0 12 13 * 5', after, almaty) == local(almaty, 2025, 1, 31, 12, 0)
+    assert next_occurrence('cron 0 12 13 * 5', local(almaty, 2025, 2, 7, 12, 0), almaty) == \
+        local(almaty, 2025, 2, 13, 12, 0)
+    assert next_occurrence('cron */20 9 * * *', after, almaty) == local(almaty, 2025, 1, 31, 9, 40)
+    with pytest.raises(RecurrenceError):
+        next_occurrence('cron 0 0 30 2 *', after, almaty)
+
+
+def test_wall_clock_survives_dst_transitions():
+    before_spring = local(berlin, 2025, 3, 29, 2, 30)
+    skipped = next_occurrence('daily 02:30', before_spring, berlin)
+    assert skipped.strftime('%Y-%m-%d %H:%M %Z') == '2025-03-30 03:30 CEST'
+    after_spring = next_occurrence('daily 02:30', skipped, berlin)
+    assert after_spring.strftime('%Y-%m-%d %H:%M %Z') == '2025-03-31 02:30 CEST'
+    autumn = next_occurrence('daily 09:00', local(berlin, 2025, 10, 25, 9, 0), berlin)
+    assert autumn.strftime('%Y-%m-%d %H:%M %Z') == '2025-10-26 09:00 CET'
+    assert (autumn - local(berlin, 2025, 10, 25, 9, 0)).total_seconds() == 25 * 3600
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from response_cache import ResponseCache, make_cache_key
+
+
+def _messages(text):
+    return [{'role': 'user', 'content': text}]
+
+
+def test_key_normalizes_whitespace_and_case():
+    key = make_cache_key(_messages('Что  такое\nAIO? '), 'gpt-4o-mini', 0.7)
+    assert key == make_cache_key(_messages('что такое aio?'), 'gpt-4o-mini', 0.7)
+    assert key != make_cache_key(_messages('что такое aio?'), 'gpt-4o-mini', 0.2)
+    assert key != make_cache_key(_messages('что такое aio?'), 'gpt-4o', 0.7)
+
+
+def test_lru_eviction_ttl_and_counters():
+    now = {'t': 0.0}
+    cache = ResponseCache(max_entries=2, ttl=10, clock=lambda: now['t'])
+    cache.put('a', 'ответ a')
+    cache.put('b', 'ответ b')
+    assert cache.get('a') == 'ответ a'
+    cache.put('c', 'ответ c')
+    assert cache.get('b') is None
+
+    now['t'] = 11
+    assert cache.get('a') is None
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 2, 'hit_ratio': 1 / 3}
+
+
+def test_entries_survive_restart(tmp_path: Path):
+    path = str(tmp_path / 'gpt_cache.json')
+    cache = ResponseCache(path=path)
+    cache.put('a', 'ответ a')
+    cache.save()
+
+    assert ResponseCache(path=path).get('a') == 'ответ a'
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from scheduler import ReminderScheduler
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def test_pop_due_returns_batch_in_due_order():
+    base = _now()
+    scheduler = ReminderScheduler(_now)
+    scheduler.schedule('late', base + timedelta(minutes=5))
+    scheduler.schedule('b', base)
+    scheduler.schedule('a', base - timedelta(minutes=1))
+
+    assert scheduler.pop_due(base) == ['a', 'b']
+    assert len(scheduler) == 1
+    assert scheduler.next_due() == base + timedelta(minutes=5)
+
+
+def test_cancel_and_reschedule():
+    base = _now()
+    scheduler = ReminderScheduler(_now)
+    scheduler.schedule('a', base)
+    scheduler.schedule('b', base)
+    assert scheduler.cancel('a')
+    assert not scheduler.cancel('a')
+    scheduler.schedule('b', base + timedelta(hours=1))
+
+    assert scheduler.pop_due(base) == []
+    assert 'b' in scheduler
+
+
+def test_run_wakes_early_for_new_task():
+    fired = []
+
+    async def scenario():
+        scheduler = ReminderScheduler(_now)
+        scheduler.schedule('far', _now() + timedelta(hours=1))
+
+        async def fire(batch):
+            fired.append(batch)
+
+        runner = asyncio.create_task(scheduler.run(fire))
+        await asyncio.sleep(0.01)
+        scheduler.schedule('soon', _now() + timedelta(milliseconds=20))
+        await asyncio.sleep(0.2)
+        runner.cancel()
+
+    asyncio.run(scenario())
+    assert fired == [['soon']]
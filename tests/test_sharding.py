@@ -0,0 +1,102 @@
+import asyncio
+from pathlib import Path
+
+from blob_store import BlobStore
+from sharding import HashRing, rebalance, shard_path, update_user_id
+from storage import JsonStorage
+from task_journal import add_entry
+
+
+def test_ring_is_balanced_and_moves_few_keys_on_resize():
+    four, five = HashRing(4), HashRing(5)
+    owners = [four.owner(uid) for uid in range(20000)]
+    counts = [owners.count(node) for node in range(4)]
+    assert min(counts) > 20000 / 4 * 0.8
+
+    moved = sum(1 for uid in range(20000) if four.owner(uid) != five.owner(uid))
+    assert moved < 20000 * 0.3
+    assert all(five.owner(uid) in (four.owner(uid), 4) for uid in range(20000))
+
+
+def test_update_routing_helpers():
+    assert update_user_id({'update_id': 1, 'message': {'from': {'id': 7}, 'chat': {'id': 8}}}) == 7
+    assert update_user_id({'update_id': 2, 'callback_query': {'from': {'id': 9}}}) == 9
+    assert update_user_id({'update_id': 3, 'channel_post': {'chat': {'id': -100}}}) == -100
+    assert update_user_id({'update_id': 4}) is None
+    assert shard_path('tasks_data.json', 2, 4) == 'tasks_data.shard2.json'
+    assert shard_path('tasks_data.json', 0, 1) == 'tasks_data.json'
+
+
+def test_rebalance_moves_users_and_tasks_to_new_owners(tmp_path: Path):
+    def open_storage(index, count):
+        return JsonStorage(shard_path(str(tmp_path / 'users.json'), index, count),
+                           shard_path(str(tmp_path / 'tasks.json'), index, count))
+
+    task = {'id': 't1', 'name': 'Задача', 'date_iso': '2030-01-01T10:00:00+05:00'}
+
+    async def scenario():
+        single = open_storage(0, 1)
+        await single.load_tasks()
+        for uid in range(1, 21):
+            await single.put_user(uid, {'name': f'user {uid}'})
+        await single.save_task_changes([add_entry(5, task)])
+        await single.close()
+
+        moved = await rebalance(1, 3, open_storage)
+        ring = HashRing(3)
+        placed = {}
+        for index in range(3):
+            shard = open_storage(index, 3)
+            for uid in await shard.all_users():
+                placed[uid] = index
+            tasks = await shard.load_tasks()
+            if tasks:
+                placed['task'] = (index, list(tasks))
+            await shard.close()
+        return moved, ring, placed
+
+    moved, ring, placed = asyncio.run(scenario())
+    assert moved == 20
+    assert all(placed[str(uid)] == ring.owner(str(uid)) for uid in range(1, 21))
+    assert placed['task'] == (ring.owner('5'), ['5'])
+
+
+def test_rebalance_moves_file_index_entries_and_blobs(tmp_path: Path):
+    def open_storage(index, count):
+        return JsonStorage(shard_path(str(tmp_path / 'users.json'), index, count),
+                           shard_path(str(tmp_path / 'tasks.json'), index, count))
+
+    def open_files(index, count):
+        return BlobStore(tmp_path / 'files', index_path=shard_path(str(tmp_path / 'files' / 'index.json'), index, count),
+                         blobs_dir=shard_path(str(tmp_path / 'files' / '.blobs'), index, count))
+
+    async def chunks(payload):
+        yield payload
+
+    async def scenario():
+        single = open_files(0, 1)
+        for uid in range(1, 7):
+            _, digest = await single.add(uid, 'report.txt', chunks(f'report {uid}'.encode()))
+            await single.remember_file_id(digest, 'report.txt', f'F{uid}')
+        await single.add(1, 'shared.txt', chunks(b'shared'))
+        await single.add(2, 'shared.txt', chunks(b'shared'))
+        await single.flush()
+
+        await rebalance(1, 3, open_storage, open_files)
+        ring = HashRing(3)
+        placed = {}
+        for uid in range(1, 7):
+            shard = open_files(ring.owner(str(uid)), 3)
+            digest = shard.digest(uid, 'report.txt')
+            placed[uid] = (shard.path(uid, 'report.txt').read_bytes(), shard.file_id(digest, 'report.txt'),
+                           shard.usage(uid))
+        shared = open_files(ring.owner('2'), 3)
+        return placed, shared.path(2, 'shared.txt').read_bytes(), open_files(0, 1)
+
+    placed, shared, source = asyncio.run(scenario())
+    assert placed == {uid: (f'report {uid}'.encode(), f'F{uid}', len(f'report {uid}') + (6 if uid <= 2 else 0))
+                      for uid in range(1, 7)}
+    assert shared == b'shared'
+    assert source.user_ids() == []
+    blobs = tmp_path / 'files' / '.blobs'
+    assert not [path for path in blobs.rglob('*') if path.is_file() and path.relative_to(blobs).parts[0] != 'tmp']
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from storage import JsonStorage, SqliteStorage, migrate_json_to_sqlite
+from task_journal import add_entry, remove_entry
+
+
+def _task(task_id, date_iso):
+    return {'id': task_id, 'name': f'Задача {task_id}', 'date_iso': date_iso}
+
+
+def _make_storage(kind, tmp_path: Path):
+    if kind == 'json':
+        return JsonStorage(tmp_path / 'users.json', tmp_path / 'tasks.json')
+    return SqliteStorage(tmp_path / 'aio.sqlite3')
+
+
+@pytest.mark.parametrize('kind', ['json', 'sqlite'])
+def test_storage_contract(kind, tmp_path: Path):
+    async def scenario():
+        store = _make_storage(kind, tmp_path)
+        await store.load_tasks()
+        await store.put_user(1, {'name': 'Анна', 'phone': '-'})
+        assert await store.update_user(1, phone='+77001234567')
+        assert not await store.update_user(2, phone='+77001234567')
+        assert await store.user_exists('1')
+
+        await store.save_task_changes([
+            add_entry(1, _task('a', '2030-01-01T10:00:00+05:00')),
+            add_entry(1, _task('b', '2030-06-01T10:00:00+05:00')),
+            add_entry(2, _task('c', '2029-01-01T10:00:00+05:00')),
+        ])
+        await store.save_task_changes([remove_entry(2, 'c', op='fire')])
+        due = await store.tasks_due_before(datetime.fromisoformat('2030-02-01T00:00:00+05:00'))
+        user = await store.get_user(1)
+        await store.close()
+        return user, due
+
+    user, due = asyncio.run(scenario())
+    assert user == {'name': 'Анна', 'phone': '+77001234567'}
+    assert due == [('1', _task('a', '2030-01-01T10:00:00+05:00'))]
+
+    async def reload():
+        store = _make_storage(kind, tmp_path)
+        tasks = await store.load_tasks()
+        await store.close()
+        return tasks
+
+    assert {uid: sorted(t['id'] for t in records) for uid, records in asyncio.run(reload()).items()} == {'1': ['a', 'b']}
+
+
+def test_migrate_json_to_sqlite(tmp_path: Path):
+    users_path = tmp_path / 'users.json'
+    tasks_path = tmp_path / 'tasks.json'
+    users_path.write_text(json.dumps({'1': {'name': 'Анна'}}), encoding='utf-8')
+    tasks_path.write_text(json.dumps({'1': [{'name': 'Старая', 'date_iso': '2030-01-01T10:00:00+05:00'}]}),
+                          encoding='utf-8')
+
+    counts = asyncio.run(migrate_json_to_sqlite(users_path, tasks_path, tmp_path / 'aio.sqlite3'))
+    assert counts == (1, 1)
+
+    async def check():
+        store = SqliteStorage(tmp_path / 'aio.sqlite3')
+        user = await store.get_user(1)
+        tasks = await store.load_tasks()
+        await store.close()
+        return user, tasks
+
+    user, tasks = asyncio.run(check())
+    assert user == {'name': 'Анна'}
+    assert tasks['1'][0]['name'] == 'Старая'
+    assert tasks['1'][0]['id']
+
+
+def test_shutdown_snapshot_folds_journal_only_after_tasks_loaded(tmp_path: Path):
+    journal_path = tmp_path / 'tasks.json.journal'
+
+    async def scenario():
+        store = JsonStorage(tmp_path / 'users.json', tmp_path / 'tasks.json')
+        await store.load_tasks()
+        await store.save_task_changes([add_entry(1, _task('a', '2030-01-01T10:00:00+05:00'))])
+        await store.close()
+        cold = JsonStorage(tmp_path / 'users.json', tmp_path / 'tasks.json')
+        await cold.snapshot()
+        await cold.close()
+        assert journal_path.exists() and not (tmp_path / 'tasks.json').exists()
+        warm = JsonStorage(tmp_path / 'users.json', tmp_path / 'tasks.json')
+        await warm.warm_up()
+        await warm.load_tasks()
+        await warm.snapshot()
+        await warm.close()
+
+    asyncio.run(scenario())
+    assert not journal_path.exists()
+    snapshot = json.loads((tmp_path / 'tasks.json').read_text(encoding='utf-8'))
+    assert snapshot['seq'] == 1 and [t['id'] for t in snapshot['tasks']['1']] == ['a']
+
+
+def test_profile_reads_wait_for_one_background_load(tmp_path: Path, monkeypatch):
+    (tmp_path / 'users.json').write_text(json.dumps({'1': {'name': 'Анна'}}), encoding='utf-8')
+    store = JsonStorage(tmp_path / 'users.json', tmp_path / 'tasks.json')
+    reads = []
+    read = store.users._read
+
+    def tracked_read():
+        reads.append(threading.current_thread() is threading.main_thread())
+        return read()
+
+    monkeypatch.setattr(store.users, '_read', tracked_read)
+
+    async def scenario():
+        return await asyncio.gather(store.warm_up(), store.get_user(1), store.user_exists(2))
+
+    assert asyncio.run(scenario()) == [None, {'name': 'Анна'}, False]
+    assert reads == [False]
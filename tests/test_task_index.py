@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from task_index import TaskIndex
+
+tz = pytz.timezone('Asia/Almaty')
+BASE = tz.localize(datetime(2025, 3, 10, 9, 0))
+
+
+def task(task_id, hours):
+    return {'id': task_id, 'name': f'Задача {task_id}', 'date': BASE + timedelta(hours=hours)}
+
+
+def test_tasks_stay_sorted_by_date_then_id():
+    index = TaskIndex([task('c', 5), task('b', 1), task('a', 5), task('d', -2)])
+    assert [t['id'] for t in index] == ['d', 'b', 'a', 'c']
+    index.add(task('b', 10))
+    assert [t['id'] for t in index] == ['d', 'a', 'c', 'b']
+    assert len(index) == 4 and 'b' in index
+
+
+def test_remove_by_id_is_stable():
+    index = TaskIndex([task('a', 1), task('b', 1), task('c', 2)])
+    assert index.remove('b')['id'] == 'b'
+    assert index.remove('b') is None
+    assert [t['id'] for t in index] == ['a', 'c']
+    assert index.get('c')['date'] == BASE + timedelta(hours=2)
+
+
+def test_range_queries_and_pages():
+    index = TaskIndex(task(str(n).zfill(3), n) for n in range(48))
+    day_end = BASE + timedelta(hours=15)
+    assert index.count(BASE, day_end) == 15
+    assert [t['id'] for t in index.between(BASE, day_end, offset=10, limit=10)] == ['010', '011', '012', '013', '014']
+    assert [t['id'] for t in index.upcoming(BASE + timedelta(minutes=30), 2)] == ['001', '002']
+    assert index.between(BASE, day_end, offset=20) == []
+    assert index.count(day_end, BASE) == 0
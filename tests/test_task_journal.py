@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+
+from task_journal import TaskJournal, add_entry, remove_entry
+
+
+def _task(task_id, name='Задача'):
+    return {'id': task_id, 'name': name, 'date_iso': '2030-01-01T10:00:00+05:00'}
+
+
+def test_journal_replays_after_restart(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    journal = TaskJournal(snapshot)
+    journal.load()
+    journal.append([add_entry(1, _task('a')), add_entry(1, _task('b')), add_entry(2, _task('c'))])
+    journal.append([remove_entry(1, 'a'), remove_entry(2, 'c', op='fire')])
+    journal.close()
+
+    assert TaskJournal(snapshot).load() == {'1': [_task('b')]}
+
+
+def test_repeated_add_replaces_task(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    journal = TaskJournal(snapshot)
+    journal.load()
+    moved = dict(_task('a'), date_iso='2030-01-02T10:00:00+05:00', rule='daily 10:00')
+    journal.append([add_entry(1, _task('a')), add_entry(1, _task('b')), add_entry(1, moved)])
+    journal.close()
+
+    assert TaskJournal(snapshot).load() == {'1': [_task('b'), moved]}
+
+
+def test_compaction_writes_snapshot_and_keeps_tail(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    journal = TaskJournal(snapshot, compact_every=2)
+    journal.load()
+    journal.append([add_entry(1, _task('a')), add_entry(1, _task('b'))])
+    assert journal.needs_compaction()
+    seq = journal.rotate()
+    journal.append([remove_entry(1, 'a')])
+    journal.write_snapshot({'1': [_task('a'), _task('b')]}, seq)
+    journal.close()
+
+    assert json.loads(snapshot.read_text(encoding='utf-8'))['seq'] == 2
+    assert TaskJournal(snapshot).load() == {'1': [_task('b')]}
+
+
+def test_legacy_snapshot_and_torn_tail(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    snapshot.write_text(json.dumps({'1': [_task('a')]}), encoding='utf-8')
+    journal_path = Path(str(snapshot) + '.journal')
+    journal_path.write_text(json.dumps(dict(add_entry(1, _task('b')), seq=1)) + '\n{"op": "ad',
+                            encoding='utf-8')
+
+    assert TaskJournal(snapshot).load() == {'1': [_task('a'), _task('b')]}
+
+
+def test_append_after_torn_tail_survives_reload(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    journal_path = Path(str(snapshot) + '.journal')
+    journal_path.write_text(json.dumps(dict(add_entry(1, _task('a')), seq=1)) + '\n{"op": "ad',
+                            encoding='utf-8')
+
+    journal = TaskJournal(snapshot)
+    assert journal.load() == {'1': [_task('a')]}
+    journal.append([add_entry(1, _task('b'))])
+    journal.close()
+
+    assert TaskJournal(snapshot).load() == {'1': [_task('a'), _task('b')]}
+    assert journal_path.read_text(encoding='utf-8').endswith('\n')
+
+
+def test_long_runs_of_adds_replay_with_updates_and_removals(tmp_path: Path):
+    snapshot = tmp_path / 'tasks.json'
+    journal = TaskJournal(snapshot, compact_every=10 ** 9)
+    journal.load()
+    journal.append(add_entry(1, _task(str(index))) for index in range(20000))
+    journal.append([add_entry(1, _task('5', 'Новое имя')), remove_entry(1, '7')])
+    journal.close()
+
+    tasks = TaskJournal(snapshot).load()
+    assert len(tasks['1']) == 19999
+    assert tasks['1'][-1] == _task('5', 'Новое имя')
@@ -0,0 +1,69 @@
+import asyncio
+from datetime import datetime
+
+import pytz
+
+from task_transfer import TaskExportFile, import_task_stream
+
+tz = pytz.timezone('Asia/Almaty')
+NOW = tz.localize(datetime(2025, 3, 1, 12, 0))
+
+
+async def chunked(data: bytes, size: int = 7):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+def run_import(data: bytes, kind: str, batch_size: int = 500, chunk_size: int = 7):
+    batches = []
+    report = asyncio.run(import_task_stream(chunked(data, chunk_size), kind, tz, NOW, batches.append, batch_size))
+    return report, [row for batch in batches for row in batch], batches
+
+
+def test_csv_import_validates_rows():
+    data = ('﻿Название;Дата;Повтор\n'
+            'Отчёт;2025-03-02 09:30;\n'
+            '"Созвон; ""важный""\nс командой";2025-03-03 10:00;еженедельно пн\n'
+            'Прошлое;2025-02-01 10:00;\n'
+            ';2025-03-05 10:00;\n'
+            'Кривое;завтра;\n').encode('utf-8')
+    report, rows, _ = run_import(data, 'csv')
+    assert report.imported == 2 and report.skipped == 3
+    assert rows[0] == ('Отчёт', tz.localize(datetime(2025, 3, 2, 9, 30)), None, None)
+    assert rows[1][0] == 'Созвон; "важный"\nс командой'
+    assert rows[1][1:3] == (tz.localize(datetime(2025, 3, 3, 10, 0)), 'weekly 1 10:00')
+    assert report.errors[0] == "строка 5: время уже прошло"
+    assert report.errors[2] == "строка 7: неверная дата «завтра»"
+
+
+def test_ics_import_handles_folding_timezones_and_rrule():
+    data = ('BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nUID:abc@example.com\r\n'
+            'SUMMARY:Длинное назв\r\n ание\\, с запятой\r\n'
+            'DTSTART;TZID=Europe/Moscow:20250305T090000\r\nRRULE:FREQ=WEEKLY;BYDAY=MO,FR\r\nEND:VEVENT\r\n'
+            'BEGIN:VEVENT\r\nSUMMARY:UTC\r\nDTSTART:20250306T040000Z\r\nEND:VEVENT\r\n'
+            'BEGIN:VEVENT\r\nSUMMARY:Счёт\r\nDTSTART:20250307T100000\r\nRRULE:FREQ=DAILY;COUNT=3\r\nEND:VEVENT\r\n'
+            'END:VCALENDAR\r\n').encode('utf-8')
+    report, rows, _ = run_import(data, 'ics')
+    assert report.imported == 2 and report.skipped == 1
+    name, due, rule, task_id = rows[0]
+    assert name == 'Длинное название, с запятой'
+    assert rule == 'weekly 1,5 11:00' and due == tz.localize(datetime(2025, 3, 7, 11, 0))
+    assert len(task_id) == 12
+    assert rows[1][1] == tz.localize(datetime(2025, 3, 6, 9, 0))
+    assert 'COUNT' in report.errors[0]
+
+
+def test_export_round_trips_through_import_in_batches():
+    tasks = [{'id': f'{n:012x}', 'name': f'Задача {n}, «важная»', 'date': tz.localize(datetime(2025, 4, 1, 9, 0)),
+              'rule': 'cron 0 9 * * 1-5' if n % 3 == 0 else None} for n in range(4000)]
+
+    async def export(kind):
+        return b''.join([chunk async for chunk in TaskExportFile(tasks, kind, tz).read(None)])
+
+    for kind in ('csv', 'ics'):
+        report, rows, batches = run_import(asyncio.run(export(kind)), kind, batch_size=1000, chunk_size=65536)
+        assert report.imported == 4000 and report.skipped == 0
+        assert len(batches) == 4
+        assert rows[3] == ('Задача 3, «важная»', tz.localize(datetime(2025, 4, 1, 9, 0)), 'cron 0 9 * * 1-5',
+                           '000000000003')
+        assert rows[4][2] is None and rows[4][3] == '000000000004'
@@ -0,0 +1,85 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from blob_store import BlobStore
+from upload_pipeline import ByteRateLimiter, QuotaExceeded, UploadPipeline
+
+
+def make_source(data: bytes, running: list, peak: list, chunk: int = 4):
+    async def chunks():
+        running.append(1)
+        peak.append(len(running))
+        try:
+            for start in range(0, len(data), chunk):
+                await asyncio.sleep(0.01)
+                yield data[start:start + chunk]
+        finally:
+            running.pop()
+
+    async def source():
+        return chunks()
+
+    return source
+
+
+def test_workers_bound_concurrency_and_report_queue_positions(tmp_path: Path):
+    running, peak, progress = [], [], []
+
+    async def scenario():
+        pipeline = UploadPipeline(BlobStore(tmp_path), workers=2)
+        runner = asyncio.create_task(pipeline.run())
+        jobs = []
+        for index in range(5):
+            data = f'file-{index}'.encode() * 3
+            jobs.append(await pipeline.submit(1, f'{index}.txt', len(data), make_source(data, running, peak),
+                                              on_progress=lambda done, total: progress.append((done, total))))
+            await asyncio.sleep(0)
+        results = await asyncio.gather(*(job.done for job in jobs))
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return pipeline, jobs, results
+
+    pipeline, jobs, results = asyncio.run(scenario())
+    assert max(peak) == 2
+    assert [job.position for job in jobs] == [0, 0, 1, 2, 3]
+    assert [name for name, _ in results] == ['0.txt', '1.txt', '2.txt', '3.txt', '4.txt']
+    assert pipeline.completed == 5
+    assert progress[-1][0] == progress[-1][1]
+    assert pipeline.usage(1) == sum(len(f'file-{index}'.encode() * 3) for index in range(5))
+
+
+def test_quota_counts_queued_uploads_and_known_files_skip_download(tmp_path: Path):
+    async def scenario():
+        store = BlobStore(tmp_path)
+        pipeline = UploadPipeline(store, workers=1, user_quota=20)
+        runner = asyncio.create_task(pipeline.run())
+        first = await pipeline.submit(1, 'a.txt', 12, make_source(b'x' * 12, [], []), file_unique_id='U1')
+        with pytest.raises(QuotaExceeded):
+            await pipeline.submit(1, 'b.txt', 12, make_source(b'y' * 12, [], []))
+        await first.done
+
+        async def must_not_download():
+            raise AssertionError("download was not skipped")
+
+        copy = await pipeline.submit(2, 'copy.txt', 12, must_not_download, file_unique_id='U1')
+        result = copy.done.result()
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return pipeline, store, result
+
+    pipeline, store, result = asyncio.run(scenario())
+    assert result[0] == 'copy.txt'
+    assert pipeline.deduplicated == 1
+    assert store.usage(1) == 12 and store.usage(2) == 12
+
+
+def test_byte_rate_limiter_waits_for_budget():
+    async def scenario():
+        limiter = ByteRateLimiter(10000)
+        await limiter.consume(10000)
+        await limiter.consume(2000)
+        return limiter.waited
+
+    assert 0.15 < asyncio.run(scenario()) < 0.5
@@ -0,0 +1,46 @@
+import asyncio
+import json
+from pathlib import Path
+
+from user_repository import UserRepository
+
+
+def test_lookups_are_served_from_memory(tmp_path: Path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({'1': {'name': 'Анна'}}), encoding='utf-8')
+    repo = UserRepository(path)
+
+    assert repo.exists(1)
+    path.unlink()
+    assert repo.get('1') == {'name': 'Анна'}
+    assert not repo.exists(2)
+
+
+def test_writes_are_debounced_and_batched(tmp_path: Path):
+    path = tmp_path / 'users.json'
+
+    async def scenario():
+        repo = UserRepository(path, flush_delay=0.05)
+        repo.put(1, {'name': 'Анна'})
+        repo.put(2, {'name': 'Борис'})
+        repo.update(1, phone='+77001234567')
+        assert not path.exists()
+        await asyncio.sleep(0.15)
+        assert not repo.dirty
+
+    asyncio.run(scenario())
+    saved = json.loads(path.read_text(encoding='utf-8'))
+    assert saved == {'1': {'name': 'Анна', 'phone': '+77001234567'}, '2': {'name': 'Борис'}}
+
+
+def test_flush_forces_pending_write(tmp_path: Path):
+    path = tmp_path / 'users.json'
+
+    async def scenario():
+        repo = UserRepository(path, flush_delay=60)
+        repo.put(1, {'name': 'Анна'})
+        await repo.flush()
+
+    asyncio.run(scenario())
+    assert json.loads(path.read_text(encoding='utf-8')) == {'1': {'name': 'Анна'}}
+    assert not Path(str(path) + '.tmp').exists()
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+from warmup import Warmup, WarmupMiddleware
+
+
+def test_flagged_handlers_wait_for_warmup_and_others_do_not():
+    warmup = Warmup(wait_timeout=1)
+    middleware = WarmupMiddleware(warmup)
+    order = []
+    release = None
+
+    async def load():
+        await release.wait()
+        order.append('loaded')
+
+    async def handler(event, data):
+        order.append(event)
+
+    def data(flags):
+        return {'handler': SimpleNamespace(flags=flags)}
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        warmup.start([('tasks', load)])
+        assert not warmup.ready
+        waiting = asyncio.create_task(middleware(handler, 'schedule', data({'warmup': True})))
+        await middleware(handler, 'start', data({}))
+        await asyncio.sleep(0)
+        release.set()
+        await waiting
+        await warmup.stop()
+
+    asyncio.run(scenario())
+    assert order == ['start', 'loaded', 'schedule']
+    assert set(warmup.timings) == {'tasks'}
+
+
+def test_failed_step_still_marks_ready_and_timeout_answers():
+    warmup = Warmup(wait_timeout=0.01)
+    middleware = WarmupMiddleware(warmup)
+    replies = []
+
+    async def broken():
+        raise OSError("диск недоступен")
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def answer(text):
+        replies.append(text)
+
+    async def handler(event, data):
+        return 'handled'
+
+    async def scenario():
+        warmup.start([('broken', broken)])
+        assert await warmup.wait()
+        await warmup.stop()
+        warmup.start([('slow', slow)])
+        result = await middleware(handler, SimpleNamespace(answer=answer),
+                                  {'handler': SimpleNamespace(flags={'warmup': True})})
+        await warmup.stop()
+        return result
+
+    assert asyncio.run(scenario()) is None
+    assert replies == ["Бот ещё загружает данные. Повторите через несколько секунд."]
+    assert warmup.ready
@@ -0,0 +1,54 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher, F
+from aiohttp.test_utils import TestClient, TestServer
+
+from webhook import WEBHOOK_HANDLER_KEY, create_webhook_app
+
+
+def _update(update_id, text):
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 1700000000,
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text,
+        },
+    }
+
+
+def test_webhook_processes_updates_and_drains_on_shutdown():
+    handled = []
+    events = []
+
+    async def scenario():
+        dp = Dispatcher()
+
+        @dp.message(F.text)
+        async def echo(message):
+            await asyncio.sleep(0.05)
+            handled.append(message.text)
+
+        async def stop_reminders():
+            events.append('stop_reminders')
+
+        app = create_webhook_app(dp, Bot(token='42:TEST'), '/webhook', secret_token='s3cret',
+                                 before_drain=[stop_reminders])
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': 's3cret'}
+        responses = await asyncio.gather(*(client.post('/webhook', json=_update(i, f'msg {i}'), headers=headers)
+                                           for i in range(5)))
+        rejected = await client.post('/webhook', json=_update(99, 'bad'), headers={})
+        in_flight = app[WEBHOOK_HANDLER_KEY].in_flight
+        await client.close()
+        return [r.status for r in responses], rejected.status, in_flight
+
+    statuses, rejected, in_flight = asyncio.run(scenario())
+    assert statuses == [200] * 5
+    assert rejected == 401
+    assert in_flight == 5
+    assert sorted(handled) == [f'msg {i}' for i in range(5)]
+    assert events == ['stop_reminders']
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import AsyncIterable, Awaitable, Callable, Dict, Optional
+
+from blob_store import BlobStore
+from outbound import TokenBucket
+
+UPLOAD_WORKERS = 4
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, used: int, quota: int):
+        super().__init__(f"Квота превышена: {used} из {quota} байт")
+        self.used = used
+        self.quota = quota
+
+
+class ByteRateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._bucket = TokenBucket(rate, burst or rate, clock()) if rate > 0 else None
+        self.waited = 0.0
+
+    async def consume(self, size: int) -> None:
+        if self._bucket is None:
+            return
+        while True:
+            wait = self._bucket.delay(self._clock(), min(size, self._bucket.capacity))
+            if wait <= 0:
+                self._bucket.consume(size)
+                return
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+
+class UploadJob:
+    __slots__ = ('user_id', 'name', 'size', 'file_unique_id', 'source', 'on_progress', 'position', 'done')
+
+    def __init__(self, user_id, name: str, size: int, source: Callable[[], Awaitable[AsyncIterable[bytes]]],
+                 file_unique_id: Optional[str], on_progress: Optional[Callable[[int, int], None]]):
+        self.user_id = user_id
+        self.name = name
+        self.size = size
+        self.source = source
+        self.file_unique_id = file_unique_id
+        self.on_progress = on_progress
+        self.position = 0
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class UploadPipeline:
+    def __init__(self, store: BlobStore, workers: int = UPLOAD_WORKERS, byte_rate: float = 0,
+                 user_quota: int = 0, limiter: Optional[ByteRateLimiter] = None):
+        self.store = store
+        self.workers = workers
+        self.user_quota = user_quota
+        self.limiter = limiter or ByteRateLimiter(byte_rate)
+        self._queue: Optional[asyncio.Queue] = None
+        self._reserved: Dict[str, int] = defaultdict(int)
+        self._active = 0
+        self.completed = 0
+        self.deduplicated = 0
+        self.failed = 0
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    @property
+    def backlog(self) -> int:
+        return self.queue.qsize()
+
+    def usage(self, user_id) -> int:
+        return self.store.usage(user_id) + self._reserved.get(str(user_id), 0)
+
+    async def submit(self, user_id, name: str, size: int, source: Callable[[], Awaitable[AsyncIterable[bytes]]],
+                     file_unique_id: Optional[str] = None,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> UploadJob:
+        used = self.usage(user_id)
+        if self.user_quota and used + size > self.user_quota:
+            raise QuotaExceeded(used, self.user_quota)
+        job = UploadJob(user_id, name, size, source, file_unique_id, on_progress)
+        digest = self.store.find_unique(file_unique_id)
+        if digest is not None:
+            linked = await self.store.link(user_id, name, digest)
+            if linked is not None:
+                self.deduplicated += 1
+                job.done.set_result((linked, digest))
+                return job
+        self._reserved[str(user_id)] += size
+        job.position = max(0, self.queue.qsize() + self._active - self.workers + 1)
+        self.queue.put_nowait(job)
+        return job
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self.queue.get()
+            self._active += 1
+            try:
+                result = await self._process(job)
+            except asyncio.CancelledError:
+                job.done.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.warning("Не удалось сохранить файл %s пользователя %s: %s", job.name, job.user_id, e)
+                if not job.done.done():
+                    job.done.set_exception(e)
+            else:
+                self.completed += 1
+                if not job.done.done():
+                    job.done.set_result(result)
+            finally:
+                self._active -= 1
+                self._release(job)
+                self.queue.task_done()
+
+    async def _process(self, job: UploadJob):
+        chunks = await job.source()
+        return await self.store.add(job.user_id, job.name, self._throttled(job, chunks),
+                                    file_unique_id=job.file_unique_id)
+
+    async def _throttled(self, job: UploadJob, chunks: AsyncIterable[bytes]):
+        received = 0
+        async for chunk in chunks:
+            await self.limiter.consume(len(chunk))
+            received += len(chunk)
+            overflow = received - job.size
+            if self.user_quota and overflow > 0 and self.usage(job.user_id) + overflow > self.user_quota:
+                raise QuotaExceeded(self.usage(job.user_id) + overflow, self.user_quota)
+            if job.on_progress is not None:
+                job.on_progress(received, job.size)
+            yield chunk
+
+    def _release(self, job: UploadJob) -> None:
+        user_id = str(job.user_id)
+        self._reserved[user_id] -= job.size
+        if self._reserved[user_id] <= 0:
+            del self._reserved[user_id]
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, Optional
+
+from metrics import PERSIST_SECONDS
+
+FLUSH_DELAY_SECONDS = 2.0
+
+
+def write_json_atomic(path: str, data) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class UserRepository:
+    def __init__(self, path, flush_delay: float = FLUSH_DELAY_SECONDS):
+        self.path = str(path)
+        self.flush_delay = flush_delay
+        self._users: Optional[Dict[str, dict]] = None
+        self._dirty = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock = asyncio.Lock()
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def users(self) -> Dict[str, dict]:
+        if self._users is None:
+            self._users = self._read()
+        return self._users
+
+    async def load(self) -> None:
+        if self._users is not None:
+            return
+        async with self._load_lock:
+            if self._users is not None:
+                return
+            users = await asyncio.to_thread(self._read)
+            if self._users is None:
+                self._users = users
+
+    def get(self, user_id) -> Optional[dict]:
+        return self.users.get(str(user_id))
+
+    def exists(self, user_id) -> bool:
+        return str(user_id) in self.users
+
+    def put(self, user_id, record: dict) -> None:
+        self.users[str(user_id)] = dict(record)
+        self._mark_dirty(str(user_id))
+
+    def update(self, user_id, **fields) -> bool:
+        user_id = str(user_id)
+        record = self.users.get(user_id)
+        if record is None:
+            return False
+        self.users[user_id] = {**record, **fields}
+        self._mark_dirty(user_id)
+        return True
+
+    def delete(self, user_id) -> bool:
+        user_id = str(user_id)
+        if self.users.pop(user_id, None) is None:
+            return False
+        self._mark_dirty(user_id)
+        return True
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    async def flush(self) -> None:
+        self._cancel_timer()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch = self._dirty
+            snapshot = dict(self.users)
+            self._dirty = set()
+            try:
+                with PERSIST_SECONDS.time('users'):
+                    await asyncio.to_thread(write_json_atomic, self.path, snapshot)
+                logging.debug("Сохранено изменённых профилей: %s", len(batch))
+            except Exception as e:
+                logging.exception("Ошибка при сохранении данных: %s", e)
+                self._dirty |= batch
+                self._schedule_flush()
+
+    def flush_sync(self) -> None:
+        self._cancel_timer()
+        if not self._dirty:
+            return
+        try:
+            write_json_atomic(self.path, self.users)
+            self._dirty.clear()
+        except Exception as e:
+            logging.exception("Ошибка при сохранении данных: %s", e)
+
+    def _mark_dirty(self, user_id: str) -> None:
+        self._dirty.add(user_id)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    def _cancel_timer(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            if not os.path.exists(self.path):
+                return {}
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logging.exception("Ошибка при загрузке данных: %s", e)
+            return {}
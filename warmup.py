@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+
+from metrics import REGISTRY
+
+DEFAULT_WAIT_SECONDS = 30.0
+
+WARMUP_SECONDS = REGISTRY.histogram('aio_warmup_seconds', "Длительность шагов прогрева после старта", ('step',))
+
+Step = Tuple[str, Callable[[], Awaitable[None]]]
+
+
+class Warmup:
+    def __init__(self, wait_timeout: float = DEFAULT_WAIT_SECONDS):
+        self.wait_timeout = wait_timeout
+        self.timings: Dict[str, float] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready is None or self._ready.is_set()
+
+    def start(self, steps: Iterable[Step]) -> asyncio.Task:
+        self.timings = {}
+        self._ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run(list(steps)))
+        return self._task
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.wait_timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._ready = None
+
+    async def _run(self, steps) -> None:
+        started = time.perf_counter()
+        try:
+            for name, step in steps:
+                began = time.perf_counter()
+                try:
+                    await step()
+                except Exception as e:
+                    logging.exception("Шаг прогрева %s завершился ошибкой: %s", name, e)
+                self.timings[name] = time.perf_counter() - began
+                WARMUP_SECONDS.observe(self.timings[name], name)
+        finally:
+            self._ready.set()
+        logging.info("Прогрев завершён за %.2f с: %s", time.perf_counter() - started,
+                     ', '.join(f"{name} {seconds:.2f} с" for name, seconds in self.timings.items()))
+
+
+class WarmupMiddleware(BaseMiddleware):
+    def __init__(self, warmup: Warmup):
+        self.warmup = warmup
+
+    async def __call__(self, handler, event, data):
+        if self.warmup.ready or not get_flag(data, 'warmup', default=False):
+            return await handler(event, data)
+        if not await self.warmup.wait():
+            await event.answer("Бот ещё загружает данные. Повторите через несколько секунд.")
+            return None
+        return await handler(event, data)
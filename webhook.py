@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+DRAIN_TIMEOUT_SECONDS = 30.0
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, drain_timeout: float = DRAIN_TIMEOUT_SECONDS, **kwargs):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self.drain_timeout = drain_timeout
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def drain(self) -> None:
+        pending = set(self._background_feed_update_tasks)
+        if not pending:
+            return
+        logging.info("Ожидаю завершения обработчиков: %s", len(pending))
+        _, not_done = await asyncio.wait(pending, timeout=self.drain_timeout)
+        if not_done:
+            logging.warning("Не дождался обработчиков: %s", len(not_done))
+
+    async def close(self) -> None:
+        await self.drain()
+        await super().close()
+
+
+WEBHOOK_HANDLER_KEY = web.AppKey('webhook_handler', DrainingRequestHandler)
+
+
+def create_webhook_app(dispatcher: Dispatcher, bot: Bot, path: str, secret_token: Optional[str] = None,
+                       before_drain: Iterable[Callable[[], Awaitable]] = (),
+                       drain_timeout: float = DRAIN_TIMEOUT_SECONDS) -> web.Application:
+    app = web.Application()
+    for callback in before_drain:
+        app.on_shutdown.append(lambda _app, callback=callback: callback())
+    handler = DrainingRequestHandler(dispatcher, bot, drain_timeout=drain_timeout, secret_token=secret_token)
+    handler.register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+    app[WEBHOOK_HANDLER_KEY] = handler
+    return app